@@ -1,42 +1,28 @@
 import streamlit as st
-import requests
-import math
-import folium
-from streamlit_folium import st_folium
-
-# ─── DATOS ESTÁTICOS DE BARRIOS ─────────────────────────────────────────────────
-BARRIOS_DATA = {
-    "Palermo":        {"alquiler_m2": 38000, "nse": "medio_alto", "densidad": "alta",  "categoria": "premium"},
-    "Recoleta":       {"alquiler_m2": 45000, "nse": "alto",       "densidad": "alta",  "categoria": "premium"},
-    "Belgrano":       {"alquiler_m2": 36000, "nse": "alto",       "densidad": "alta",  "categoria": "premium"},
-    "Nuñez":          {"alquiler_m2": 32000, "nse": "medio_alto", "densidad": "media", "categoria": "premium"},
-    "Colegiales":     {"alquiler_m2": 30000, "nse": "medio_alto", "densidad": "media", "categoria": "medio"},
-    "Villa Urquiza":  {"alquiler_m2": 27000, "nse": "medio_alto", "densidad": "media", "categoria": "medio"},
-    "Saavedra":       {"alquiler_m2": 24000, "nse": "medio_alto", "densidad": "media", "categoria": "medio"},
-    "San Nicolás":    {"alquiler_m2": 42000, "nse": "medio",      "densidad": "alta",  "categoria": "premium"},
-    "Monserrat":      {"alquiler_m2": 35000, "nse": "medio",      "densidad": "alta",  "categoria": "medio"},
-    "San Telmo":      {"alquiler_m2": 28000, "nse": "medio",      "densidad": "alta",  "categoria": "medio"},
-    "Puerto Madero":  {"alquiler_m2": 60000, "nse": "alto",       "densidad": "media", "categoria": "premium"},
-    "Retiro":         {"alquiler_m2": 38000, "nse": "medio",      "densidad": "alta",  "categoria": "premium"},
-    "Caballito":      {"alquiler_m2": 25000, "nse": "medio",      "densidad": "alta",  "categoria": "medio"},
-    "Flores":         {"alquiler_m2": 20000, "nse": "medio",      "densidad": "alta",  "categoria": "economico"},
-    "Almagro":        {"alquiler_m2": 24000, "nse": "medio",      "densidad": "alta",  "categoria": "medio"},
-    "Boedo":          {"alquiler_m2": 20000, "nse": "medio",      "densidad": "media", "categoria": "economico"},
-    "Villa Crespo":   {"alquiler_m2": 26000, "nse": "medio_alto", "densidad": "alta",  "categoria": "medio"},
-    "Chacarita":      {"alquiler_m2": 22000, "nse": "medio",      "densidad": "media", "categoria": "medio"},
-    "Paternal":       {"alquiler_m2": 18000, "nse": "medio",      "densidad": "media", "categoria": "economico"},
-    "Villa del Parque":{"alquiler_m2":18000, "nse": "medio",      "densidad": "media", "categoria": "economico"},
-    "Villa Devoto":   {"alquiler_m2": 20000, "nse": "medio_alto", "densidad": "media", "categoria": "medio"},
-    "Monte Castro":   {"alquiler_m2": 15000, "nse": "medio",      "densidad": "baja",  "categoria": "economico"},
-    "La Boca":        {"alquiler_m2": 18000, "nse": "bajo",       "densidad": "media", "categoria": "economico"},
-    "Barracas":       {"alquiler_m2": 16000, "nse": "bajo",       "densidad": "media", "categoria": "economico"},
-    "Parque Patricios":{"alquiler_m2":17000, "nse": "medio",      "densidad": "media", "categoria": "economico"},
-    "Nueva Pompeya":  {"alquiler_m2": 14000, "nse": "bajo",       "densidad": "baja",  "categoria": "economico"},
-    "Villa Lugano":   {"alquiler_m2": 12000, "nse": "bajo",       "densidad": "media", "categoria": "economico"},
-    "Villa Riachuelo":{"alquiler_m2": 11000, "nse": "bajo",       "densidad": "baja",  "categoria": "economico"},
-    "Mataderos":      {"alquiler_m2": 13000, "nse": "bajo",       "densidad": "media", "categoria": "economico"},
-    "_default":       {"alquiler_m2": 22000, "nse": "medio",      "densidad": "media", "categoria": "medio"},
-}
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+import json
+import os
+import time
+import uuid
+from contextlib import nullcontext
+
+from localscope import metrics
+from localscope.analysis import (
+    RADIUS_MAX, RADIUS_MIN, RADIUS_STEP, analyze_batch, radius_curve, result_key, viability_heatmap,
+)
+from localscope.barrios import get_barrio_store
+from localscope.batch import parse_batch_csv
+from localscope.jobs import CANCELLED, DONE, FAILED, TooManyJobs, discard_export, get_job_queue, new_export_path
+from localscope.lookups import get_api_client
+from localscope.optimize import optimize_location
+from localscope.portfolio import Scheduler, get_portfolio
+from localscope.reports import render_report
+from localscope.rubros import RUBROS, resolve_rubro
+from localscope.scoring import score_competencia
+
+# folium, streamlit_folium y localscope.maps (~1 s de import) se cargan recién al
+# dibujar el primer mapa: el primer render de un proceso nuevo no los necesita.
+_inicio_rerun = time.perf_counter()
 
 # ─── PAGE CONFIG ────────────────────────────────────────────────────────────────
 st.set_page_config(
@@ -47,472 +33,68 @@ st.set_page_config(
 )
 
 # ─── STYLES ─────────────────────────────────────────────────────────────────────
-st.markdown("""
-<style>
-@import url('https://fonts.googleapis.com/css2?family=DM+Serif+Display:ital@0;1&family=DM+Sans:wght@300;400;500;600&display=swap');
-
-* { box-sizing: border-box; }
-
-html, body, .stApp {
-    background-color: #0f0f0f;
-    color: #e8e4dc;
-    font-family: 'DM Sans', sans-serif;
-}
-
-.stApp > header { background: transparent !important; }
-
-h1, h2, h3 { font-family: 'DM Serif Display', serif; }
-
-/* Hero */
-.hero {
-    padding: 3rem 0 2rem 0;
-    border-bottom: 1px solid #2a2a2a;
-    margin-bottom: 2.5rem;
-}
-.hero-title {
-    font-family: 'DM Serif Display', serif;
-    font-size: 3.2rem;
-    line-height: 1.1;
-    color: #e8e4dc;
-    margin: 0 0 0.5rem 0;
-}
-.hero-title span { color: #c8f065; }
-.hero-sub {
-    font-size: 1rem;
-    color: #888;
-    font-weight: 300;
-    letter-spacing: 0.02em;
-}
-
-/* Cards */
-.score-card {
-    background: #181818;
-    border: 1px solid #2a2a2a;
-    border-radius: 12px;
-    padding: 1.5rem;
-    margin-bottom: 1rem;
-}
-.score-card h4 {
-    font-family: 'DM Sans', sans-serif;
-    font-size: 0.7rem;
-    font-weight: 600;
-    text-transform: uppercase;
-    letter-spacing: 0.12em;
-    color: #666;
-    margin: 0 0 0.5rem 0;
-}
-.score-card .value {
-    font-family: 'DM Serif Display', serif;
-    font-size: 2.8rem;
-    line-height: 1;
-    color: #e8e4dc;
-    margin: 0 0 0.3rem 0;
-}
-.score-card .label { font-size: 0.85rem; color: #888; }
-
-/* Semáforo */
-.semaforo {
-    display: flex;
-    gap: 0.5rem;
-    align-items: center;
-    margin: 0.4rem 0;
-}
-.dot {
-    width: 12px; height: 12px;
-    border-radius: 50%;
-    background: #2a2a2a;
-}
-.dot.green { background: #c8f065; box-shadow: 0 0 8px #c8f065aa; }
-.dot.yellow { background: #f0c040; box-shadow: 0 0 8px #f0c040aa; }
-.dot.red { background: #f06060; box-shadow: 0 0 8px #f06060aa; }
-
-/* Layer card */
-.layer-card {
-    background: #181818;
-    border: 1px solid #2a2a2a;
-    border-radius: 12px;
-    padding: 1.2rem 1.5rem;
-    margin-bottom: 0.8rem;
-}
-.layer-title {
-    font-size: 0.75rem;
-    font-weight: 600;
-    text-transform: uppercase;
-    letter-spacing: 0.1em;
-    color: #888;
-    margin-bottom: 0.3rem;
-}
-.layer-value {
-    font-size: 1.1rem;
-    color: #e8e4dc;
-    font-weight: 500;
-}
-.layer-detail { font-size: 0.85rem; color: #666; margin-top: 0.2rem; }
-
-/* Analysis box */
-.analysis-box {
-    background: #141414;
-    border: 1px solid #2a2a2a;
-    border-left: 3px solid #c8f065;
-    border-radius: 0 12px 12px 0;
-    padding: 1.5rem;
-    font-size: 0.95rem;
-    line-height: 1.7;
-    color: #ccc;
-}
-
-/* Input overrides */
-.stTextInput > div > div > input,
-.stSelectbox > div > div,
-.stSlider {
-    background: #181818 !important;
-    border-color: #2a2a2a !important;
-    color: #e8e4dc !important;
-}
-
-.stButton > button {
-    background: #c8f065;
-    color: #0f0f0f;
-    font-family: 'DM Sans', sans-serif;
-    font-weight: 600;
-    font-size: 0.9rem;
-    letter-spacing: 0.05em;
-    border: none;
-    border-radius: 8px;
-    padding: 0.75rem 2rem;
-    width: 100%;
-    transition: all 0.2s;
-}
-.stButton > button:hover {
-    background: #d8ff70;
-    transform: translateY(-1px);
-}
-
-.stSpinner > div { border-top-color: #c8f065 !important; }
-
-hr { border-color: #2a2a2a; }
-</style>
-""", unsafe_allow_html=True)
+# static/style.css se sirve como archivo estático (enableStaticServing en .streamlit/config.toml);
+# cada rerun sólo manda el <link>, y la versión por mtime invalida la caché del navegador al cambiarla.
+CSS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static", "style.css")
 
-# ─── HELPERS ────────────────────────────────────────────────────────────────────
 
-def geocode_address(address: str, api_key: str) -> dict | None:
-    """Geocodifica una dirección en CABA."""
-    url = "https://maps.googleapis.com/maps/api/geocode/json"
-    params = {"address": f"{address}, Buenos Aires, Argentina", "key": api_key}
-    r = requests.get(url, params=params, timeout=10)
-    data = r.json()
-    if data["status"] == "OK":
-        loc = data["results"][0]["geometry"]["location"]
-        return {"lat": loc["lat"], "lng": loc["lng"], "formatted": data["results"][0]["formatted_address"]}
-    return None
-
-
-def search_places(lat: float, lng: float, radius: int, keyword: str, place_type: str, api_key: str) -> list:
-    """Busca lugares cercanos con Places API."""
-    url = "https://maps.googleapis.com/maps/api/place/nearbysearch/json"
-    params = {
-        "location": f"{lat},{lng}",
-        "radius": radius,
-        "key": api_key,
-        "language": "es"
-    }
-    if place_type:
-        params["type"] = place_type
-    if keyword:
-        params["keyword"] = keyword
-    r = requests.get(url, params=params, timeout=10)
-    data = r.json()
-    return data.get("results", [])
-
-
-def get_transit_stops(lat: float, lng: float, radius: int, api_key: str) -> list:
-    """Busca paradas de transporte público cercanas."""
-    url = "https://maps.googleapis.com/maps/api/place/nearbysearch/json"
-    params = {
-        "location": f"{lat},{lng}",
-        "radius": radius,
-        "type": "transit_station",
-        "key": api_key,
-        "language": "es"
-    }
-    r = requests.get(url, params=params, timeout=10)
-    data = r.json()
-    stops = data.get("results", [])
-
-    # También buscar paradas de colectivo (bus_station)
-    params["type"] = "bus_station"
-    r2 = requests.get(url, params=params, timeout=10)
-    data2 = r2.json()
-    stops += data2.get("results", [])
-    return stops
-
-
-def get_barrio_from_coords(lat: float, lng: float) -> str | None:
-    """Intenta identificar el barrio usando la API de datos abiertos CABA."""
-    try:
-        url = f"https://datosabiertos-apis.buenosaires.gob.ar/datasets/barrios/consultar_punto?x={lng}&y={lat}"
-        r = requests.get(url, timeout=8)
-        if r.status_code == 200:
-            data = r.json()
-            return data.get("nombre") or data.get("NOMBRE")
-    except Exception:
-        pass
-    return None
-
-
-def haversine(lat1, lng1, lat2, lng2) -> float:
-    """Distancia en metros entre dos coordenadas."""
-    R = 6371000
-    phi1, phi2 = math.radians(lat1), math.radians(lat2)
-    dphi = math.radians(lat2 - lat1)
-    dlambda = math.radians(lng2 - lng1)
-    a = math.sin(dphi/2)**2 + math.cos(phi1)*math.cos(phi2)*math.sin(dlambda/2)**2
-    return R * 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
-
-
-def score_competencia(competitors: list, radius: int) -> tuple[int, str, str]:
-    """Calcula score de competencia. Devuelve (score 0-100, semáforo, descripción)."""
-    n = len(competitors)
-    ratings = [p.get("rating", 0) for p in competitors if p.get("rating")]
-    avg_rating = sum(ratings) / len(ratings) if ratings else 0
-
-    density = n / (math.pi * (radius/1000)**2)  # locales por km²
-
-    if density < 2:
-        color = "green"; desc = f"{n} competidores en el radio — zona con baja saturación"
-        score = 85
-    elif density < 5:
-        if avg_rating < 3.8:
-            color = "yellow"; desc = f"{n} competidores, rating promedio bajo ({avg_rating:.1f}⭐) — oportunidad de diferenciación"
-            score = 70
-        else:
-            color = "yellow"; desc = f"{n} competidores bien posicionados ({avg_rating:.1f}⭐) — mercado activo"
-            score = 55
-    else:
-        if avg_rating < 3.5:
-            color = "yellow"; desc = f"Alta densidad ({n} locales) pero calidad mediocre ({avg_rating:.1f}⭐) — oportunidad para un operador de calidad"
-            score = 60
-        else:
-            color = "red"; desc = f"Zona saturada: {n} competidores con buen rating ({avg_rating:.1f}⭐)"
-            score = 25
+@st.cache_resource
+def css_href() -> str:
+    return f"app/static/style.css?v={int(os.path.getmtime(CSS_PATH))}"
 
-    return score, color, desc
 
+st.markdown(f'<link rel="stylesheet" href="{css_href()}">', unsafe_allow_html=True)
 
-def score_transporte(stops: list, radius: int) -> tuple[int, str, str]:
-    n = len(stops)
-    if n >= 4:
-        return 90, "green", f"{n} paradas de transporte en el radio — excelente accesibilidad"
-    elif n >= 2:
-        return 65, "yellow", f"{n} paradas de transporte — accesibilidad media"
-    elif n == 1:
-        return 40, "yellow", "Solo 1 parada cercana — accesibilidad limitada"
-    else:
-        return 15, "red", "Sin transporte público identificado en el radio"
-
+# ─── HELPERS ────────────────────────────────────────────────────────────────────
 
-def score_alquiler(barrio: str, rubro: str) -> tuple[int, str, str, int]:
-    """Score basado en tabla estática. Devuelve (score, color, desc, precio_m2)."""
-    data = BARRIOS_DATA.get(barrio, BARRIOS_DATA.get("_default"))
-    precio = data["alquiler_m2"]
-    categoria = data["categoria"]  # premium / medio / economico
+def dot_html(color):
+    return f'<span class="dot {color}"></span>'
 
-    if categoria == "premium":
-        color = "red"; score = 35
-        desc = f"Zona premium · ~${precio:,}/m² — alquiler alto, evaluar bien el volumen esperado"
-    elif categoria == "medio":
-        color = "yellow"; score = 65
-        desc = f"Zona de valor medio · ~${precio:,}/m² — relación riesgo/costo razonable"
-    else:
-        color = "green"; score = 85
-        desc = f"Zona accesible · ~${precio:,}/m² — bajo costo de entrada"
 
-    return score, color, desc, precio
+# Los mapas y capas se cachean por resultado: los reruns de UI (paneo, toggles)
+# reutilizan los objetos ya construidos y st_folium sólo reenvía las capas activas.
+@st.cache_resource(max_entries=64)
+def cached_base_map(lat, lng, radius):
+    from localscope.maps import build_base_map
+    return build_base_map(lat, lng, radius)
 
 
-def score_demografia(barrio: str, rubro: str) -> tuple[int, str, str]:
-    data = BARRIOS_DATA.get(barrio, BARRIOS_DATA.get("_default"))
-    nse = data["nse"]  # alto / medio_alto / medio / bajo
-    densidad = data["densidad"]  # alta / media / baja
+@st.cache_resource(max_entries=256)
+def cached_layer(kind: str, key: str, _data):
+    from localscope import maps
+    builders = {"competitors": maps.competitors_layer, "transit": maps.transit_layer, "heatmap": maps.heatmap_layer}
+    return builders[kind](_data)
 
-    # Rubros que prefieren NSE alto
-    rubros_premium = ["restaurant", "cafeteria", "cafe", "joyeria", "ropa", "indumentaria", "gym", "fitness"]
-    rubros_popular = ["almacen", "ferreteria", "verduleria", "carniceria", "lavanderia", "farmacia"]
 
-    rubro_lower = rubro.lower()
-    es_premium = any(r in rubro_lower for r in rubros_premium)
-    es_popular = any(r in rubro_lower for r in rubros_popular)
+@st.cache_data(max_entries=32, show_spinner=False)
+def cached_heatmap(key: str, rubro: str, radius: int, lat: float, lng: float, barrio: str, _api_key: str) -> dict:
+    # Una vez por (resultado, rubro, radio): los reruns por otros widgets no vuelven a puntuar la grilla
+    return viability_heatmap(lat, lng, rubro, radius, _api_key, barrio=barrio)
 
-    if densidad == "alta":
-        base_score = 80
-    elif densidad == "media":
-        base_score = 60
-    else:
-        base_score = 40
-
-    if (es_premium and nse in ["alto", "medio_alto"]) or (es_popular and nse in ["medio", "bajo"]):
-        score = min(base_score + 15, 95)
-        color = "green"
-        desc = f"Perfil del barrio compatible con el rubro · NSE {nse.replace('_', ' ')}, densidad {densidad}"
-    elif (es_premium and nse == "bajo") or (es_popular and nse == "alto"):
-        score = max(base_score - 20, 20)
-        color = "red"
-        desc = f"Posible desajuste entre rubro y perfil socioeconómico del barrio ({nse.replace('_', ' ')})"
-    else:
-        score = base_score
-        color = "yellow" if base_score < 70 else "green"
-        desc = f"Barrio de perfil {nse.replace('_', ' ')}, densidad {densidad}"
 
-    return score, color, desc
+@st.cache_data(max_entries=32, show_spinner=False)
+def cached_report(key: str, score: int, _result) -> bytes:
+    # Se renderiza una vez por resultado (`key` = result_key), no en cada rerun
+    return render_report(_result)
 
 
-def global_score(scores: list[int], weights: list[float]) -> int:
-    return round(sum(s * w for s, w in zip(scores, weights)))
+@st.cache_resource
+def portfolio_scheduler(api_key: str):
+    """Un único revisor de la cartera por proceso (sólo con una API key del servidor)."""
+    return Scheduler(get_portfolio(), api_key).start()
 
 
-def get_key_insights(c_comp, c_trans, c_alq, c_demo, score_total) -> list[dict]:
-    """Genera insights basados en reglas según los colores de cada capa."""
-    insights = []
+def server_api_key() -> str | None:
+    """API key configurada en el servidor: st.secrets o, si no hay, la variable de entorno."""
+    try:
+        return st.secrets.get("GOOGLE_PLACES_API_KEY") or os.environ.get("GOOGLE_PLACES_API_KEY")
+    except FileNotFoundError:  # sin secrets.toml
+        return os.environ.get("GOOGLE_PLACES_API_KEY")
 
-    # Insight principal según score global
-    if score_total >= 70:
-        insights.append({"icon": "✅", "text": "La ubicación presenta condiciones favorables para abrir el local."})
-    elif score_total >= 45:
-        insights.append({"icon": "⚠️", "text": "La ubicación tiene potencial pero requiere análisis más profundo antes de decidir."})
-    else:
-        insights.append({"icon": "❌", "text": "La ubicación presenta factores de riesgo importantes. Considerá otras opciones."})
 
-    # Competencia
-    if c_comp == "green":
-        insights.append({"icon": "🏪", "text": "Baja competencia directa en el radio — ventana de oportunidad para posicionarse."})
-    elif c_comp == "yellow":
-        insights.append({"icon": "🏪", "text": "Competencia moderada — la diferenciación en calidad o propuesta será clave."})
-    else:
-        insights.append({"icon": "🏪", "text": "Zona saturada del rubro — necesitás una propuesta muy diferenciada para competir."})
-
-    # Transporte
-    if c_trans == "green":
-        insights.append({"icon": "🚌", "text": "Excelente acceso en transporte público — favorece el flujo de clientes."})
-    elif c_trans == "red":
-        insights.append({"icon": "🚌", "text": "Poca accesibilidad en transporte — el negocio dependerá más de clientes del barrio."})
-
-    # Alquiler
-    if c_alq == "red":
-        insights.append({"icon": "💰", "text": "Alquiler alto para la zona — asegurate de proyectar bien el volumen de ventas necesario."})
-    elif c_alq == "green":
-        insights.append({"icon": "💰", "text": "Costo de entrada bajo — margen favorable para cubrir el punto de equilibrio."})
-
-    # Demografía
-    if c_demo == "red":
-        insights.append({"icon": "👥", "text": "El perfil del barrio no matchea bien con el rubro — revisá si el público objetivo está en la zona."})
-    elif c_demo == "green":
-        insights.append({"icon": "👥", "text": "El perfil socioeconómico del barrio es compatible con el rubro."})
-
-    # Combinaciones especiales
-    if c_comp == "red" and c_alq == "red":
-        insights.append({"icon": "🔴", "text": "Zona de alta competencia Y alquiler caro: combinación de mayor riesgo."})
-    if c_comp == "green" and c_alq == "green":
-        insights.append({"icon": "🟢", "text": "Baja competencia con alquiler accesible: combinación ideal para entrada al mercado."})
-
-    return insights
-
-
-def build_map(lat, lng, radius, competitors, transit_stops):
-    """Construye el mapa Folium."""
-    m = folium.Map(
-        location=[lat, lng],
-        zoom_start=15,
-        tiles="CartoDB dark_matter"
-    )
+BATCH_MAX_WORKERS = int(os.environ.get("LOCALSCOPE_BATCH_WORKERS", 8))
+JOB_POLL_SECONDS = 0.5
 
-    # Radio
-    folium.Circle(
-        location=[lat, lng],
-        radius=radius,
-        color="#c8f065",
-        fill=True,
-        fill_opacity=0.08,
-        weight=1.5
-    ).add_to(m)
-
-    # Punto central
-    folium.CircleMarker(
-        location=[lat, lng],
-        radius=10,
-        color="#c8f065",
-        fill=True,
-        fill_color="#c8f065",
-        fill_opacity=0.9,
-        popup="📍 Dirección analizada"
-    ).add_to(m)
-
-    # Competidores
-    for p in competitors[:20]:
-        ploc = p.get("geometry", {}).get("location", {})
-        if ploc:
-            rating = p.get("rating", "N/D")
-            folium.CircleMarker(
-                location=[ploc["lat"], ploc["lng"]],
-                radius=6,
-                color="#f06060",
-                fill=True,
-                fill_color="#f06060",
-                fill_opacity=0.7,
-                popup=f"🏪 {p.get('name', '')}<br>⭐ {rating}"
-            ).add_to(m)
-
-    # Transporte
-    seen = set()
-    for s in transit_stops[:15]:
-        sloc = s.get("geometry", {}).get("location", {})
-        key = (round(sloc.get("lat", 0), 5), round(sloc.get("lng", 0), 5))
-        if sloc and key not in seen:
-            seen.add(key)
-            folium.CircleMarker(
-                location=[sloc["lat"], sloc["lng"]],
-                radius=5,
-                color="#60b4f0",
-                fill=True,
-                fill_color="#60b4f0",
-                fill_opacity=0.8,
-                popup=f"🚌 {s.get('name', 'Parada')}"
-            ).add_to(m)
-
-    return m
-
-
-# ─── CATÁLOGO DE RUBROS ──────────────────────────────────────────────────────────
-# Cada rubro tiene: label visible, google_type (tipo nativo Places API), keyword extra
-RUBROS = {
-    # Gastronomía
-    "☕ Cafetería / Café":           {"type": "cafe",                  "keyword": "cafeteria cafe"},
-    "🍽️ Restaurant / Resto":        {"type": "restaurant",            "keyword": ""},
-    "🍕 Pizzería / Delivery":        {"type": "restaurant",            "keyword": "pizzeria delivery"},
-    "🥐 Panadería / Confitería":     {"type": "bakery",                "keyword": "panaderia confiteria"},
-    "🍦 Heladería":                  {"type": "ice_cream_shop",        "keyword": "heladeria"},
-    "🍺 Bar / Cervecería":           {"type": "bar",                   "keyword": "bar cerveceria"},
-    # Comercio
-    "👗 Ropa / Indumentaria":        {"type": "clothing_store",        "keyword": "ropa indumentaria"},
-    "👟 Calzado / Zapatería":        {"type": "shoe_store",            "keyword": "zapateria calzado"},
-    "💄 Perfumería / Cosmética":     {"type": "beauty_supply",         "keyword": "perfumeria cosmetica"},
-    "🛒 Almacén / Minimercado":      {"type": "convenience_store",     "keyword": "almacen kiosco"},
-    "🌿 Verdulería / Frutería":      {"type": "grocery_or_supermarket","keyword": "verduleria fruteria"},
-    "🥩 Carnicería":                 {"type": "grocery_or_supermarket","keyword": "carniceria"},
-    "🔧 Ferretería":                 {"type": "hardware_store",        "keyword": "ferreteria"},
-    "📱 Electrónica / Celulares":    {"type": "electronics_store",     "keyword": "celulares electronica"},
-    "📚 Librería / Papelería":       {"type": "book_store",            "keyword": "libreria papeleria"},
-    "🌸 Floristería":                {"type": "florist",               "keyword": "floreria"},
-    "🐾 Veterinaria / Pet shop":     {"type": "veterinary_care",       "keyword": "veterinaria pet shop"},
-    # Servicios
-    "💊 Farmacia":                   {"type": "pharmacy",              "keyword": ""},
-    "💈 Peluquería / Barbería":      {"type": "hair_care",             "keyword": "peluqueria barberia"},
-    "💅 Estética / Nail bar":        {"type": "beauty_salon",          "keyword": "estetica nail"},
-    "🏋️ Gimnasio / Fitness":        {"type": "gym",                   "keyword": "gimnasio fitness"},
-    "🧺 Lavandería / Tintorería":    {"type": "laundry",               "keyword": "lavanderia tintoreria"},
-    "🖨️ Imprenta / Fotocopiadora":  {"type": "store",                 "keyword": "imprenta fotocopiadora"},
-    "🏥 Centro médico / Clínica":    {"type": "doctor",                "keyword": "clinica medico"},
-}
 
 # ─── UI ─────────────────────────────────────────────────────────────────────────
 
@@ -549,10 +131,15 @@ with col2:
     rubro_config = RUBROS[rubro_label]
 
 with col3:
-    radio = st.slider("Radio (m)", min_value=200, max_value=1500, value=500, step=100)
+    radio = st.slider("Radio (m)", min_value=RADIUS_MIN, max_value=RADIUS_MAX, value=500, step=RADIUS_STEP)
 
 st.markdown("<br>", unsafe_allow_html=True)
-analizar = st.button("🔍 Analizar ubicación")
+b1, b2 = st.columns([1, 3])
+analizar = b1.button("🔍 Analizar ubicación")
+barrido = b2.checkbox(
+    "📈 Barrido de radios",
+    help=f"Consulta una sola vez a {RADIUS_MAX} m: después mover el radio es instantáneo y no usa la API",
+)
 
 # ── Session state init ─────────────────────────────────────────────────────────
 if "resultado" not in st.session_state:
@@ -562,6 +149,17 @@ if st.session_state.resultado and "rubro_label" not in st.session_state.resultad
     st.session_state.resultado = None
 
 # ── Analysis ──────────────────────────────────────────────────────────────────
+# El análisis corre en la cola de trabajos; la sesión sólo guarda el id y consulta el progreso.
+# Los trabajos son de la sesión del servidor que los creó: el id no se acepta desde la URL
+# y la cola no devuelve trabajos de otra sesión.
+if "user_id" not in st.session_state:
+    ctx = get_script_run_ctx()
+    st.session_state.user_id = ctx.session_id if ctx else uuid.uuid4().hex[:12]
+if "job_id" not in st.session_state:
+    st.session_state.job_id = None
+
+traza = None  # métricas del análisis adoptado en este rerun (si lo hubo)
+
 if analizar:
     if not google_key:
         st.error("⚠️ Ingresá tu Google Places API key en el panel lateral para continuar.")
@@ -569,65 +167,75 @@ if analizar:
     if not direccion:
         st.error("⚠️ Completá la dirección.")
         st.stop()
+    try:
+        st.session_state.job_id = get_job_queue().submit(st.session_state.user_id, direccion, rubro_label,
+                                                         RADIUS_MAX if barrido else radio, google_key,
+                                                         sweep=barrido)
+    except TooManyJobs as e:
+        st.error(f"⚠️ {e}")
+        st.stop()
 
-    with st.spinner("Analizando ubicación..."):
-
-        # 1. Geocodificar
-        coords = geocode_address(direccion, google_key)
-        if not coords:
-            st.error("No se pudo geocodificar la dirección. Verificá que sea una dirección válida de CABA.")
-            st.stop()
-
-        lat, lng = coords["lat"], coords["lng"]
-
-        # 2. Buscar datos
-        competitors = search_places(lat, lng, radio, rubro_config["keyword"], rubro_config["type"], google_key)
-        transit = get_transit_stops(lat, lng, radio, google_key)
-        barrio = get_barrio_from_coords(lat, lng) or "Palermo"
-
-        # DEBUG temporal — borrar una vez que funcione
-        with st.expander("🔍 Debug — qué le mandamos a Google y qué responde"):
-            st.write(f"**Coordenadas:** {lat}, {lng}")
-            st.write(f"**Barrio detectado:** {barrio}")
-            st.write(f"**Rubro type:** `{rubro_config['type']}` | keyword: `{rubro_config['keyword']}`")
-            st.write(f"**Radio:** {radio}m")
-            st.write(f"**Competidores encontrados:** {len(competitors)}")
-            if competitors:
-                st.write("Primeros 3:", [p.get("name") for p in competitors[:3]])
-            else:
-                # Hacer la llamada cruda para ver el status de Google
-                url = "https://maps.googleapis.com/maps/api/place/nearbysearch/json"
-                params = {"location": f"{lat},{lng}", "radius": radio, "type": rubro_config["type"], "key": google_key, "language": "es"}
-                r_debug = requests.get(url, params=params, timeout=10)
-                st.write("**Respuesta cruda de Google:**", r_debug.json().get("status"), r_debug.json().get("error_message", ""))
-        transit = get_transit_stops(lat, lng, radio, google_key)
-        barrio = get_barrio_from_coords(lat, lng) or "Palermo"
-
-        # 3. Calcular scores
-        s_comp, c_comp, d_comp = score_competencia(competitors, radio)
-        s_trans, c_trans, d_trans = score_transporte(transit, radio)
-        s_alq, c_alq, d_alq, precio_m2 = score_alquiler(barrio, rubro_label)
-        s_demo, c_demo, d_demo = score_demografia(barrio, rubro_label)
-
-        score_total = global_score(
-            [s_comp, s_trans, s_alq, s_demo],
-            [0.35, 0.20, 0.25, 0.20]
-        )
 
-        insights = get_key_insights(c_comp, c_trans, c_alq, c_demo, score_total)
-
-        # Guardar todo en session_state
-        st.session_state.resultado = {
-            "coords": coords, "barrio": barrio, "radio": radio,
-            "rubro_label": rubro_label,
-            "competitors": competitors, "transit": transit,
-            "score_total": score_total,
-            "c_comp": c_comp, "d_comp": d_comp,
-            "c_trans": c_trans, "d_trans": d_trans,
-            "c_alq": c_alq, "d_alq": d_alq, "precio_m2": precio_m2,
-            "c_demo": c_demo, "d_demo": d_demo,
-            "insights": insights,
-        }
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def progreso_analisis(job_id):
+    """Progreso del trabajo en curso; se refresca solo sin rerun de toda la página."""
+    import streamlit.components.v1 as components
+    from localscope.maps import build_map
+
+    job = get_job_queue().get(job_id, st.session_state.user_id)
+    if job is None or not job.active:
+        st.rerun()  # terminó: rerun completo para mostrar el resultado
+    st.progress(job.progress, text=job.stage)
+    if job.partial and job.coords:
+        # Vista previa mientras llegan las páginas de competidores
+        _, c_parcial, d_parcial = score_competencia(job.partial, job.radius)
+        st.markdown(f"<div class='layer-detail'>{dot_html(c_parcial)} Buscando competidores… {d_parcial}</div>",
+                    unsafe_allow_html=True)
+        components.html(build_map(job.coords["lat"], job.coords["lng"], job.radius, job.partial, [])._repr_html_(),
+                        height=300)
+    if st.button("✖ Cancelar análisis"):
+        get_job_queue().cancel(job_id, st.session_state.user_id)
+
+
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def progreso_cartera(job_id, cancelar):
+    """Avance de un trabajo de la cartera (revisión o exportación de reportes)."""
+    job = get_job_queue().get(job_id, st.session_state.user_id)
+    if job is None or not job.active:
+        st.rerun()
+    st.progress(job.progress, text=job.stage)
+    if st.button(cancelar, key=f"cancelar_{job_id}"):
+        get_job_queue().cancel(job_id, st.session_state.user_id)
+
+
+job = get_job_queue().get(st.session_state.job_id, st.session_state.user_id) if st.session_state.job_id else None
+if job is not None and job.active:
+    progreso_analisis(job.id)
+elif job is not None and st.session_state.get("job_adoptado") != job.id:
+    st.session_state.job_adoptado = job.id
+    if job.status == DONE:
+        # Un barrido se guarda entero para recalcular otros radios localmente; un análisis común se
+        # muestra con el radio con el que corrió aunque el slider se haya movido mientras tanto
+        st.session_state.analisis_barrido = job.result if job.sweep else None
+        resultado = job.result.at_radius(radio) if job.sweep and job.result.radius > radio else job.result
+        st.session_state.analisis = resultado
+        st.session_state.resultado = resultado.to_session()
+        st.session_state.resultado["map_key"] = result_key(st.session_state.resultado)
+        traza = job.trace
+        st.session_state.resultado["metrics"] = job.saved_metrics
+    elif job.status == FAILED:
+        st.error(job.error)
+    elif job.status == CANCELLED:
+        st.info("Análisis cancelado.")
+
+# Con un barrido, mover el slider recalcula el resultado sin consultar la API
+analisis_barrido = st.session_state.get("analisis_barrido")
+if analisis_barrido is not None and st.session_state.resultado and st.session_state.resultado["radio"] != radio:
+    metricas = st.session_state.resultado.get("metrics")
+    st.session_state.analisis = analisis_barrido.at_radius(radio)
+    st.session_state.resultado = st.session_state.analisis.to_session()
+    st.session_state.resultado["map_key"] = result_key(st.session_state.resultado)
+    st.session_state.resultado["metrics"] = metricas
 
 # ── Mostrar resultados desde session_state ────────────────────────────────────
 if st.session_state.resultado:
@@ -645,7 +253,9 @@ if st.session_state.resultado:
     c_demo      = r["c_demo"]; d_demo  = r["d_demo"]
     insights    = r["insights"]
     lat, lng    = coords["lat"], coords["lng"]
-    st.markdown(f"<div style='color:#666; font-size:0.85rem; margin-bottom:1.5rem'>📌 {coords['formatted']} · Barrio: <b style='color:#aaa'>{barrio}</b> · Rubro: <b style='color:#aaa'>{rubro_label}</b></div>", unsafe_allow_html=True)
+    st.markdown(f"<div style='color:#666; font-size:0.85rem; margin-bottom:1.5rem'>📌 {coords['formatted']} · Barrio: <b style='color:#aaa'>{barrio}</b> · Rubro: <b style='color:#aaa'>{rubro_label}</b> · Radio: <b style='color:#aaa'>{radio_r} m</b></div>", unsafe_allow_html=True)
+    if radio_r != radio:
+        st.caption(f"Análisis hecho con radio {radio_r} m; para {radio} m, volvé a analizar o activá el barrido de radios.")
 
     left, right = st.columns([2, 3])
 
@@ -667,9 +277,6 @@ if st.session_state.resultado:
         """, unsafe_allow_html=True)
 
         # Capas
-        def dot_html(color):
-            return f'<span class="dot {color}"></span>'
-
         def layer_card(title, dot_color, value, detail):
             return f"""
             <div class="layer-card">
@@ -689,7 +296,7 @@ if st.session_state.resultado:
         st.markdown(layer_card(
             "Transporte público",
             c_trans,
-            f"{len(set(s.get('place_id') for s in transit))} paradas",
+            f"{len(transit)} paradas",
             d_trans
         ), unsafe_allow_html=True)
 
@@ -709,8 +316,36 @@ if st.session_state.resultado:
 
     with right:
         # Mapa
-        mapa = build_map(lat, lng, radio, competitors, transit)
-        st_folium(mapa, width=None, height=420)
+        key = r.get("map_key") or result_key(r)
+        t1, t2, t3 = st.columns(3)
+        ver_comp = t1.checkbox("🔴 Competidores", value=True)
+        ver_trans = t2.checkbox("🔵 Transporte", value=True)
+        ver_calor = t3.checkbox("🌡️ Mapa de calor", help="Score global cada 100 m alrededor de la dirección")
+
+        with traza.span("map_build") if traza else nullcontext():
+            capas = []
+            if ver_calor:
+                if google_key:
+                    with st.spinner("Calculando mapa de calor..."):
+                        heatmap = cached_heatmap(key, rubro_label, radio_r, lat, lng, barrio, google_key)
+                    capas.append(cached_layer("heatmap", key, heatmap))
+                else:
+                    st.caption("Ingresá tu API key para calcular el mapa de calor.")
+            if ver_comp:
+                capas.append(cached_layer("competitors", key, competitors))
+            if ver_trans:
+                capas.append(cached_layer("transit", key, transit))
+            mapa_base = cached_base_map(lat, lng, radio_r)
+
+        with traza.span("map_render") if traza else nullcontext():
+            from streamlit_folium import st_folium
+            st_folium(
+                mapa_base,
+                feature_group_to_add=capas,
+                returned_objects=[],  # paneo/zoom no disparan reruns
+                key=f"mapa_{key}",
+                width=None, height=420,
+            )
 
         # Insights
         st.markdown("<br>", unsafe_allow_html=True)
@@ -728,11 +363,208 @@ if st.session_state.resultado:
         </div>
         """, unsafe_allow_html=True)
 
+    if analisis_barrido is not None:
+        with st.expander("📈 Score según radio", expanded=True):
+            curva = radius_curve(analisis_barrido)
+            st.line_chart(
+                {k: [c[k] for c in curva] for k in ("radio", "score_total", "competencia", "transporte")},
+                x="radio", y=["score_total", "competencia", "transporte"], height=260,
+            )
+            st.caption(f"Calculado con una sola consulta a {RADIUS_MAX} m · radio actual: {radio_r} m")
+
+    # Métricas: la traza del trabajo (exportada por la cola) más los spans del mapa
+    if traza:
+        r["metrics"] = traza.to_dict()
+
+    with st.expander("📊 Métricas del análisis"):
+        m = r.get("metrics")
+        if m:
+            st.caption(f"Traza {m['id']} · costo estimado de APIs: US$ {m['cost_usd']:.3f}")
+            st.dataframe(m["spans"], use_container_width=True, hide_index=True)
+            st.write("**Llamadas a APIs:**", m["api_calls"] or "ninguna (todo desde caché)")
+            st.write("**Cachés:**", m["cache"])
+        if r.get("errores"):
+            st.write("**Consultas fallidas o vencidas:**", r["errores"])
+        st.write("**Cliente HTTP (proceso):**", get_api_client().stats())
+        d1, d2 = st.columns(2)
+        if m:
+            d1.download_button("⬇️ Traza (JSON lines)", json.dumps(m, ensure_ascii=False) + "\n",
+                               file_name=f"traza_{m['id']}.jsonl", mime="application/jsonl")
+        d2.download_button("⬇️ Totales (Prometheus)", metrics.REGISTRY.prometheus_text(),
+                           file_name="localscope.prom", mime="text/plain")
+
+    analisis = st.session_state.get("analisis")
+    if analisis is not None:
+        g1, g2 = st.columns(2)
+        if g1.button("💾 Guardar en la cartera"):
+            get_portfolio().add(analisis)
+            st.success("Ubicación guardada: se revisa periódicamente y se avisan los cambios de competencia y score.")
+        # El reporte se renderiza recién cuando se pide, no con cada resultado
+        clave_reporte = st.session_state.resultado["map_key"]
+        if st.session_state.get("reporte_pedido") == clave_reporte:
+            g2.download_button("⬇️ Reporte (HTML)", cached_report(clave_reporte, analisis.score_total, analisis),
+                               file_name="localscope_reporte.html", mime="text/html")
+        elif g2.button("📄 Generar reporte (HTML)"):
+            st.session_state.reporte_pedido = clave_reporte
+            st.rerun()
+
 else:
     st.markdown("""
     <div style='text-align:center; padding:4rem 2rem; color:#444'>
         <div style='font-size:3rem; margin-bottom:1rem'>🗺️</div>
-        <div style='font-family:"DM Serif Display",serif; font-size:1.4rem; color:#666'>Ingresá una dirección y un rubro para comenzar</div>
+        <div style='font-family:var(--font-serif); font-size:1.4rem; color:#666'>Ingresá una dirección y un rubro para comenzar</div>
         <div style='font-size:0.85rem; margin-top:0.5rem'>Colocá tus API keys en el panel lateral ←</div>
     </div>
     """, unsafe_allow_html=True)
+
+# ── Comparar múltiples direcciones ────────────────────────────────────────────
+st.markdown("---")
+with st.expander("📋 Comparar múltiples direcciones"):
+    st.markdown(
+        "<div class='layer-detail'>Subí un CSV con una columna <code>direccion</code> "
+        "(y opcionalmente <code>rubro</code>) o pegá una dirección por línea.</div>",
+        unsafe_allow_html=True,
+    )
+    archivo = st.file_uploader("CSV de direcciones", type=["csv"])
+    texto_lote = st.text_area("Direcciones", placeholder="Av. Corrientes 1500\nAv. Cabildo 2000")
+    rubros_lote = st.multiselect("Rubros", options=list(RUBROS.keys()), default=[rubro_label])
+    tope_llamadas = st.number_input("Tope de llamadas a la API", min_value=10, value=500, step=50)
+    comparar = st.button("📊 Comparar ubicaciones")
+
+    if comparar:
+        if not google_key:
+            st.error("⚠️ Ingresá tu Google Places API key en el panel lateral para continuar.")
+            st.stop()
+        direcciones = [linea for linea in texto_lote.splitlines() if linea.strip()]
+        if archivo is not None:
+            try:
+                dirs_csv, rubros_csv = parse_batch_csv(archivo.getvalue())
+            except ValueError as e:
+                st.error(str(e))
+                st.stop()
+            direcciones += dirs_csv
+            rubros_lote = list(dict.fromkeys(rubros_lote + [r for r in map(resolve_rubro, rubros_csv) if r]))
+        if not direcciones or not rubros_lote:
+            st.error("⚠️ Cargá al menos una dirección y un rubro.")
+            st.stop()
+
+        budget = get_api_client()
+        llamadas_antes = budget.calls
+        with st.spinner(f"Analizando {len(direcciones) * len(rubros_lote)} combinaciones..."):
+            filas = analyze_batch(direcciones, rubros_lote, radio, google_key,
+                                  max_workers=BATCH_MAX_WORKERS, max_calls=int(tope_llamadas))
+        st.session_state.lote = {"filas": filas, "llamadas": budget.calls - llamadas_antes}
+
+    if st.session_state.get("lote"):
+        lote = st.session_state.lote
+        st.caption(f"{len(lote['filas'])} combinaciones · {lote['llamadas']} llamadas a la API")
+        st.dataframe(
+            [{"#": i + 1, **{k: v for k, v in f.items() if k not in ("lat", "lng")}}
+             for i, f in enumerate(lote["filas"])],
+            use_container_width=True, hide_index=True,
+        )
+
+# ── Mejores ubicaciones en un barrio ──────────────────────────────────────────
+with st.expander("🎯 Buscar las mejores ubicaciones en un barrio"):
+    st.markdown(
+        "<div class='layer-detail'>Recorre el barrio con una grilla que se afina alrededor de los mejores "
+        "puntos. Los lugares del área se consultan una sola vez, sin importar cuántos candidatos se evalúen.</div>",
+        unsafe_allow_html=True,
+    )
+    o1, o2 = st.columns([3, 1])
+    barrio_opt = o1.selectbox("Barrio", options=sorted(get_barrio_store().names()))
+    top_k = o2.number_input("Ubicaciones", min_value=1, max_value=20, value=5)
+    optimizar = st.button("🎯 Buscar ubicaciones")
+
+    if optimizar:
+        if not google_key:
+            st.error("⚠️ Ingresá tu Google Places API key en el panel lateral para continuar.")
+            st.stop()
+        budget = get_api_client()
+        llamadas_antes = budget.calls
+        with st.spinner(f"Buscando las mejores ubicaciones en {barrio_opt}..."):
+            try:
+                mejores = optimize_location(rubro_label, barrio=barrio_opt, radius=radio, api_key=google_key,
+                                            top_k=int(top_k))
+            except (ValueError, KeyError) as e:
+                st.error(str(e))
+                st.stop()
+        st.session_state.optimo = {"filas": mejores, "llamadas": budget.calls - llamadas_antes}
+
+    if st.session_state.get("optimo"):
+        optimo = st.session_state.optimo
+        st.caption(f"{len(optimo['filas'])} ubicaciones · {optimo['llamadas']} llamadas a la API")
+        st.dataframe(
+            [{"#": i + 1, "ubicacion": r.formatted, "barrio": r.barrio, "score": r.score_total,
+              "competencia": r.competencia.score, "transporte": r.transporte.score,
+              "alquiler": r.alquiler.score, "demografia": r.demografia.score,
+              "competidores": len(r.competitors)}
+             for i, r in enumerate(optimo["filas"])],
+            use_container_width=True, hide_index=True,
+        )
+
+# ── Cartera de ubicaciones guardadas ─────────────────────────────────────────
+with st.expander("🗂️ Cartera de ubicaciones guardadas"):
+    cartera = get_portfolio()
+    if clave_servidor := server_api_key():
+        portfolio_scheduler(clave_servidor)
+    sitios = cartera.sites()
+    if not sitios:
+        st.caption("Guardá un análisis con «💾 Guardar en la cartera» para seguir sus cambios.")
+    else:
+        st.dataframe(
+            [{"ubicacion": s.nombre, "rubro": s.result.rubro, "radio": s.result.radius,
+              "score": s.result.score_total, "revisada": time.strftime("%d/%m %H:%M", time.localtime(s.checked)),
+              "error": s.error or ""} for s in sitios],
+            use_container_width=True, hide_index=True,
+        )
+        if st.button("🔄 Revisar cambios ahora"):
+            if not google_key:
+                st.error("⚠️ Ingresá tu Google Places API key en el panel lateral para continuar.")
+                st.stop()
+            try:
+                st.session_state.refresh_job = get_job_queue().submit_refresh(st.session_state.user_id, google_key,
+                                                                              [s.id for s in sitios])
+            except TooManyJobs as e:
+                st.error(f"⚠️ {e}")
+        # La revisión y los reportes corren en la cola de trabajos; acá sólo se consulta el avance
+        revision = (get_job_queue().get(st.session_state.refresh_job, st.session_state.user_id)
+                    if st.session_state.get("refresh_job") else None)
+        if revision is not None and revision.active:
+            progreso_cartera(revision.id, "✖ Cancelar revisión")
+        elif revision is not None and revision.status == DONE:
+            st.caption(revision.stage)
+        elif revision is not None and revision.status == FAILED:
+            st.error(revision.error)
+        if st.button("📦 Exportar reportes (ZIP)"):
+            destino = new_export_path()
+            try:
+                anterior = get_job_queue().get(st.session_state.get("export_job") or "", st.session_state.user_id)
+                st.session_state.export_job = get_job_queue().submit_export(st.session_state.user_id, destino,
+                                                                            len(sitios))
+            except TooManyJobs as e:
+                discard_export(destino)
+                st.error(f"⚠️ {e}")
+            else:
+                if anterior is not None and not anterior.active:
+                    discard_export(anterior.output)  # la sesión sólo ofrece su última exportación
+        exportacion = (get_job_queue().get(st.session_state.export_job, st.session_state.user_id)
+                       if st.session_state.get("export_job") else None)
+        if exportacion is not None and exportacion.active:
+            progreso_cartera(exportacion.id, "✖ Cancelar exportación")
+        elif exportacion is not None and exportacion.status == DONE and os.path.exists(exportacion.output):
+            with open(exportacion.output, "rb") as f:
+                st.download_button("⬇️ Descargar reportes", f, file_name="localscope_reportes.zip",
+                                   mime="application/zip")
+        elif exportacion is not None and exportacion.status == FAILED:
+            st.error(exportacion.error)
+        eventos = cartera.events(limit=50)
+        if eventos:
+            nombres = {s.id: s.nombre for s in sitios}
+            st.dataframe(
+                [{"fecha": time.strftime("%d/%m %H:%M", time.localtime(e.ts)), "ubicacion": nombres.get(e.site_id, e.site_id),
+                  "cambio": e.kind, "detalle": json.dumps(e.detail, ensure_ascii=False)} for e in eventos],
+                use_container_width=True, hide_index=True,
+            )
+
+metrics.REGISTRY.add_stage("app_rerun", time.perf_counter() - _inicio_rerun)
@@ -0,0 +1 @@
+"""Benchmarks reproducibles de LocalScope (offline, con APIs simuladas)."""
@@ -0,0 +1,212 @@
+"""Sustituto offline de Google Geocoding / Nearby Search y de la API de datos abiertos.
+
+`ReplaySession` implementa la parte de `requests.Session` que usa ApiClient
+(`get` y `mount`). Responde primero con respuestas grabadas (fixtures) y, si
+no hay grabación para un request, con un mundo sintético determinístico:
+lugares repartidos por CABA, paginación con next_page_token (incluido el
+INVALID_REQUEST mientras el token "no está listo"), estados de error y
+latencia de red configurable.
+
+`RecordingSession` envuelve una sesión real y guarda las respuestas para
+reproducirlas después sin red.
+"""
+import hashlib
+import json
+import math
+import random
+import threading
+import time
+import uuid
+
+import requests
+
+from localscope.barrios import get_barrio_store
+from localscope.cache import normalize_address
+from localscope.geo import haversine
+from localscope.grid import CABA_BBOX
+
+TRANSIT_TYPES = ("transit_station", "bus_station")
+PAGE_SIZE = 20
+MAX_RESULTS = 60
+
+
+class FakeResponse:
+    def __init__(self, data, status_code: int = 200):
+        self._data = data
+        self.status_code = status_code
+
+    def json(self):
+        return self._data
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} simulado", response=self)
+
+
+def _fixture_key(url: str, params: dict | None) -> str:
+    limpio = {k: v for k, v in (params or {}).items() if k != "key"}
+    return url + "?" + json.dumps(limpio, sort_keys=True, default=str)
+
+
+def load_fixtures(path: str) -> dict:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+class SyntheticWorld:
+    """Lugares sintéticos por (type, keyword), generados de forma determinística."""
+
+    def __init__(self, seed: int = 0, places_per_query: int = 3000, transit_per_type: int = 1500,
+                 bbox: tuple = CABA_BBOX):
+        self.seed = seed
+        self.bbox = bbox
+        self.places_per_query = places_per_query
+        self.transit_per_type = transit_per_type
+        self._places: dict[tuple, list] = {}
+        self._lock = threading.Lock()
+        self._barrios = get_barrio_store().names()
+
+    def _rng(self, *parts) -> random.Random:
+        digest = hashlib.sha256(repr((self.seed, *parts)).encode()).digest()
+        return random.Random(int.from_bytes(digest[:8], "big"))
+
+    def places(self, place_type: str, keyword: str) -> list:
+        key = (place_type or "", keyword or "")
+        with self._lock:
+            if key not in self._places:
+                rng = self._rng("places", *key)
+                n = self.transit_per_type if place_type in TRANSIT_TYPES else self.places_per_query
+                lat0, lng0, lat1, lng1 = self.bbox
+                prefijo = hashlib.sha256(repr(key).encode()).hexdigest()[:8]
+                self._places[key] = [{
+                    "place_id": f"{prefijo}-{i}",
+                    "name": f"{key[1] or key[0]} {i}",
+                    "rating": round(rng.uniform(2.5, 5.0), 1) if rng.random() < 0.85 else None,
+                    "user_ratings_total": rng.randint(0, 2000),
+                    "types": [key[0] or "establishment"],
+                    "geometry": {"location": {"lat": rng.uniform(lat0, lat1), "lng": rng.uniform(lng0, lng1)}},
+                } for i in range(n)]
+            return self._places[key]
+
+    def geocode(self, address: str) -> dict:
+        nombre = normalize_address(address)
+        if "inexistente" in nombre:
+            return {"status": "ZERO_RESULTS", "results": []}
+        rng = self._rng("geo", nombre)
+        # Direcciones en la zona central (donde se concentran los análisis reales)
+        lat, lng = rng.uniform(-34.64, -34.56), rng.uniform(-58.47, -58.37)
+        return {"status": "OK", "results": [{
+            "formatted_address": f"{address}, CABA, Argentina",
+            "geometry": {"location": {"lat": lat, "lng": lng}},
+        }]}
+
+    def nearby(self, lat: float, lng: float, radius: float, place_type: str, keyword: str,
+               limit: int | None = MAX_RESULTS) -> list:
+        """Lugares en el radio, como Nearby Search (`limit=None`: todos, para comparar contra la verdad)."""
+        cerca = [p for p in self.places(place_type, keyword)
+                 if haversine(lat, lng, p["geometry"]["location"]["lat"], p["geometry"]["location"]["lng"]) <= radius]
+        # Google ordena por "prominencia": lo simulamos con la cantidad de reseñas
+        cerca.sort(key=lambda p: -p["user_ratings_total"])
+        return cerca[:limit]
+
+    def barrio(self, lat: float, lng: float) -> dict:
+        # Grilla de ~1.5 km con barrios asignados de forma determinística
+        celda = (math.floor(lat / 0.015), math.floor(lng / 0.015))
+        return {"nombre": self._rng("barrio", celda).choice(self._barrios)}
+
+
+class ReplaySession:
+    """Sesión simulada: fixtures grabados primero, mundo sintético después."""
+
+    def __init__(self, world: SyntheticWorld | None = None, fixtures: dict | None = None,
+                 latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0,
+                 token_delay: float = 0.0, seed: int = 0):
+        self.world = world or SyntheticWorld(seed=seed)
+        self.fixtures = fixtures or {}
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.token_delay = token_delay
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._tokens: dict[str, tuple[float, list]] = {}
+        self.requests = 0
+
+    def mount(self, prefix, adapter):
+        pass
+
+    def _sleep(self):
+        with self._lock:
+            extra = self._rng.uniform(0, self.jitter) if self.jitter else 0
+        if self.latency or extra:
+            time.sleep(self.latency + extra)
+
+    def _fallo(self) -> FakeResponse | None:
+        with self._lock:
+            if not self.error_rate or self._rng.random() >= self.error_rate:
+                return None
+            if self._rng.random() < 0.5:
+                return FakeResponse({}, status_code=503)
+        return FakeResponse({"status": "OVER_QUERY_LIMIT", "results": []})
+
+    def _page(self, results: list) -> dict:
+        data = {"status": "OK" if results else "ZERO_RESULTS", "results": results[:PAGE_SIZE]}
+        resto = results[PAGE_SIZE:]
+        if resto:
+            token = uuid.uuid4().hex
+            with self._lock:
+                self._tokens[token] = (time.monotonic() + self.token_delay, resto)
+            data["next_page_token"] = token
+        return data
+
+    def get(self, url: str, params: dict | None = None, timeout: float | None = None):
+        with self._lock:
+            self.requests += 1
+        self._sleep()
+        params = params or {}
+        if (grabado := self.fixtures.get(_fixture_key(url, params))) is not None:
+            return FakeResponse(grabado["body"], grabado.get("status_code", 200))
+        if (fallo := self._fallo()) is not None:
+            return fallo
+
+        if "geocode" in url:
+            return FakeResponse(self.world.geocode(params["address"]))
+        if "nearbysearch" in url:
+            if "pagetoken" in params:
+                with self._lock:
+                    listo, resto = self._tokens.get(params["pagetoken"], (None, None))
+                if resto is None:
+                    return FakeResponse({"status": "INVALID_REQUEST", "results": []})
+                if time.monotonic() < listo:
+                    return FakeResponse({"status": "INVALID_REQUEST", "results": []})
+                return FakeResponse(self._page(resto))
+            lat, lng = map(float, str(params["location"]).split(","))
+            results = self.world.nearby(lat, lng, float(params["radius"]),
+                                        params.get("type", ""), params.get("keyword", ""))
+            return FakeResponse(self._page(results))
+        if "datosabiertos" in url:
+            return FakeResponse(self.world.barrio(float(params["y"]), float(params["x"])))
+        return FakeResponse({"status": "NOT_FOUND"}, status_code=404)
+
+
+class RecordingSession(requests.Session):
+    """Sesión real que graba cada respuesta JSON para reproducirla con ReplaySession."""
+
+    def __init__(self):
+        super().__init__()
+        self.recorded: dict = {}
+        self._record_lock = threading.Lock()
+
+    def get(self, url, params=None, **kwargs):
+        r = super().get(url, params=params, **kwargs)
+        try:
+            body = r.json()
+        except ValueError:
+            return r
+        with self._record_lock:
+            self.recorded[_fixture_key(url, params)] = {"status_code": r.status_code, "body": body}
+        return r
+
+    def save(self, path: str) -> None:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.recorded, f, ensure_ascii=False)
@@ -0,0 +1,307 @@
+"""Suite de benchmarks offline.
+
+    python -m bench.run                         # todas las suites, latencia simulada 50 ms
+    python -m bench.run --latency-ms 120 --suite analyze batch
+    python -m bench.run --out bench.json        # guardar resultados
+    python -m bench.run --baseline bench.json --tolerance 0.25   # falla si algo empeora >25 %
+
+Suites:
+- analyze: latencia de punta a punta de `analyze` (caché fría y caliente)
+- batch:   throughput de `analyze_batch` (filas/s)
+- scoring: `score_location` sobre conjuntos grandes de competidores y el motor de grilla
+- map:     construcción y serialización HTML del mapa folium
+- startup: arranque en frío de la app (proceso nuevo) y duración de cada rerun
+- tiles:   completitud de la caché de teselas en un mundo denso (teselas vs. consulta directa vs. total
+           real); falla si las teselas pierden lugares
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+# Cachés y métricas en un directorio temporal: el benchmark no toca .cache/
+_TMP = tempfile.mkdtemp(prefix="localscope-bench-")
+os.environ.setdefault("LOCALSCOPE_CACHE_PATH", os.path.join(_TMP, "cache.sqlite"))
+os.environ.setdefault("LOCALSCOPE_METRICS_PATH", os.path.join(_TMP, "metrics.jsonl"))
+
+from localscope import lookups  # noqa: E402
+from localscope.analysis import analyze, analyze_batch, get_result_cache  # noqa: E402
+from localscope.client import ApiClient  # noqa: E402
+from localscope.places import Place, parse_places  # noqa: E402
+from localscope.rubros import RUBROS  # noqa: E402
+from localscope.scoring import score_location  # noqa: E402
+
+from .replay import ReplaySession, SyntheticWorld, load_fixtures  # noqa: E402
+
+SUITES = ("analyze", "batch", "scoring", "map", "startup", "tiles")
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+
+
+def _addresses(n: int, seed: int) -> list[str]:
+    rng = random.Random(seed)
+    calles = ["Av. Corrientes", "Av. Santa Fe", "Av. Cabildo", "Av. Rivadavia", "Thames", "Gurruchaga",
+              "Av. Córdoba", "Defensa", "Av. Scalabrini Ortiz", "Av. Triunvirato"]
+    return [f"{rng.choice(calles)} {rng.randint(1, 60) * 100}" for _ in range(n)]
+
+
+def _percentiles(valores: list[float]) -> dict:
+    valores = sorted(valores)
+    return {
+        "p50_ms": round(statistics.median(valores) * 1000, 2),
+        "p95_ms": round(valores[min(len(valores) - 1, int(len(valores) * 0.95))] * 1000, 2),
+        "n": len(valores),
+    }
+
+
+def _clear_caches() -> None:
+    get_result_cache().clear()
+    lookups.get_geocode_cache().clear()
+    for tiles in lookups.get_tile_caches().values():
+        tiles.store.clear()
+
+
+def setup(args) -> ReplaySession:
+    fixtures = load_fixtures(args.fixtures) if args.fixtures else None
+    session = ReplaySession(
+        world=SyntheticWorld(seed=args.seed), fixtures=fixtures,
+        latency=args.latency_ms / 1000, jitter=args.jitter_ms / 1000,
+        error_rate=args.error_rate, token_delay=args.token_delay_ms / 1000, seed=args.seed,
+    )
+    # Sin rate limit: medimos el pipeline, no el token bucket
+    lookups.get_api_client.override(ApiClient(rate=1e9, burst=10**9, backoff_base=0.01, session=session))
+    lookups.PAGE_TOKEN_DELAY = args.token_delay_ms / 1000
+    lookups.PAGE_TOKEN_POLL = max(args.token_delay_ms / 1000 / 4, 0.005)
+    return session
+
+
+def bench_analyze(args, session) -> dict:
+    rubros = list(RUBROS)
+    direcciones = _addresses(args.iterations, args.seed)
+    frio, caliente = [], []
+    for i, direccion in enumerate(direcciones):
+        rubro = rubros[i % len(rubros)]
+        _clear_caches()
+        t = time.perf_counter()
+        analyze(direccion, rubro, args.radius, api_key="bench")
+        frio.append(time.perf_counter() - t)
+        t = time.perf_counter()
+        analyze(direccion, rubro, args.radius, api_key="bench")
+        caliente.append(time.perf_counter() - t)
+    return {"cold": _percentiles(frio), "warm": _percentiles(caliente)}
+
+
+def bench_batch(args, session) -> dict:
+    _clear_caches()
+    direcciones = _addresses(args.batch_size, args.seed + 1)
+    rubros = list(RUBROS)[:args.batch_rubros]
+    antes = session.requests
+    t = time.perf_counter()
+    filas = analyze_batch(direcciones, rubros, args.radius, api_key="bench", max_workers=args.workers)
+    dt = time.perf_counter() - t
+    return {
+        "rows": len(filas), "seconds": round(dt, 3), "rows_per_s": round(len(filas) / dt, 2),
+        "http_requests": session.requests - antes, "errors": sum("error" in f for f in filas),
+    }
+
+
+def _synthetic_places(n: int, seed: int, lat: float = -34.6, lng: float = -58.4) -> list:
+    rng = random.Random(seed)
+    return [Place(place_id=str(i), name=f"Local {i}", rating=round(rng.uniform(2.5, 5), 1),
+                  lat=lat + rng.uniform(-0.01, 0.01), lng=lng + rng.uniform(-0.01, 0.01))
+            for i in range(n)]
+
+
+def bench_scoring(args, session) -> dict:
+    from localscope.grid import city_grid, places_to_arrays, score_grid
+
+    rubro = list(RUBROS)[0]
+    resultados = {}
+    for n in (1_000, 10_000, 100_000):
+        competitors = _synthetic_places(n, args.seed)
+        transit = competitors[: n // 10]
+        tiempos = []
+        for _ in range(5):
+            t = time.perf_counter()
+            score_location(competitors, transit, "Palermo", rubro, args.radius)
+            tiempos.append(time.perf_counter() - t)
+        resultados[f"score_location_{n}"] = _percentiles(tiempos)
+
+    qlat, qlng = city_grid(100)
+    comp = places_to_arrays(parse_places(session.world.places(RUBROS[rubro]["type"], RUBROS[rubro]["keyword"])))
+    transit = places_to_arrays(parse_places(session.world.places("transit_station", "")))[:2]
+    t = time.perf_counter()
+    score_grid(qlat, qlng, rubro, args.radius, comp, transit)
+    resultados["score_grid_caba_100m"] = {"cells": len(qlat), "ms": round((time.perf_counter() - t) * 1000, 2)}
+    return resultados
+
+
+def bench_map(args, session) -> dict:
+    from localscope.maps import build_map
+
+    resultados = {}
+    for n in (100, 1_000, 5_000):
+        competitors = _synthetic_places(n, args.seed)
+        transit = _synthetic_places(n // 5, args.seed + 1)
+        t = time.perf_counter()
+        m = build_map(-34.6, -58.4, args.radius, competitors, transit)
+        build = time.perf_counter() - t
+        t = time.perf_counter()
+        m.get_root().render()
+        render = time.perf_counter() - t
+        resultados[f"places_{n}"] = {"build_ms": round(build * 1000, 2), "render_ms": round(render * 1000, 2)}
+    return resultados
+
+
+def bench_tiles(args, session) -> dict:
+    from localscope.cache import MemoryCache
+    from localscope.tiles import PlaceTileCache
+
+    from .replay import PAGE_SIZE
+
+    # ~500 lugares/km² alrededor del punto de prueba: una consulta de 500 m ya supera los 60 resultados
+    lat, lng = -34.588, -58.43
+    world = SyntheticWorld(seed=args.seed, places_per_query=12_000,
+                           bbox=(lat - 0.025, lng - 0.03, lat + 0.025, lng + 0.03))
+    consultas = []
+
+    def fetch(f_lat, f_lng, radius, keyword, place_type):
+        consultas.append(radius)
+        results = parse_places(world.nearby(f_lat, f_lng, radius, place_type, keyword))
+        for i in range(0, len(results), PAGE_SIZE):
+            yield results[i:i + PAGE_SIZE]
+
+    tiles = PlaceTileCache(MemoryCache(ttl=3600, max_entries=10_000, name="bench_tiles"))
+    resultados = {}
+    for radius in (200, 500, 1000):
+        t = time.perf_counter()
+        n_tiles = len(tiles.query(lat, lng, radius, "bench", "", fetch))
+        resultados[f"r{radius}"] = {
+            "tiles": n_tiles,
+            "directo": len(world.nearby(lat, lng, radius, "", "bench")),
+            "real": len(world.nearby(lat, lng, radius, "", "bench", limit=None)),
+            "ms": round((time.perf_counter() - t) * 1000, 2),
+        }
+    resultados["consultas"] = len(consultas)
+    return resultados
+
+
+def tiles_failures(resultados: dict) -> list[str]:
+    """Radios donde la caché de teselas devolvió menos lugares que los reales."""
+    return [f"tiles.{k}: {v['tiles']} de {v['real']} lugares" for k, v in resultados.items()
+            if isinstance(v, dict) and v["tiles"] != v["real"]]
+
+
+# Corre en un intérprete nuevo: mide import + primer render como en un proceso recién escalado
+_STARTUP_SCRIPT = """
+import json, sys, time
+t0 = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+t1 = time.perf_counter()
+at = AppTest.from_file(sys.argv[1], default_timeout=60).run()
+t2 = time.perf_counter()
+reruns = []
+for _ in range(int(sys.argv[2])):
+    t = time.perf_counter()
+    at.run()
+    reruns.append(time.perf_counter() - t)
+print(json.dumps({"streamlit_s": t1 - t0, "first_run_s": t2 - t1, "reruns_s": reruns,
+                  "heavy_loaded": [m for m in ("folium", "streamlit_folium", "numpy", "requests") if m in sys.modules],
+                  "error": bool(at.exception)}))
+"""
+
+
+def bench_startup(args, session) -> dict:
+    salida = subprocess.run([sys.executable, "-c", _STARTUP_SCRIPT, APP_PATH, str(args.iterations)],
+                            capture_output=True, text=True, check=True, env=os.environ.copy())
+    r = json.loads(salida.stdout.strip().splitlines()[-1])
+    return {
+        "import_streamlit_ms": round(r["streamlit_s"] * 1000, 2),
+        "first_run_ms": round(r["first_run_s"] * 1000, 2),
+        "rerun": _percentiles(r["reruns_s"]),
+        "heavy_modules_on_first_run": r["heavy_loaded"],
+        "error": r["error"],
+    }
+
+
+def _flatten(d: dict, prefix: str = "") -> dict:
+    out = {}
+    for k, v in d.items():
+        if isinstance(v, dict):
+            out.update(_flatten(v, f"{prefix}{k}."))
+        else:
+            out[f"{prefix}{k}"] = v
+    return out
+
+
+# Métricas donde "más alto" es mejor; el resto (tiempos) se compara al revés
+HIGHER_IS_BETTER = ("rows_per_s",)
+TIME_SUFFIXES = ("_ms", "seconds")
+
+
+def compare(actual: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Regresiones de `actual` contra `baseline` mayores a `tolerance` (fracción)."""
+    regresiones = []
+    a, b = _flatten(actual), _flatten(baseline)
+    for key, base in b.items():
+        if key not in a or not isinstance(base, (int, float)) or not base:
+            continue
+        if key.endswith(HIGHER_IS_BETTER):
+            if a[key] < base * (1 - tolerance):
+                regresiones.append(f"{key}: {a[key]} < {base}")
+        elif key.endswith(TIME_SUFFIXES) and a[key] > base * (1 + tolerance):
+            regresiones.append(f"{key}: {a[key]} > {base}")
+    return regresiones
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--suite", nargs="+", choices=SUITES, default=list(SUITES))
+    parser.add_argument("--latency-ms", type=float, default=50, help="latencia simulada por request")
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument("--token-delay-ms", type=float, default=0, help="demora hasta que un next_page_token es válido")
+    parser.add_argument("--error-rate", type=float, default=0, help="fracción de requests que fallan (503/OVER_QUERY_LIMIT)")
+    parser.add_argument("--fixtures", help="JSON con respuestas grabadas (RecordingSession.save)")
+    parser.add_argument("--iterations", type=int, default=10)
+    parser.add_argument("--radius", type=int, default=500)
+    parser.add_argument("--batch-size", type=int, default=50)
+    parser.add_argument("--batch-rubros", type=int, default=3)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="guardar resultados como JSON")
+    parser.add_argument("--baseline", help="resultados previos para detectar regresiones")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args(argv)
+
+    session = setup(args)
+    benches = {"analyze": bench_analyze, "batch": bench_batch, "scoring": bench_scoring, "map": bench_map,
+               "startup": bench_startup, "tiles": bench_tiles}
+    resultados = {"config": {k: v for k, v in vars(args).items() if k not in ("out", "baseline")}}
+    for suite in args.suite:
+        t = time.perf_counter()
+        resultados[suite] = benches[suite](args, session)
+        print(f"[{suite}] {time.perf_counter() - t:.1f}s", file=sys.stderr)
+
+    print(json.dumps(resultados, indent=2, ensure_ascii=False))
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(resultados, f, indent=2, ensure_ascii=False)
+    if "tiles" in resultados and (fallas := tiles_failures(resultados["tiles"])):
+        print("Teselas incompletas:\n  " + "\n  ".join(fallas), file=sys.stderr)
+        return 1
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        baseline.pop("config", None)
+        if regresiones := compare({k: v for k, v in resultados.items() if k != "config"}, baseline, args.tolerance):
+            print("Regresiones detectadas:\n  " + "\n  ".join(regresiones), file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,17 @@
+"""Componentes reutilizables de LocalScope (sin dependencia de Streamlit).
+
+    from localscope import analyze
+    r = analyze("Av. Corrientes 1500", "cafeteria", radius=500)
+    r.score_total, r.competencia.color
+"""
+from .analysis import (
+    AnalysisResult, GeocodingError, LayerScore, analyze, analyze_batch, analyze_coords, radius_curve, radius_sweep,
+)
+from .optimize import optimize_location
+from .places import Place
+from .rubros import RUBROS
+
+__all__ = [
+    "AnalysisResult", "GeocodingError", "LayerScore", "Place", "RUBROS",
+    "analyze", "analyze_batch", "analyze_coords", "optimize_location", "radius_curve", "radius_sweep",
+]
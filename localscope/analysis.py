@@ -0,0 +1,342 @@
+"""API headless del análisis: `analyze(address, rubro, radius) -> AnalysisResult`."""
+import bisect
+import hashlib
+import math
+import os
+from dataclasses import dataclass, field, fields, replace
+
+from . import metrics
+from .barrios import BARRIO_DESCONOCIDO, get_barrio_store
+from .batch import SingleFlight, run_batch
+from .cache import MemoryCache, SQLiteCache
+from .datafiles import density_path, file_version, gtfs_path
+from .geo import haversine
+from .lookups import (
+    _singleton, geocode_address, get_barrio_from_coords, get_barrio_resolver, get_api_client,
+    get_transit_stops, run_lookups, search_places,
+)
+from .places import Place
+from .rules import get_rules
+from .rubros import RUBROS, resolve_rubro
+from .scoring import rent_version, score_location
+
+DEFAULT_RADIUS = 500
+RADIUS_MIN, RADIUS_MAX, RADIUS_STEP = 200, 1500, 100
+RADIUS_STEPS = tuple(range(RADIUS_MIN, RADIUS_MAX + 1, RADIUS_STEP))
+
+
+class GeocodingError(ValueError):
+    """La dirección no pudo geocodificarse."""
+
+
+@dataclass
+class LayerScore:
+    score: int
+    color: str      # green / yellow / red
+    desc: str
+
+
+LAYERS = ("competencia", "transporte", "alquiler", "demografia")
+
+
+@dataclass
+class AnalysisResult:
+    address: str
+    formatted: str
+    lat: float
+    lng: float
+    barrio: str
+    rubro: str
+    radius: int
+    competitors: list[Place]
+    transit: list[Place]
+    score_total: int
+    competencia: LayerScore
+    transporte: LayerScore
+    alquiler: LayerScore
+    demografia: LayerScore
+    precio_m2: int
+    insights: list[dict]
+    errores: dict = field(default_factory=dict)
+
+    @classmethod
+    def from_scores(cls, address: str, coords: dict, barrio: str, rubro: str, radius: int,
+                    competitors: list[Place], transit: list[Place], scores: dict, errores: dict | None = None):
+        return cls(
+            address=address, formatted=coords.get("formatted", address),
+            lat=coords["lat"], lng=coords["lng"], barrio=barrio, rubro=rubro, radius=radius,
+            competitors=competitors, transit=transit, score_total=scores["score_total"],
+            competencia=LayerScore(scores["s_comp"], scores["c_comp"], scores["d_comp"]),
+            transporte=LayerScore(scores["s_trans"], scores["c_trans"], scores["d_trans"]),
+            alquiler=LayerScore(scores["s_alq"], scores["c_alq"], scores["d_alq"]),
+            demografia=LayerScore(scores["s_demo"], scores["c_demo"], scores["d_demo"]),
+            precio_m2=scores["precio_m2"], insights=scores["insights"], errores=errores or {},
+        )
+
+    def to_session(self) -> dict:
+        """Formato plano que guarda la app en st.session_state.resultado."""
+        return {
+            "coords": {"lat": self.lat, "lng": self.lng, "formatted": self.formatted},
+            "barrio": self.barrio, "radio": self.radius, "rubro_label": self.rubro,
+            "competitors": self.competitors, "transit": self.transit,
+            "score_total": self.score_total,
+            "c_comp": self.competencia.color, "d_comp": self.competencia.desc,
+            "c_trans": self.transporte.color, "d_trans": self.transporte.desc,
+            "c_alq": self.alquiler.color, "d_alq": self.alquiler.desc, "precio_m2": self.precio_m2,
+            "c_demo": self.demografia.color, "d_demo": self.demografia.desc,
+            "insights": self.insights, "errores": self.errores,
+        }
+
+    def at_radius(self, radius: int) -> "AnalysisResult":
+        """El mismo análisis para un radio menor, recalculado localmente (sin consultas)."""
+        if radius > self.radius:
+            raise ValueError(f"radius {radius} supera el radio consultado ({self.radius} m)")
+        competitors = [p for p in self.competitors if haversine(self.lat, self.lng, p.lat, p.lng) <= radius]
+        transit = [s for s in self.transit if haversine(self.lat, self.lng, s.lat, s.lng) <= radius]
+        scores = score_location(competitors, transit, self.barrio, self.rubro, radius, self.lat, self.lng)
+        coords = {"lat": self.lat, "lng": self.lng, "formatted": self.formatted}
+        return AnalysisResult.from_scores(self.address, coords, self.barrio, self.rubro, radius,
+                                          competitors, transit, scores, self.errores)
+
+    def to_dict(self) -> dict:
+        """Forma serializable (JSON) para la caché de resultados."""
+        d = {f.name: getattr(self, f.name) for f in fields(self)}
+        for capa in LAYERS:
+            d[capa] = vars(d[capa])
+        d["competitors"] = [p.to_row() for p in self.competitors]
+        d["transit"] = [p.to_row() for p in self.transit]
+        return d
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "AnalysisResult":
+        d = dict(d)
+        for capa in LAYERS:
+            d[capa] = LayerScore(**d[capa])
+        d["competitors"] = [Place.from_row(r) for r in d["competitors"]]
+        d["transit"] = [Place.from_row(r) for r in d["transit"]]
+        return cls(**d)
+
+
+def result_key(result: dict) -> str:
+    """Huella de un resultado de sesión (`to_session`): coords, radio, rubro y los lugares encontrados."""
+    h = hashlib.blake2b(digest_size=12)
+    h.update(repr((result["coords"]["lat"], result["coords"]["lng"], result["radio"], result["rubro_label"])).encode())
+    for p in result["competitors"] + result["transit"]:
+        h.update(p.place_id.encode())
+    return h.hexdigest()
+
+
+def _api_key(api_key: str | None) -> str:
+    api_key = api_key or os.environ.get("GOOGLE_PLACES_API_KEY")
+    if not api_key:
+        raise ValueError("Falta la API key de Google (parámetro api_key o GOOGLE_PLACES_API_KEY)")
+    return api_key
+
+
+def _rubro(rubro: str) -> str:
+    label = resolve_rubro(rubro)
+    if label is None:
+        raise KeyError(f"Rubro desconocido: {rubro!r}")
+    return label
+
+
+def analyze(address: str, rubro: str, radius: int = DEFAULT_RADIUS, api_key: str | None = None,
+            on_competitors=None, cache: bool = True) -> AnalysisResult:
+    """Analiza la viabilidad de `rubro` en `address` dentro de `radius` metros.
+
+    `rubro` puede ser el label completo de RUBROS o un nombre aproximado
+    ("cafeteria"). Lanza GeocodingError si la dirección no se encuentra.
+    """
+    api_key = _api_key(api_key)
+    with metrics.span("geocode"):
+        coords = geocode_address(address, api_key)
+    if not coords:
+        raise GeocodingError(f"No se pudo geocodificar {address!r}")
+    return analyze_coords(coords, rubro, radius, api_key, address=address, on_competitors=on_competitors,
+                          cache=cache)
+
+
+def analyze_coords(coords: dict, rubro: str, radius: int = DEFAULT_RADIUS, api_key: str | None = None,
+                   address: str | None = None, on_competitors=None, cache: bool = True) -> AnalysisResult:
+    """Como `analyze`, pero partiendo de coordenadas ya geocodificadas ({"lat", "lng", "formatted"}).
+
+    `on_competitors(lista_parcial)` se invoca cada vez que llega una página de competidores.
+    Con `cache`, el resultado se comparte entre sesiones (ver `get_result_cache`).
+    """
+    api_key = _api_key(api_key)
+    rubro = _rubro(rubro)
+    address = address or coords.get("formatted", "")
+    if not cache:
+        return _analyze_coords(coords, rubro, radius, api_key, address, on_competitors)
+
+    key = result_cache_key(coords["lat"], coords["lng"], radius, rubro)
+    cached = get_result_cache().get(key)
+    if cached is not None:
+        result = AnalysisResult.from_dict(cached)
+    else:
+        # Pedidos idénticos simultáneos (otra sesión) esperan al primero en lugar de repetir las consultas
+        result = get_result_flight().do(key, _analyze_and_store, key, coords, rubro, radius, api_key,
+                                        address, on_competitors)
+    return replace(result, address=address, formatted=coords.get("formatted", address),
+                   lat=coords["lat"], lng=coords["lng"])
+
+
+def _analyze_and_store(key, coords, rubro, radius, api_key, address, on_competitors) -> AnalysisResult:
+    result = _analyze_coords(coords, rubro, radius, api_key, address, on_competitors)
+    if not result.errores:  # un resultado parcial no se comparte
+        get_result_cache().set(key, result.to_dict())
+    return result
+
+
+def _analyze_coords(coords, rubro, radius, api_key, address, on_competitors) -> AnalysisResult:
+    lookups = run_lookups(coords["lat"], coords["lng"], radius, RUBROS[rubro], api_key,
+                          on_competitors=on_competitors)
+    barrio = lookups["barrio"] or BARRIO_DESCONOCIDO
+    with metrics.span("scoring"):
+        scores = score_location(lookups["competitors"], lookups["transit"], barrio, rubro, radius,
+                                coords["lat"], coords["lng"])
+    return AnalysisResult.from_scores(address, coords, barrio, rubro, radius,
+                                      lookups["competitors"], lookups["transit"], scores,
+                                      lookups["errores"])
+
+
+# ─── CACHÉ DE RESULTADOS ──────────────────────────────────────────────────────
+
+RESULT_TTL = float(os.environ.get("LOCALSCOPE_RESULT_TTL", 6 * 3600))  # segundos
+RESULT_CACHE_SIZE = int(os.environ.get("LOCALSCOPE_RESULT_CACHE_SIZE", 2000))
+# "sqlite" comparte resultados entre procesos; "memory" sólo dentro del proceso
+RESULT_CACHE_BACKEND = os.environ.get("LOCALSCOPE_RESULT_CACHE", "sqlite")
+RESULT_PRECISION = 4  # decimales de lat/lng en la clave (~10 m)
+
+
+def result_cache_key(lat: float, lng: float, radius: int, rubro: str) -> str:
+    # Cambiar las reglas o cualquiera de los datos locales que entran al score (fotos de barrios,
+    # alquileres, paradas GTFS, índice de densidad del rubro) invalida los resultados cacheados
+    config = RUBROS[rubro]
+    versiones = (get_rules().version, get_barrio_store().version(), rent_version(),
+                 file_version(gtfs_path()), file_version(density_path(config["type"], config["keyword"])))
+    return f"{lat:.{RESULT_PRECISION}f}|{lng:.{RESULT_PRECISION}f}|{radius}|{rubro}|" + "|".join(versiones)
+
+
+@_singleton
+def get_result_cache():
+    """Resultados completos de análisis, compartidos por todas las sesiones."""
+    if RESULT_CACHE_BACKEND == "memory":
+        return MemoryCache(ttl=RESULT_TTL, max_entries=RESULT_CACHE_SIZE, name="results")
+    return SQLiteCache(namespace="results", ttl=RESULT_TTL, max_entries=RESULT_CACHE_SIZE)
+
+
+@_singleton
+def get_result_flight() -> SingleFlight:
+    return SingleFlight(memoize=False)
+
+
+# ─── BARRIDO DE RADIOS ────────────────────────────────────────────────────────
+
+def radius_curve(result: AnalysisResult, radii=RADIUS_STEPS) -> list[dict]:
+    """Score global y por capa para cada radio <= `result.radius`.
+
+    Los lugares se ordenan por distancia una sola vez; cada radio toma el
+    prefijo correspondiente con bisect.
+    """
+    def por_distancia(places):
+        pares = sorted(((haversine(result.lat, result.lng, p.lat, p.lng), p) for p in places), key=lambda t: t[0])
+        return [d for d, _ in pares], [p for _, p in pares]
+
+    d_comp, comp = por_distancia(result.competitors)
+    d_trans, trans = por_distancia(result.transit)
+    curva = []
+    for radius in sorted(r for r in radii if r <= result.radius):
+        c = comp[:bisect.bisect_right(d_comp, radius)]
+        t = trans[:bisect.bisect_right(d_trans, radius)]
+        s = score_location(c, t, result.barrio, result.rubro, radius, result.lat, result.lng)
+        curva.append({
+            "radio": radius, "score_total": s["score_total"],
+            "competencia": s["s_comp"], "transporte": s["s_trans"],
+            "competidores": len(c), "paradas": len(t),
+        })
+    return curva
+
+
+def radius_sweep(address: str, rubro: str, radii=RADIUS_STEPS,
+                 api_key: str | None = None) -> tuple[AnalysisResult, list[dict]]:
+    """Analiza una sola vez al radio máximo y devuelve (resultado, curva score vs. radio)."""
+    result = analyze(address, rubro, max(radii), api_key)
+    return result, radius_curve(result, radii)
+
+
+class ApiPipeline:
+    """Implementación de localscope.batch.Pipeline sobre las APIs de Google."""
+
+    def __init__(self, api_key: str):
+        self.api_key = api_key
+
+    def geocode(self, address):
+        return geocode_address(address, self.api_key)
+
+    def competitors(self, lat, lng, radius, rubro):
+        config = RUBROS[rubro]
+        return search_places(lat, lng, radius, config["keyword"], config["type"], self.api_key)
+
+    def transit(self, lat, lng, radius):
+        return get_transit_stops(lat, lng, radius, self.api_key)
+
+    def barrio(self, lat, lng):
+        return get_barrio_from_coords(lat, lng)
+
+    def score(self, competitors, transit, barrio, rubro, radius, lat=None, lng=None):
+        r = score_location(competitors, transit, barrio or BARRIO_DESCONOCIDO, rubro, radius, lat, lng)
+        return {
+            "score_total": r["score_total"],
+            "competencia": r["s_comp"], "transporte": r["s_trans"],
+            "alquiler": r["s_alq"], "demografia": r["s_demo"],
+            "competidores": len(competitors),
+            "paradas": len(transit),
+            "precio_m2": r["precio_m2"],
+        }
+
+
+def analyze_batch(addresses: list[str], rubros: list[str], radius: int = DEFAULT_RADIUS,
+                  api_key: str | None = None, max_workers: int = 8,
+                  max_calls: int | None = None) -> list[dict]:
+    """Versión en lote de `analyze`: filas dirección × rubro ordenadas por score."""
+    return run_batch(addresses, [_rubro(r) for r in rubros], radius, ApiPipeline(_api_key(api_key)),
+                     max_workers=max_workers, budget=get_api_client(), max_calls=max_calls)
+
+
+HEATMAP_STEP = 100      # metros entre celdas
+HEATMAP_EXTENT = 1000   # metros alrededor del punto analizado
+
+
+def viability_heatmap(lat: float, lng: float, rubro: str, radius: int = DEFAULT_RADIUS,
+                      api_key: str | None = None, extent: int = HEATMAP_EXTENT,
+                      step: int = HEATMAP_STEP, barrio: str | None = None) -> dict:
+    """Score global en una grilla de `step` m alrededor de (lat, lng), hasta `extent` m.
+
+    Trae una sola vez los lugares del área (extent + radius, servidos desde la
+    caché de teselas) y puntúa todas las celdas con el motor vectorizado.
+    Sin polígonos de barrios locales, todas las celdas usan `barrio`.
+    """
+    from .grid import cached_score_grid, city_grid, places_to_arrays, transit_to_arrays
+
+    api_key = _api_key(api_key)
+    rubro = _rubro(rubro)
+    config = RUBROS[rubro]
+    alcance = extent + radius
+    competitors = search_places(lat, lng, alcance, config["keyword"], config["type"], api_key)
+    transit = get_transit_stops(lat, lng, alcance, api_key)
+
+    dlat = extent / 111320
+    dlng = extent / (111320 * math.cos(math.radians(lat)))
+    qlat, qlng = city_grid(step, bbox=(lat - dlat, lng - dlng, lat + dlat, lng + dlng))
+    dentro = [haversine(lat, lng, a, b) <= extent for a, b in zip(qlat, qlng)]
+    qlat, qlng = qlat[dentro], qlng[dentro]
+
+    resolver = get_barrio_resolver()
+    if resolver is not None:
+        barrios = [resolver.resolve(a, b) for a, b in zip(qlat, qlng)]
+    else:
+        barrios = [barrio] * len(qlat)
+    c_lat, c_lng, c_rating = places_to_arrays(competitors)
+    t_arrays = transit_to_arrays(transit)
+    return cached_score_grid(qlat, qlng, rubro, radius, (c_lat, c_lng, c_rating), t_arrays, barrios)
@@ -0,0 +1,161 @@
+"""Precios y perfil socioeconómico por barrio, cargados desde archivos versionados.
+
+Cada archivo de `data/barrios/` es una foto de la tabla a una fecha
+(`AAAA-MM-DD.csv` o `.parquet`) con columnas barrio, alquiler_m2, nse, densidad
+y categoria. La fila `_default` es el perfil para barrios sin datos.
+
+Las claves se normalizan (sin tildes, mayúsculas ni artículo inicial, más una
+tabla de alias), así que "Núñez", "NUÑEZ", "La Paternal" y "Paternal" cruzan
+con su fila. La tabla se carga una vez por proceso y se
+recarga sola si cambian los archivos; `profile(barrio, fecha)` consulta la foto
+vigente a esa fecha.
+"""
+import bisect
+import csv
+import hashlib
+import os
+import re
+import threading
+import time
+from typing import NamedTuple
+
+from . import metrics
+from .cache import normalize_address
+
+BARRIOS_DIR = os.environ.get(
+    "LOCALSCOPE_BARRIOS_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "barrios"),
+)
+RELOAD_CHECK_SECONDS = 5  # cada cuánto se mira si cambiaron los archivos
+BARRIO_DESCONOCIDO = "Sin identificar"
+DEFAULT_KEY = "_default"
+_SNAPSHOT_NAME = re.compile(r"^(\d{4}-\d{2}-\d{2})\.(csv|parquet)$")
+_ARTICULO = re.compile(r"^(?:la|el|los|las) ")
+# Grafías que no se igualan sacando tildes y artículo (dataset de CABA, Google, avisos) → clave de la tabla
+ALIAS = {
+    "montserrat": "monserrat",
+    "villa gral. mitre": "villa general mitre",
+    "villa gral mitre": "villa general mitre",
+    "pompeya": "nueva pompeya",
+}
+
+
+class BarrioProfile(NamedTuple):
+    barrio: str
+    alquiler_m2: int
+    nse: str        # alto / medio_alto / medio / bajo
+    densidad: str   # alta / media / baja
+    categoria: str  # premium / medio / economico
+
+
+def barrio_key(nombre: str) -> str:
+    clave = _ARTICULO.sub("", normalize_address(nombre or ""))
+    return ALIAS.get(clave, clave)
+
+
+def _read_rows(path: str) -> list[dict]:
+    if path.endswith(".parquet"):
+        import pandas as pd  # opcional: sólo para fotos en Parquet
+        return pd.read_parquet(path).to_dict("records")
+    with open(path, encoding="utf-8", newline="") as f:
+        return list(csv.DictReader(f))
+
+
+def _load_snapshot(path: str) -> dict[str, BarrioProfile]:
+    tabla = {}
+    for fila in _read_rows(path):
+        p = BarrioProfile(
+            barrio=str(fila["barrio"]).strip(), alquiler_m2=int(fila["alquiler_m2"]),
+            nse=str(fila["nse"]).strip(), densidad=str(fila["densidad"]).strip(),
+            categoria=str(fila["categoria"]).strip(),
+        )
+        tabla[DEFAULT_KEY if p.barrio == DEFAULT_KEY else barrio_key(p.barrio)] = p
+    if DEFAULT_KEY not in tabla:
+        raise ValueError(f"{path}: falta la fila {DEFAULT_KEY}")
+    return tabla
+
+
+class BarrioStore:
+    """Fotos de la tabla de barrios por fecha, con recarga en caliente."""
+
+    def __init__(self, directory: str = BARRIOS_DIR):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._firma = None
+        self._checked = 0.0
+        self._fechas: list[str] = []
+        self._fotos: list[dict[str, BarrioProfile]] = []
+
+    def _archivos(self) -> list[tuple[str, str]]:
+        archivos = []
+        for nombre in os.listdir(self.directory):
+            if m := _SNAPSHOT_NAME.match(nombre):
+                archivos.append((m.group(1), os.path.join(self.directory, nombre)))
+        return sorted(archivos)
+
+    def _refresh(self) -> None:
+        ahora = time.monotonic()
+        if self._firma is not None and ahora - self._checked < RELOAD_CHECK_SECONDS:
+            return
+        with self._lock:
+            if self._firma is not None and ahora - self._checked < RELOAD_CHECK_SECONDS:
+                return
+            archivos = self._archivos()
+            firma = [(path, os.path.getmtime(path)) for _, path in archivos]
+            if firma != self._firma:
+                if not archivos:
+                    raise FileNotFoundError(f"No hay fotos de barrios en {self.directory}")
+                fechas, fotos = [f for f, _ in archivos], [_load_snapshot(p) for _, p in archivos]
+                self._fechas, self._fotos, self._firma = fechas, fotos, firma
+            self._checked = ahora
+
+    def snapshot(self, fecha: str | None = None) -> dict[str, BarrioProfile]:
+        """Tabla vigente a `fecha` (AAAA-MM-DD); por defecto, la más reciente."""
+        self._refresh()
+        if fecha is None:
+            return self._fotos[-1]
+        i = bisect.bisect_right(self._fechas, fecha[:10]) - 1
+        return self._fotos[max(i, 0)]
+
+    @property
+    def versions(self) -> list[str]:
+        self._refresh()
+        return list(self._fechas)
+
+    def version(self) -> str:
+        """Firma de los archivos cargados: cambia al agregar, quitar o editar una foto."""
+        self._refresh()
+        return hashlib.sha1(repr(self._firma).encode()).hexdigest()[:12]
+
+    def profile(self, barrio: str | None, fecha: str | None = None) -> BarrioProfile:
+        """Perfil del barrio (o el `_default` si no hay datos para ese nombre)."""
+        tabla = self.snapshot(fecha)
+        p = tabla.get(barrio_key(barrio))
+        metrics.record_cache("barrios", p is not None)  # los fallbacks quedan a la vista en las métricas
+        return p or tabla[DEFAULT_KEY]
+
+    def names(self, fecha: str | None = None) -> list[str]:
+        return [p.barrio for k, p in self.snapshot(fecha).items() if k != DEFAULT_KEY]
+
+    def missing(self, nombres, fecha: str | None = None) -> list[str]:
+        """Los `nombres` que no cruzan con ninguna fila (caerían en `_default`)."""
+        tabla = self.snapshot(fecha)
+        return [n for n in nombres if barrio_key(n) not in tabla]
+
+
+_STORE: BarrioStore | None = None
+_STORE_LOCK = threading.Lock()
+
+
+def get_barrio_store() -> BarrioStore:
+    """Tabla de barrios compartida por el proceso."""
+    global _STORE
+    if _STORE is None:
+        with _STORE_LOCK:
+            if _STORE is None:
+                _STORE = BarrioStore()
+    return _STORE
+
+
+def barrio_profile(barrio: str | None, fecha: str | None = None) -> BarrioProfile:
+    return get_barrio_store().profile(barrio, fecha)
@@ -0,0 +1,147 @@
+"""Resolución offline de barrio por punto (point-in-polygon sobre GeoJSON local).
+
+Los polígonos se cargan una vez y se indexan en una grilla regular: cada celda
+guarda los barrios cuyo bounding box la toca, así que una consulta sólo evalúa
+el ray casting sobre uno o dos candidatos.
+
+El archivo es el dataset "Barrios" de datos abiertos de CABA (no se versiona
+en el repo); se baja una vez con:
+
+    python -m localscope.barrios_geo descargar      # → data/barrios.geojson
+"""
+import argparse
+import json
+import math
+import os
+
+from .barrios import barrio_key
+
+DEFAULT_GEOJSON_PATH = os.environ.get(
+    "LOCALSCOPE_BARRIOS_GEOJSON",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "barrios.geojson"),
+)
+GEOJSON_URL = "https://cdn.buenosaires.gob.ar/datosabiertos/datasets/ministerio-de-educacion/barrios/barrios.geojson"
+NAME_PROPERTIES = ("nombre", "NOMBRE", "barrio", "BARRIO")
+
+
+def _point_in_ring(lat: float, lng: float, ring: list) -> bool:
+    """Ray casting (regla par-impar). `ring` es una lista de (lng, lat)."""
+    dentro = False
+    j = len(ring) - 1
+    for i in range(len(ring)):
+        xi, yi = ring[i][0], ring[i][1]
+        xj, yj = ring[j][0], ring[j][1]
+        if (yi > lat) != (yj > lat) and lng < (xj - xi) * (lat - yi) / (yj - yi) + xi:
+            dentro = not dentro
+        j = i
+    return dentro
+
+
+def _point_in_polygon(lat: float, lng: float, polygon: list) -> bool:
+    """`polygon` = [anillo exterior, *huecos]."""
+    if not _point_in_ring(lat, lng, polygon[0]):
+        return False
+    return not any(_point_in_ring(lat, lng, hole) for hole in polygon[1:])
+
+
+def point_in_polygons(lat: float, lng: float, polygons: list) -> bool:
+    """¿El punto cae en alguno de los polígonos (formato GeoJSON)?"""
+    return any(_point_in_polygon(lat, lng, poly) for poly in polygons)
+
+
+def _display_name(nombre: str) -> str:
+    # El dataset de CABA trae los nombres en mayúsculas ("VILLA CRESPO")
+    return nombre.title() if nombre.isupper() else nombre
+
+
+class BarrioResolver:
+    """Índice de grilla + bbox sobre los polígonos de barrios."""
+
+    def __init__(self, barrios: list[tuple[str, list]], cell_deg: float = 0.01):
+        # barrios: [(nombre, [polígono, ...]), ...] con polígonos en coordenadas GeoJSON
+        self.cell_deg = cell_deg
+        self.barrios = []
+        self.grid: dict[tuple[int, int], list[int]] = {}
+        for nombre, polygons in barrios:
+            lngs = [pt[0] for poly in polygons for pt in poly[0]]
+            lats = [pt[1] for poly in polygons for pt in poly[0]]
+            bbox = (min(lats), min(lngs), max(lats), max(lngs))
+            idx = len(self.barrios)
+            self.barrios.append((nombre, bbox, polygons))
+            i0, j0 = self._cell(bbox[0], bbox[1])
+            i1, j1 = self._cell(bbox[2], bbox[3])
+            for i in range(i0, i1 + 1):
+                for j in range(j0, j1 + 1):
+                    self.grid.setdefault((i, j), []).append(idx)
+
+    def _cell(self, lat: float, lng: float) -> tuple[int, int]:
+        return math.floor(lat / self.cell_deg), math.floor(lng / self.cell_deg)
+
+    @classmethod
+    def from_geojson(cls, path: str = DEFAULT_GEOJSON_PATH, **kwargs) -> "BarrioResolver":
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        barrios = []
+        for feature in data["features"]:
+            props = feature.get("properties") or {}
+            nombre = next((props[k] for k in NAME_PROPERTIES if props.get(k)), None)
+            geom = feature.get("geometry") or {}
+            if not nombre or geom.get("type") not in ("Polygon", "MultiPolygon"):
+                continue
+            polygons = [geom["coordinates"]] if geom["type"] == "Polygon" else geom["coordinates"]
+            barrios.append((_display_name(nombre), polygons))
+        return cls(barrios, **kwargs)
+
+    def resolve(self, lat: float, lng: float) -> str | None:
+        """Nombre del barrio que contiene el punto, o None si está fuera de CABA."""
+        for idx in self.grid.get(self._cell(lat, lng), ()):
+            nombre, (lat0, lng0, lat1, lng1), polygons = self.barrios[idx]
+            if not (lat0 <= lat <= lat1 and lng0 <= lng <= lng1):
+                continue
+            if point_in_polygons(lat, lng, polygons):
+                return nombre
+        return None
+
+    def polygons(self, nombre: str) -> list | None:
+        """Polígonos del barrio `nombre` (comparado como `barrios.barrio_key`), o None si no está."""
+        clave = barrio_key(nombre)
+        return next((polys for n, _, polys in self.barrios if barrio_key(n) == clave), None)
+
+    def names(self) -> list[str]:
+        return [nombre for nombre, _, _ in self.barrios]
+
+    def __len__(self) -> int:
+        return len(self.barrios)
+
+
+def download(path: str = DEFAULT_GEOJSON_PATH, url: str = GEOJSON_URL) -> BarrioResolver:
+    """Baja el GeoJSON de barrios, verifica que se pueda usar y lo guarda en `path`."""
+    import requests
+
+    r = requests.get(url, timeout=60)
+    r.raise_for_status()
+    tmp = path + ".tmp"
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(tmp, "wb") as f:
+        f.write(r.content)
+    resolver = BarrioResolver.from_geojson(tmp)
+    if not len(resolver):
+        os.remove(tmp)
+        raise ValueError(f"{url} no trae polígonos de barrios")
+    os.replace(tmp, path)
+    return resolver
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Polígonos de barrios de CABA para resolver barrios sin red")
+    parser.add_argument("accion", choices=("descargar",))
+    parser.add_argument("--url", default=GEOJSON_URL)
+    parser.add_argument("--out", default=DEFAULT_GEOJSON_PATH)
+    args = parser.parse_args(argv)
+    resolver = download(args.out, args.url)
+    print(f"{len(resolver)} barrios → {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,131 @@
+"""Análisis en lote: N direcciones × M rubros con concurrencia acotada.
+
+Las consultas compartidas (geocoding de una dirección, transporte y barrio de
+un punto, competencia de un rubro en un punto) se calculan una sola vez por
+corrida aunque varias filas las necesiten, incluso si se piden en paralelo.
+"""
+import csv
+import io
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Protocol
+
+from .cache import normalize_address
+
+
+class BudgetExceeded(Exception):
+    """La corrida alcanzó su tope de llamadas a la API."""
+
+
+class SingleFlight:
+    """Llamadas concurrentes con la misma clave comparten resultado.
+
+    Con `memoize=True` (lote) el resultado queda guardado para siempre; con
+    `memoize=False` la clave se libera al terminar y sólo se coalescen las
+    llamadas simultáneas.
+    """
+
+    def __init__(self, memoize: bool = True):
+        self._lock = threading.Lock()
+        self._futures: dict = {}
+        self.memoize = memoize
+
+    def do(self, key, fn: Callable, *args):
+        with self._lock:
+            future = self._futures.get(key)
+            owner = future is None
+            if owner:
+                future = self._futures[key] = Future()
+        if owner:
+            try:
+                future.set_result(fn(*args))
+            except Exception as e:
+                future.set_exception(e)
+            finally:
+                if not self.memoize:
+                    with self._lock:
+                        self._futures.pop(key, None)
+        return future.result()
+
+
+class Pipeline(Protocol):
+    """Pasos del análisis que el lote necesita (los implementa la app)."""
+
+    def geocode(self, address: str) -> dict | None: ...
+    def competitors(self, lat: float, lng: float, radius: int, rubro: str) -> list: ...
+    def transit(self, lat: float, lng: float, radius: int) -> list: ...
+    def barrio(self, lat: float, lng: float) -> str | None: ...
+    def score(self, competitors: list, transit: list, barrio: str | None, rubro: str, radius: int,
+              lat: float | None = None, lng: float | None = None) -> dict: ...
+
+
+def _punto(coords: dict) -> tuple[float, float]:
+    # ~1 m de resolución: dos direcciones que geocodifican al mismo punto comparten consultas
+    return round(coords["lat"], 5), round(coords["lng"], 5)
+
+
+def run_batch(addresses: list[str], rubros: list[str], radius: int, pipeline: Pipeline,
+              max_workers: int = 8, budget=None,
+              max_calls: int | None = None, on_progress=None) -> list[dict]:
+    """Analiza todas las combinaciones dirección × rubro y devuelve filas ordenadas por score.
+
+    `max_calls` acota las llamadas a la API de esta corrida, medidas con el
+    contador `budget.calls` (p. ej. el ApiClient compartido); las combinaciones
+    que no llegan a empezar se devuelven con error.
+    """
+    flight = SingleFlight()
+    inicio = budget.calls if budget else 0
+    unicas = {}
+    for a in addresses:
+        if a.strip():
+            unicas.setdefault(normalize_address(a), a.strip())
+    jobs = [(a, r) for a in unicas.values() for r in rubros]
+    hechos = 0
+    lock = threading.Lock()
+
+    def analizar(address: str, rubro: str) -> dict:
+        nonlocal hechos
+        fila = {"direccion": address, "rubro": rubro}
+        try:
+            if budget and max_calls is not None and budget.calls - inicio >= max_calls:
+                raise BudgetExceeded(f"se alcanzó el tope de {max_calls} llamadas")
+            coords = flight.do(("geo", normalize_address(address)), pipeline.geocode, address)
+            if not coords:
+                raise ValueError("no se pudo geocodificar")
+            lat, lng = coords["lat"], coords["lng"]
+            punto = _punto(coords)
+            competitors = flight.do(("comp", punto, radius, rubro), pipeline.competitors, lat, lng, radius, rubro)
+            transit = flight.do(("transit", punto, radius), pipeline.transit, lat, lng, radius)
+            barrio = flight.do(("barrio", punto), pipeline.barrio, lat, lng)
+            fila.update(formatted=coords.get("formatted"), lat=lat, lng=lng, barrio=barrio)
+            fila.update(pipeline.score(competitors, transit, barrio, rubro, radius, lat, lng))
+        except Exception as e:
+            fila["error"] = str(e) or type(e).__name__
+        with lock:
+            hechos += 1
+            if on_progress:
+                on_progress(hechos, len(jobs))
+        return fila
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="batch") as pool:
+        filas = list(pool.map(lambda job: analizar(*job), jobs))
+    return sorted(filas, key=lambda f: ("error" in f, -f.get("score_total", 0)))
+
+
+def parse_batch_csv(content: bytes | str) -> tuple[list[str], list[str]]:
+    """Lee un CSV con columna `direccion` (y opcional `rubro`). Devuelve (direcciones, rubros)."""
+    if isinstance(content, bytes):
+        content = content.decode("utf-8-sig")
+    reader = csv.DictReader(io.StringIO(content))
+    campos = {(c or "").strip().lower(): c for c in reader.fieldnames or []}
+    col_dir = campos.get("direccion") or campos.get("dirección") or campos.get("address")
+    if col_dir is None:
+        raise ValueError("El CSV debe tener una columna 'direccion'")
+    col_rubro = campos.get("rubro")
+    direcciones, rubros = [], []
+    for row in reader:
+        if (row.get(col_dir) or "").strip():
+            direcciones.append(row[col_dir].strip())
+        if col_rubro and (row.get(col_rubro) or "").strip():
+            rubros.append(row[col_rubro].strip())
+    return direcciones, list(dict.fromkeys(rubros))
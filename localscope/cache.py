@@ -0,0 +1,166 @@
+"""Caché persistente clave/valor con TTL y desalojo LRU."""
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+
+from . import metrics
+
+DEFAULT_CACHE_PATH = os.environ.get(
+    "LOCALSCOPE_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache", "localscope.sqlite"),
+)
+
+
+def normalize_address(address: str) -> str:
+    """Normaliza una dirección para usarla como clave (sin tildes, minúsculas, espacios simples)."""
+    texto = unicodedata.normalize("NFKD", address)
+    texto = "".join(c for c in texto if not unicodedata.combining(c))
+    texto = re.sub(r"\s+", " ", texto.casefold())
+    return texto.strip(" ,.")
+
+
+class Cache:
+    """Interfaz común: cualquier backend con get/set/clear puede enchufarse."""
+
+    def __init__(self, name: str = "cache"):
+        self.name = name
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str):
+        raise NotImplementedError
+
+    def set(self, key: str, value) -> None:
+        raise NotImplementedError
+
+    def clear(self) -> None:
+        raise NotImplementedError
+
+    def _count(self, value):
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        metrics.record_cache(self.name, value is not None)
+        return value
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+        }
+
+
+class MemoryCache(Cache):
+    """Backend en memoria del proceso (no sobrevive reinicios)."""
+
+    def __init__(self, ttl: float = 86400, max_entries: int = 1000, name: str = "memory"):
+        super().__init__(name)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._data = {}  # dict mantiene orden de inserción → usamos el orden como LRU
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            item = self._data.pop(key, None)
+            if item is None or time.time() - item[0] > self.ttl:
+                return self._count(None)
+            self._data[key] = item
+            return self._count(item[1])
+
+    def set(self, key: str, value) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = (time.time(), value)
+            while len(self._data) > self.max_entries:
+                self._data.pop(next(iter(self._data)))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+
+class SQLiteCache(Cache):
+    """Backend en SQLite: sobrevive reinicios de Streamlit y se comparte entre procesos.
+
+    Los valores se guardan como JSON. Cada namespace tiene su propio límite de
+    entradas; al superarlo se desalojan las de acceso más antiguo.
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, namespace: str = "default",
+                 ttl: float = 86400, max_entries: int = 10000):
+        super().__init__(namespace)
+        self.path = path
+        self.namespace = namespace
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS cache (
+                    namespace   TEXT NOT NULL,
+                    key         TEXT NOT NULL,
+                    value       TEXT NOT NULL,
+                    created     REAL NOT NULL,
+                    last_access REAL NOT NULL,
+                    PRIMARY KEY (namespace, key)
+                )
+            """)
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS cache_lru ON cache (namespace, last_access)"
+            )
+
+    def get(self, key: str):
+        ahora = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT value, created FROM cache WHERE namespace = ? AND key = ?",
+                (self.namespace, key),
+            ).fetchone()
+            if row is None:
+                return self._count(None)
+            if ahora - row[1] > self.ttl:
+                self._conn.execute(
+                    "DELETE FROM cache WHERE namespace = ? AND key = ?", (self.namespace, key)
+                )
+                return self._count(None)
+            self._conn.execute(
+                "UPDATE cache SET last_access = ? WHERE namespace = ? AND key = ?",
+                (ahora, self.namespace, key),
+            )
+        return self._count(json.loads(row[0]))
+
+    def set(self, key: str, value) -> None:
+        ahora = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?, ?)",
+                (self.namespace, key, json.dumps(value), ahora, ahora),
+            )
+            self._conn.execute("""
+                DELETE FROM cache WHERE namespace = ? AND key IN (
+                    SELECT key FROM cache WHERE namespace = ?
+                    ORDER BY last_access DESC LIMIT -1 OFFSET ?
+                )
+            """, (self.namespace, self.namespace, self.max_entries))
+
+    def clear(self) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM cache WHERE namespace = ?", (self.namespace,))
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM cache WHERE namespace = ?", (self.namespace,)
+            ).fetchone()[0]
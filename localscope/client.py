@@ -0,0 +1,126 @@
+"""Cliente HTTP compartido para las APIs externas.
+
+- Sesión `requests` con pool de conexiones keep-alive (una conexión TLS se reutiliza).
+- Token bucket compartido por todos los hilos/sesiones del proceso.
+- Reintentos con backoff exponencial y jitter ante OVER_QUERY_LIMIT, 429, 5xx y errores de red.
+- Coalescing: requests idénticos en vuelo comparten una sola respuesta.
+"""
+import random
+import threading
+import time
+from concurrent.futures import Future
+from typing import TYPE_CHECKING
+
+from . import metrics
+
+if TYPE_CHECKING:
+    import requests
+
+RETRY_HTTP_STATUS = {429, 500, 502, 503, 504}
+RETRY_API_STATUS = {"OVER_QUERY_LIMIT", "UNKNOWN_ERROR"}
+
+
+class TokenBucket:
+    """Limitador de tasa: `rate` tokens por segundo con ráfagas de hasta `burst`."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        while True:
+            with self._lock:
+                ahora = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (ahora - self._updated) * self.rate)
+                self._updated = ahora
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                espera = (1 - self._tokens) / self.rate
+            time.sleep(espera)
+
+
+class ApiError(Exception):
+    """La API respondió con error luego de agotar los reintentos."""
+
+
+class ApiClient:
+    """GET con JSON, pooling, rate limit, reintentos y coalescing de requests idénticos."""
+
+    def __init__(self, rate: float = 10.0, burst: int = 20, max_concurrent: int = 8,
+                 max_retries: int = 3, backoff_base: float = 0.5, backoff_max: float = 8.0,
+                 pool_size: int = 32, session: "requests.Session | None" = None):
+        # requests se importa al crear el cliente (primer request), no al importar el paquete
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self._network_errors = (requests.ConnectionError, requests.Timeout)
+        self.session = session or requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.bucket = TokenBucket(rate, burst)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._sem = threading.BoundedSemaphore(max_concurrent)
+        self._lock = threading.Lock()
+        self._inflight: dict = {}
+        self.calls = 0       # requests HTTP realmente enviados (incluye reintentos)
+        self.retries = 0
+        self.coalesced = 0   # llamadas que se sumaron a un request ya en vuelo
+
+    def _backoff(self, intento: int) -> float:
+        # "Full jitter": uniforme entre 0 y el tope exponencial
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** intento))
+
+    def _send(self, url: str, params: dict | None, timeout: float) -> dict:
+        for intento in range(self.max_retries + 1):
+            self.bucket.acquire()
+            with self._sem:
+                with self._lock:
+                    self.calls += 1
+                metrics.record_call(url)
+                try:
+                    r = self.session.get(url, params=params, timeout=timeout)
+                except self._network_errors:
+                    if intento == self.max_retries:
+                        raise
+                    r = None
+            if r is not None and r.status_code not in RETRY_HTTP_STATUS:
+                r.raise_for_status()
+                data = r.json()
+                if not (isinstance(data, dict) and data.get("status") in RETRY_API_STATUS):
+                    return data
+            if intento == self.max_retries:
+                if r is not None:
+                    r.raise_for_status()
+                raise ApiError(f"{url}: {data.get('status')} {data.get('error_message', '')}".strip())
+            with self._lock:
+                self.retries += 1
+            time.sleep(self._backoff(intento))
+
+    def get_json(self, url: str, params: dict | None = None, timeout: float = 10) -> dict:
+        key = (url, tuple(sorted((params or {}).items())))
+        with self._lock:
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self._inflight[key] = Future()
+            else:
+                self.coalesced += 1
+        if owner:
+            try:
+                future.set_result(self._send(url, params, timeout))
+            except Exception as e:
+                future.set_exception(e)
+            finally:
+                with self._lock:
+                    del self._inflight[key]
+        return future.result()
+
+    def stats(self) -> dict:
+        return {"calls": self.calls, "retries": self.retries, "coalesced": self.coalesced}
@@ -0,0 +1,33 @@
+"""Rutas de los índices locales (.npz) y su versión, sin importar numpy.
+
+Los módulos que construyen y cargan cada índice (`density`, `gtfs`, `rents`)
+dependen de numpy; para las claves de caché alcanza con saber si el archivo
+existe y cuándo cambió, y eso se resuelve acá con `os.path`.
+"""
+import os
+
+from .cache import DEFAULT_CACHE_PATH, normalize_address
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+GTFS_DIR = os.environ.get("LOCALSCOPE_GTFS_DIR", os.path.join(DATA_DIR, "gtfs"))
+RENTS_PATH = os.environ.get("LOCALSCOPE_RENTS_PATH", os.path.join(DATA_DIR, "alquileres.npz"))
+DENSITY_DIR = os.environ.get(
+    "LOCALSCOPE_DENSITY_DIR", os.path.join(os.path.dirname(DEFAULT_CACHE_PATH), "density")
+)
+
+
+def gtfs_path(directory: str = GTFS_DIR) -> str:
+    return os.path.join(directory, "stops.npz")
+
+
+def density_path(place_type: str, keyword: str, directory: str = DENSITY_DIR) -> str:
+    slug = normalize_address(f"{place_type or 'any'} {keyword}").replace(" ", "-")
+    return os.path.join(directory, f"{slug}.npz")
+
+
+def file_version(path: str) -> str:
+    """mtime del archivo como versión ("" si no existe)."""
+    try:
+        return repr(os.path.getmtime(path))
+    except OSError:
+        return ""
@@ -0,0 +1,269 @@
+"""Índice local de competidores por rubro, precalculado a partir de un barrido de CABA.
+
+Un job offline recorre la ciudad tesela por tesela (misma grilla que la caché
+de Nearby Search) para cada `type`/`keyword` de `RUBROS` y guarda los lugares
+en un `.npz` compacto: coordenadas y ratings como arrays, nombres e ids como
+arrays de texto, y la fecha de consulta de cada tesela. Con el índice cargado,
+competidores y `score_competencia` se responden localmente con una consulta de
+radio sobre un `PointIndex`, sin llamadas a la API.
+
+    python -m localscope.density build                       # todos los rubros
+    python -m localscope.density build --rubro cafeteria
+    python -m localscope.density refresh --max-age-days 7    # re-barre sólo teselas viejas
+
+`refresh` está pensado para correr desde cron: re-consulta las teselas más
+antiguas (hasta `--limit` por rubro) y reemplaza sus lugares en el índice.
+
+Las teselas se barren igual que en la caché de teselas: si una consulta vuelve
+con 60 resultados, la tesela se parte en cuartos. Las que siguen llenas al
+tamaño mínimo quedan registradas como `capped`: sus conteos son un mínimo, y
+`is_exact` dice si una consulta de radio toca alguna.
+"""
+import argparse
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from . import metrics
+from .datafiles import DENSITY_DIR, density_path as index_path
+from .grid import CABA_BBOX, PointIndex, places_to_arrays
+from .places import Place
+from .scoring import score_competencia_stats
+from .tiles import DEFAULT_TILE_SIZE_M, PlaceTileCache
+
+# Un índice con teselas más viejas que esto se ignora y se vuelve a la API
+DENSITY_MAX_AGE = float(os.environ.get("LOCALSCOPE_DENSITY_MAX_AGE", 30 * 86400))  # segundos
+INDEX_CELL_M = 500
+TEXT_FIELDS = ("place_id", "name", "vicinity")
+
+
+class DensityIndex:
+    """Lugares de un type/keyword en arrays, con índice espacial y fecha por tesela."""
+
+    def __init__(self, place_type: str, keyword: str, places: list[Place], tiles: dict[tuple[int, int], float],
+                 tile_size_m: int = DEFAULT_TILE_SIZE_M, capped: set[tuple[int, int]] | None = None):
+        self.place_type = place_type
+        self.keyword = keyword
+        self.tile_size_m = tile_size_m
+        self.tiles = dict(tiles)  # tesela -> timestamp de la última consulta
+        self.capped = set(capped or ())  # teselas que siguieron llenas (60 resultados) al partirlas
+        self._set_places(places)
+
+    def _set_places(self, places: list[Place]) -> None:
+        self.lat, self.lng, self.rating = places_to_arrays(places)
+        self.user_ratings_total = np.array([p.user_ratings_total for p in places], dtype=np.int32)
+        for campo in TEXT_FIELDS:
+            setattr(self, campo, np.array([getattr(p, campo) for p in places], dtype=str))
+        self.index = PointIndex(self.lat, self.lng, cell_m=INDEX_CELL_M)
+
+    def __len__(self) -> int:
+        return len(self.lat)
+
+    @property
+    def oldest(self) -> float:
+        return min(self.tiles.values(), default=0)
+
+    def is_fresh(self, max_age: float = DENSITY_MAX_AGE) -> bool:
+        return bool(self.tiles) and time.time() - self.oldest <= max_age
+
+    def is_exact(self, lat: float, lng: float, radius: float) -> bool:
+        """False si el círculo toca alguna tesela `capped` (el conteo es un mínimo)."""
+        if not self.capped:
+            return True
+        geometria = PlaceTileCache(store=None, tile_size_m=self.tile_size_m)
+        return not any(t in self.capped for t in geometria.tiles_for_circle(lat, lng, radius))
+
+    def _record(self, i: int) -> Place:
+        return Place(
+            place_id=str(self.place_id[i]), name=str(self.name[i]), lat=float(self.lat[i]), lng=float(self.lng[i]),
+            rating=float(self.rating[i]), user_ratings_total=int(self.user_ratings_total[i]),
+            vicinity=str(self.vicinity[i]),
+        )
+
+    def places(self, lat: float, lng: float, radius: float) -> list[Place]:
+        """Lugares a menos de `radius` metros, ordenados por distancia."""
+        idx, _ = self.index.within(lat, lng, radius)
+        return [self._record(i) for i in idx]
+
+    def competencia(self, lat: float, lng: float, radius: int) -> tuple[int, float]:
+        """(cantidad, rating promedio) de competidores en el radio."""
+        idx, _ = self.index.within(lat, lng, radius)
+        ratings = self.rating[idx]
+        ratings = ratings[ratings > 0]
+        return len(idx), float(ratings.mean()) if len(ratings) else 0.0
+
+    def score_competencia(self, lat: float, lng: float, radius: int) -> tuple[int, str, str]:
+        """`scoring.score_competencia` respondido desde el índice (el detalle avisa si el conteo es un mínimo)."""
+        score, categoria, detalle = score_competencia_stats(*self.competencia(lat, lng, radius), radius)
+        if not self.is_exact(lat, lng, radius):
+            detalle += " (conteo mínimo: la zona supera el tope de resultados de Google)"
+        return score, categoria, detalle
+
+    def replace_tiles(self, fetched: dict[tuple[int, int], tuple[list[Place], bool]], tiles: PlaceTileCache) -> None:
+        """Reemplaza los lugares de las teselas re-consultadas (refresh incremental)."""
+        vigentes = [self._record(i) for i in range(len(self))
+                    if tiles.tile_of(float(self.lat[i]), float(self.lng[i])) not in fetched]
+        nuevos = {p.place_id: p for places, _ in fetched.values() for p in places}
+        vigentes = [p for p in vigentes if p.place_id not in nuevos]
+        ahora = time.time()
+        self.tiles.update({tile: ahora for tile in fetched})
+        self.capped = (self.capped - fetched.keys()) | {tile for tile, (_, capped) in fetched.items() if capped}
+        self._set_places(vigentes + list(nuevos.values()))
+
+    def save(self, path: str) -> None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        meta = {"type": self.place_type, "keyword": self.keyword, "tile_size_m": self.tile_size_m,
+                "tiles": [[i, j, ts] for (i, j), ts in self.tiles.items()],
+                "capped": [[i, j] for i, j in sorted(self.capped)]}
+        tmp = path + ".tmp.npz"
+        np.savez_compressed(
+            tmp, lat=self.lat, lng=self.lng, rating=self.rating, user_ratings_total=self.user_ratings_total,
+            meta=np.array(json.dumps(meta)), **{campo: getattr(self, campo) for campo in TEXT_FIELDS},
+        )
+        os.replace(tmp, path)  # los lectores nunca ven un índice a medio escribir
+
+    @classmethod
+    def load(cls, path: str) -> "DensityIndex":
+        with np.load(path) as data:
+            meta = json.loads(str(data["meta"]))
+            index = cls.__new__(cls)
+            index.place_type, index.keyword = meta["type"], meta["keyword"]
+            index.tile_size_m = meta["tile_size_m"]
+            index.tiles = {(i, j): ts for i, j, ts in meta["tiles"]}
+            index.capped = {(i, j) for i, j in meta.get("capped", [])}
+            index.lat, index.lng, index.rating = data["lat"], data["lng"], data["rating"]
+            index.user_ratings_total = data["user_ratings_total"]
+            for campo in TEXT_FIELDS:
+                setattr(index, campo, data[campo])
+        index.index = PointIndex(index.lat, index.lng, cell_m=INDEX_CELL_M)
+        return index
+
+
+# ─── CARGA EN LA APP ──────────────────────────────────────────────────────────
+
+_LOADED: dict[str, tuple[float, DensityIndex]] = {}
+_LOCK = threading.Lock()
+
+
+def get_index(place_type: str, keyword: str, max_age: float = DENSITY_MAX_AGE) -> DensityIndex | None:
+    """Índice vigente para type/keyword, o None si no hay uno o está vencido.
+
+    Se recarga solo si el archivo cambió (p. ej. después de un refresh).
+    """
+    path = index_path(place_type, keyword)
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+    with _LOCK:
+        cargado = _LOADED.get(path)
+        if cargado is None or cargado[0] != mtime:
+            cargado = _LOADED[path] = (mtime, DensityIndex.load(path))
+    index = cargado[1]
+    return index if index.is_fresh(max_age) else None
+
+
+# ─── BARRIDO ──────────────────────────────────────────────────────────────────
+
+def city_tiles(tiles: PlaceTileCache, bbox: tuple = CABA_BBOX, resolver=None) -> list[tuple[int, int]]:
+    """Teselas que cubren el bounding box (y, con `resolver`, que tocan algún barrio)."""
+    lat0, lng0, lat1, lng1 = bbox
+    i0, j0 = tiles.tile_of(lat0, lng0)
+    i1, j1 = tiles.tile_of(lat1, lng1)
+    todas = [(i, j) for i in range(i0, i1 + 1) for j in range(j0, j1 + 1)]
+    if resolver is None:
+        return todas
+
+    def toca_caba(tile):
+        i, j = tile
+        esquinas = [(i + di) * tiles.dlat for di in (0, 0.5, 1)], [(j + dj) * tiles.dlng for dj in (0, 0.5, 1)]
+        return any(resolver.resolve(a, b) is not None for a in esquinas[0] for b in esquinas[1])
+
+    return [t for t in todas if toca_caba(t)]
+
+
+def sweep(place_type: str, keyword: str, api_key: str, tile_list: list[tuple[int, int]], tiles: PlaceTileCache,
+          max_workers: int = 8, on_progress=None) -> dict[tuple[int, int], tuple[list[Place], bool]]:
+    """Consulta cada tesela (partiendo las que vuelven llenas) y devuelve {tesela: (lugares, capped)}."""
+    from .lookups import tile_fetcher
+
+    fetcher = tile_fetcher(api_key)
+
+    def fetch(tile):
+        return tile, tiles.fetch_tile(tile, keyword, place_type, fetcher)
+
+    resultados = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = [metrics.submit(pool, fetch, tile) for tile in tile_list]
+        for n, future in enumerate(futures, 1):
+            tile, resultado = future.result()
+            resultados[tile] = resultado
+            if on_progress:
+                on_progress(n, len(futures))
+    return resultados
+
+
+def build(place_type: str, keyword: str, api_key: str, directory: str = DENSITY_DIR,
+          resolver=None, on_progress=None) -> DensityIndex:
+    """Barre toda la ciudad para un type/keyword y guarda el índice."""
+    tiles = PlaceTileCache(store=None)
+    fetched = sweep(place_type, keyword, api_key, city_tiles(tiles, resolver=resolver), tiles,
+                    on_progress=on_progress)
+    ahora = time.time()
+    unicos = {p.place_id: p for places, _ in fetched.values() for p in places}
+    index = DensityIndex(place_type, keyword, list(unicos.values()), {t: ahora for t in fetched},
+                         capped={tile for tile, (_, capped) in fetched.items() if capped})
+    index.save(index_path(place_type, keyword, directory))
+    return index
+
+
+def refresh(place_type: str, keyword: str, api_key: str, max_age: float, limit: int | None = None,
+            directory: str = DENSITY_DIR, on_progress=None) -> int:
+    """Re-consulta las teselas más viejas que `max_age` (hasta `limit`); devuelve cuántas."""
+    path = index_path(place_type, keyword, directory)
+    index = DensityIndex.load(path)
+    tiles = PlaceTileCache(store=None, tile_size_m=index.tile_size_m)
+    limite = time.time() - max_age
+    viejas = sorted((ts, tile) for tile, ts in index.tiles.items() if ts < limite)
+    viejas = [tile for _, tile in viejas][:limit]
+    if viejas:
+        index.replace_tiles(sweep(place_type, keyword, api_key, viejas, tiles, on_progress=on_progress), tiles)
+        index.save(path)
+    return len(viejas)
+
+
+def main(argv=None) -> int:
+    from .lookups import get_barrio_resolver
+    from .rubros import RUBROS, resolve_rubro
+
+    parser = argparse.ArgumentParser(description="Índice local de competidores por rubro")
+    parser.add_argument("accion", choices=("build", "refresh"))
+    parser.add_argument("--rubro", action="append", help="rubro (repetible); por defecto todos")
+    parser.add_argument("--max-age-days", type=float, default=7, help="refresh: antigüedad mínima de tesela")
+    parser.add_argument("--limit", type=int, help="refresh: máximo de teselas por rubro")
+    parser.add_argument("--dir", default=DENSITY_DIR)
+    args = parser.parse_args(argv)
+
+    api_key = os.environ.get("GOOGLE_PLACES_API_KEY")
+    if not api_key:
+        parser.error("falta GOOGLE_PLACES_API_KEY")
+    rubros = [resolve_rubro(r) for r in args.rubro] if args.rubro else list(RUBROS)
+    # Varios rubros comparten type/keyword: se barre cada combinación una sola vez
+    configs = {(RUBROS[r]["type"], RUBROS[r]["keyword"]) for r in rubros if r}
+    for place_type, keyword in sorted(configs):
+        progreso = lambda n, total: print(f"\r{place_type} {keyword}: {n}/{total} teselas", end="", flush=True)
+        if args.accion == "build":
+            index = build(place_type, keyword, api_key, args.dir, get_barrio_resolver(), progreso)
+            print(f" → {len(index)} lugares ({len(index.capped)} teselas con conteo mínimo)")
+        elif os.path.exists(index_path(place_type, keyword, args.dir)):
+            n = refresh(place_type, keyword, api_key, args.max_age_days * 86400, args.limit, args.dir, progreso)
+            print(f"{place_type} {keyword}: {n} teselas actualizadas")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
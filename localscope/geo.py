@@ -0,0 +1,20 @@
+"""Utilidades geográficas."""
+import math
+
+
+def haversine(lat1, lng1, lat2, lng2) -> float:
+    """Distancia en metros entre dos coordenadas."""
+    R = 6371000
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = math.radians(lat2 - lat1)
+    dlambda = math.radians(lng2 - lng1)
+    a = math.sin(dphi/2)**2 + math.cos(phi1)*math.cos(phi2)*math.sin(dlambda/2)**2
+    return R * 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
+
+
+def place_location(place: dict) -> tuple[float, float] | None:
+    """(lat, lng) de un resultado de Places, o None si no trae geometría."""
+    loc = place.get("geometry", {}).get("location", {})
+    if "lat" in loc and "lng" in loc:
+        return loc["lat"], loc["lng"]
+    return None
@@ -0,0 +1,200 @@
+"""Motor vectorizado (NumPy) para calcular el score global sobre grillas de puntos.
+
+Reproduce las reglas de `localscope.scoring` en lote: los conteos de
+competidores y paradas por celda salen de un índice de grilla (buckets del
+tamaño del radio, así cada consulta sólo mira las 3×3 celdas vecinas) con
+haversine vectorizado, y las capas de barrio se evalúan una vez por barrio
+distinto y luego se reparten por celda (el alquiler, por punto si hay índice
+de avisos).
+"""
+import hashlib
+import math
+
+import numpy as np
+
+from .cache import MemoryCache
+from .rules import get_rules
+from .scoring import rent_index, rent_version, score_alquiler, score_demografia, score_rent_estimate, score_weights
+from .transit import mode_weights
+
+EARTH_RADIUS = 6371000
+REF_LAT = -34.6
+# Bounding box aproximado de CABA (lat_min, lng_min, lat_max, lng_max)
+CABA_BBOX = (-34.706, -58.532, -34.526, -58.335)
+
+_HEATMAP_CACHE = MemoryCache(ttl=3600, max_entries=32, name="heatmap")
+
+
+def haversine_np(lat1, lng1, lat2, lng2) -> np.ndarray:
+    """haversine vectorizado (con broadcasting); mismo resultado que localscope.geo.haversine."""
+    phi1, phi2 = np.radians(lat1), np.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = np.radians(lng2) - np.radians(lng1)
+    a = np.sin(dphi/2)**2 + np.cos(phi1)*np.cos(phi2)*np.sin(dlambda/2)**2
+    return EARTH_RADIUS * 2 * np.arctan2(np.sqrt(a), np.sqrt(1-a))
+
+
+def _project(lat, lng) -> tuple[np.ndarray, np.ndarray]:
+    # Proyección equirectangular local en metros (sólo para bucketizar)
+    y = np.radians(lat) * EARTH_RADIUS
+    x = np.radians(lng) * EARTH_RADIUS * math.cos(math.radians(REF_LAT))
+    return x, y
+
+
+class PointIndex:
+    """Índice de grilla sobre puntos fijos para contar/sumar vecinos dentro de un radio."""
+
+    def __init__(self, lat, lng, cell_m: float):
+        self.lat = np.asarray(lat, dtype=float)
+        self.lng = np.asarray(lng, dtype=float)
+        self.cell_m = cell_m
+        x, y = _project(self.lat, self.lng)
+        ix, iy = np.floor(x / cell_m).astype(np.int64), np.floor(y / cell_m).astype(np.int64)
+        order = np.lexsort((iy, ix))
+        self.order = order
+        keys = list(zip(ix[order].tolist(), iy[order].tolist()))
+        self.buckets: dict[tuple[int, int], tuple[int, int]] = {}
+        for pos, key in enumerate(keys):
+            start, _ = self.buckets.get(key, (pos, pos))
+            self.buckets[key] = (start, pos + 1)
+
+    def _candidates(self, cx: int, cy: int, ring: int = 1) -> np.ndarray:
+        vecinos = range(-ring, ring + 1)
+        partes = [self.order[slice(*self.buckets[(cx + dx, cy + dy)])]
+                  for dx in vecinos for dy in vecinos if (cx + dx, cy + dy) in self.buckets]
+        return np.concatenate(partes) if partes else np.empty(0, dtype=np.int64)
+
+    def within(self, lat: float, lng: float, radius: float) -> tuple[np.ndarray, np.ndarray]:
+        """Índices y distancias de los puntos a <= radius de (lat, lng), ordenados por distancia."""
+        x, y = _project(lat, lng)
+        cand = self._candidates(int(math.floor(x / self.cell_m)), int(math.floor(y / self.cell_m)),
+                                ring=max(1, math.ceil(radius / self.cell_m)))
+        dist = haversine_np(lat, lng, self.lat[cand], self.lng[cand])
+        dentro = dist <= radius
+        cand, dist = cand[dentro], dist[dentro]
+        orden = np.argsort(dist, kind="stable")
+        return cand[orden], dist[orden]
+
+    def aggregate(self, qlat, qlng, radius: float, weights=None) -> tuple[np.ndarray, np.ndarray]:
+        """Para cada consulta: (cantidad de puntos a <= radius, suma de `weights` de esos puntos)."""
+        if radius > self.cell_m:
+            raise ValueError("radius no puede superar el tamaño de celda del índice")
+        qlat, qlng = np.asarray(qlat, dtype=float), np.asarray(qlng, dtype=float)
+        weights = np.ones(len(self.lat)) if weights is None else np.asarray(weights, dtype=float)
+        counts = np.zeros(len(qlat), dtype=np.int64)
+        sums = np.zeros(len(qlat))
+        if not len(qlat) or not len(self.lat):
+            return counts, sums
+
+        x, y = _project(qlat, qlng)
+        qx, qy = np.floor(x / self.cell_m).astype(np.int64), np.floor(y / self.cell_m).astype(np.int64)
+        order = np.lexsort((qy, qx))
+        qx_s, qy_s = qx[order], qy[order]
+        cortes = np.flatnonzero((np.diff(qx_s) != 0) | (np.diff(qy_s) != 0)) + 1
+        for grupo in np.split(order, cortes):
+            cand = self._candidates(int(qx[grupo[0]]), int(qy[grupo[0]]))
+            if not len(cand):
+                continue
+            dist = haversine_np(qlat[grupo, None], qlng[grupo, None], self.lat[cand], self.lng[cand])
+            dentro = dist <= radius
+            counts[grupo] = dentro.sum(axis=1)
+            sums[grupo] = dentro @ weights[cand]
+        return counts, sums
+
+
+def score_competencia_np(n: np.ndarray, rating_sum: np.ndarray, rated: np.ndarray, radius: int) -> np.ndarray:
+    """Reglas de score_competencia en lote."""
+    avg = np.divide(rating_sum, rated, out=np.zeros(len(n)), where=rated > 0)
+    density = n / (math.pi * (radius/1000)**2)
+    return get_rules().tables["competencia"].scores({"n": n, "rating": avg, "densidad_km2": density})
+
+
+def score_transporte_np(n: np.ndarray, equivalente: np.ndarray | None = None) -> np.ndarray:
+    """Reglas de score_transporte en lote; `equivalente` = suma de pesos por modo (por defecto, n)."""
+    return get_rules().tables["transporte"].scores({"n": n, "equivalente": n if equivalente is None else equivalente})
+
+
+def city_grid(step_m: float = 100, bbox: tuple = CABA_BBOX, resolver=None) -> tuple[np.ndarray, np.ndarray]:
+    """Centros de una grilla regular cada `step_m` metros; con `resolver` se descartan los que caen fuera de CABA."""
+    lat0, lng0, lat1, lng1 = bbox
+    dlat = step_m / 111320
+    dlng = step_m / (111320 * math.cos(math.radians(REF_LAT)))
+    lats, lngs = np.meshgrid(np.arange(lat0, lat1, dlat), np.arange(lng0, lng1, dlng), indexing="ij")
+    lats, lngs = lats.ravel(), lngs.ravel()
+    if resolver is not None:
+        dentro = np.array([resolver.resolve(a, b) is not None for a, b in zip(lats, lngs)], dtype=bool)
+        lats, lngs = lats[dentro], lngs[dentro]
+    return lats, lngs
+
+
+def places_to_arrays(places: list) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(lat, lng, rating) de una lista de `Place`; rating 0 = sin rating."""
+    locs = [(p.lat, p.lng, p.rating) for p in places]
+    arr = np.array(locs, dtype=float).reshape(-1, 3)
+    return arr[:, 0], arr[:, 1], arr[:, 2]
+
+
+def transit_to_arrays(stops: list) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(lat, lng, peso por modo) de una lista de paradas."""
+    lat, lng, _ = places_to_arrays(stops)
+    return lat, lng, np.asarray(mode_weights(stops), dtype=float).reshape(-1)
+
+
+def score_grid(qlat, qlng, rubro: str, radius: int, competitors: tuple, transit: tuple,
+               barrios: list[str] | None = None, weights: list[float] | None = None) -> dict:
+    """Score global y por capa para cada punto de la grilla.
+
+    `competitors` = (lat, lng, rating) y `transit` = (lat, lng[, peso por modo]) como arrays;
+    `barrios` es el nombre de barrio de cada punto (None → perfil por defecto).
+    Sin `weights` se usan los pesos de las reglas para el rubro.
+    """
+    weights = score_weights(rubro) if weights is None else weights
+    qlat, qlng = np.asarray(qlat, dtype=float), np.asarray(qlng, dtype=float)
+    c_lat, c_lng, c_rating = competitors
+    comp_index = PointIndex(c_lat, c_lng, cell_m=radius)
+    n_comp, rating_sum = comp_index.aggregate(qlat, qlng, radius, weights=c_rating)
+    rated, _ = PointIndex(c_lat[c_rating > 0], c_lng[c_rating > 0], cell_m=radius).aggregate(qlat, qlng, radius)
+    t_weights = transit[2] if len(transit) > 2 else None
+    n_trans, eq_trans = PointIndex(transit[0], transit[1], cell_m=radius).aggregate(qlat, qlng, radius, t_weights)
+
+    s_comp = score_competencia_np(n_comp, rating_sum, rated, radius)
+    s_trans = score_transporte_np(n_trans, eq_trans)
+
+    # Capas de barrio: se evalúan una vez por barrio distinto
+    barrios = barrios if barrios is not None else [None] * len(qlat)
+    unicos, inversa = np.unique(np.array([b or "_default" for b in barrios], dtype=object), return_inverse=True)
+    s_alq = np.array([score_alquiler(b, rubro)[0] for b in unicos])[inversa]
+    if (rents := rent_index()) is not None:
+        # Con índice de avisos, cada punto toma la mediana de su celda (o de su barrio); se puntúa
+        # una vez por estimación distinta
+        estimaciones, cual = rents.estimate_many(qlat, qlng, barrios)
+        if estimaciones:
+            por_estimacion = np.array([score_rent_estimate(e)[0] for e in estimaciones])
+            s_alq = np.where(cual >= 0, por_estimacion[np.maximum(cual, 0)], s_alq)
+    s_demo = np.array([score_demografia(b, rubro)[0] for b in unicos])[inversa]
+
+    total = np.round(np.stack([s_comp, s_trans, s_alq, s_demo], axis=1) @ np.asarray(weights)).astype(int)
+    return {
+        "lat": qlat, "lng": qlng, "score_total": total,
+        "s_comp": s_comp, "s_trans": s_trans, "s_alq": s_alq, "s_demo": s_demo,
+        "n_comp": n_comp, "n_trans": n_trans,
+    }
+
+
+def _fingerprint(*arrays) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    for a in arrays:
+        h.update(np.ascontiguousarray(a).tobytes())
+    return h.hexdigest()
+
+
+def cached_score_grid(qlat, qlng, rubro: str, radius: int, competitors: tuple, transit: tuple,
+                      barrios: list[str] | None = None) -> dict:
+    """`score_grid` memoizado por versión de reglas y de alquileres, rubro/radio y huella de los datos de entrada."""
+    key = f"{get_rules().version}|{rent_version()}|{rubro}|{radius}|" + _fingerprint(
+        qlat, qlng, *competitors, *transit, np.array(barrios or [], dtype=str))
+    result = _HEATMAP_CACHE.get(key)
+    if result is None:
+        result = score_grid(qlat, qlng, rubro, radius, competitors, transit, barrios)
+        _HEATMAP_CACHE.set(key, result)
+    return result
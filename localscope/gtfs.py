@@ -0,0 +1,183 @@
+"""Paradas de transporte desde feeds GTFS estáticos, para puntuar sin la API.
+
+`data/gtfs/` puede tener uno o varios feeds (p. ej. los de subte, trenes y
+colectivos de datos abiertos de CABA), cada uno en su carpeta con `stops.txt`.
+El modo de cada parada sale del `route_type` de las líneas que pasan por ella
+(routes/trips/stop_times) o, si el feed no los trae, del nombre de la carpeta.
+Los andenes se agrupan en su estación (`parent_station`).
+
+    python -m localscope.gtfs build     # data/gtfs/*/ → data/gtfs/stops.npz
+
+Con `stops.npz` presente, `lookups.get_transit_stops` responde desde el índice.
+"""
+import argparse
+import csv
+import io
+import os
+import threading
+import zipfile
+
+import numpy as np
+
+from .datafiles import GTFS_DIR, gtfs_path as index_path
+from .grid import PointIndex
+from .places import Place
+from .transit import COLECTIVO, MODOS, SUBTE, TREN
+
+INDEX_CELL_M = 1000
+# route_type de GTFS (básicos y extendidos más comunes) → modo
+ROUTE_TYPE_MODO = {0: SUBTE, 1: SUBTE, 2: TREN, 3: COLECTIVO, 100: TREN, 109: TREN, 400: SUBTE, 401: SUBTE,
+                   700: COLECTIVO, 900: SUBTE}
+_PRIORIDAD = {SUBTE: 0, TREN: 1, COLECTIVO: 2}  # una parada con varios modos se queda con el más pesado
+_ALIAS_CARPETA = {"subte": SUBTE, "subterraneo": SUBTE, "tren": TREN, "trenes": TREN,
+                  "colectivo": COLECTIVO, "colectivos": COLECTIVO, "bus": COLECTIVO}
+
+
+class _Feed:
+    """Un feed GTFS en carpeta o .zip; lee cada archivo como filas de dict, en streaming."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.nombre = os.path.splitext(os.path.basename(path.rstrip(os.sep)))[0]
+        self._zip = zipfile.ZipFile(path) if path.endswith(".zip") else None
+
+    def has(self, archivo: str) -> bool:
+        if self._zip is not None:
+            return archivo in self._zip.namelist()
+        return os.path.exists(os.path.join(self.path, archivo))
+
+    def rows(self, archivo: str):
+        if self._zip is not None:
+            with self._zip.open(archivo) as f:
+                yield from csv.DictReader(io.TextIOWrapper(f, encoding="utf-8-sig"))
+        else:
+            with open(os.path.join(self.path, archivo), encoding="utf-8-sig", newline="") as f:
+                yield from csv.DictReader(f)
+
+
+def _modos_por_parada(feed: _Feed) -> dict[str, str]:
+    """stop_id → modo según las líneas que la recorren (vacío si faltan archivos)."""
+    if not all(feed.has(a) for a in ("routes.txt", "trips.txt", "stop_times.txt")):
+        return {}
+    tipo_linea = {r["route_id"]: int(r["route_type"]) for r in feed.rows("routes.txt")}
+    modo_viaje = {t["trip_id"]: ROUTE_TYPE_MODO.get(tipo_linea.get(t["route_id"], 3), COLECTIVO)
+                  for t in feed.rows("trips.txt")}
+    modos = {}
+    for st in feed.rows("stop_times.txt"):
+        modo = modo_viaje.get(st["trip_id"])
+        actual = modos.get(st["stop_id"])
+        if modo and (actual is None or _PRIORIDAD[modo] < _PRIORIDAD[actual]):
+            modos[st["stop_id"]] = modo
+    return modos
+
+
+def read_feed(path: str) -> list[Place]:
+    """Paradas (estaciones, con los andenes agrupados) de un feed GTFS."""
+    feed = _Feed(path)
+    modo_feed = _ALIAS_CARPETA.get(feed.nombre.lower(), COLECTIVO)
+    modos = _modos_por_parada(feed)
+    stops = {s["stop_id"]: s for s in feed.rows("stops.txt")}
+
+    estaciones: dict[str, str | None] = {}  # stop_id de la estación → modo (None: sin líneas conocidas)
+    for stop_id, s in stops.items():
+        if (s.get("location_type") or "0") not in ("0", "1"):
+            continue  # accesos, nodos y áreas de embarque
+        raiz = s.get("parent_station") or stop_id
+        if raiz not in stops:
+            raiz = stop_id
+        modo, actual = modos.get(stop_id), estaciones.get(raiz)
+        if modo and (actual is None or _PRIORIDAD[modo] < _PRIORIDAD[actual]):
+            estaciones[raiz] = modo
+        else:
+            estaciones.setdefault(raiz, None)
+    return [
+        Place(place_id=f"gtfs:{feed.nombre}:{stop_id}", name=stops[stop_id].get("stop_name") or "",
+              lat=float(stops[stop_id]["stop_lat"]), lng=float(stops[stop_id]["stop_lon"]), modo=modo or modo_feed)
+        for stop_id, modo in estaciones.items()
+    ]
+
+
+class GtfsIndex:
+    """Paradas GTFS en arrays con índice espacial."""
+
+    def __init__(self, stops: list[Place]):
+        self.lat = np.array([s.lat for s in stops], dtype=float)
+        self.lng = np.array([s.lng for s in stops], dtype=float)
+        self.place_id = np.array([s.place_id for s in stops], dtype=str)
+        self.name = np.array([s.name for s in stops], dtype=str)
+        self.modo = np.array([s.modo for s in stops], dtype=str)
+        self.index = PointIndex(self.lat, self.lng, cell_m=INDEX_CELL_M)
+
+    def __len__(self) -> int:
+        return len(self.lat)
+
+    def places(self, lat: float, lng: float, radius: float) -> list[Place]:
+        """Paradas a menos de `radius` metros, ordenadas por distancia."""
+        idx, _ = self.index.within(lat, lng, radius)
+        return [Place(place_id=str(self.place_id[i]), name=str(self.name[i]), lat=float(self.lat[i]),
+                      lng=float(self.lng[i]), modo=str(self.modo[i])) for i in idx]
+
+    def save(self, path: str) -> None:
+        tmp = path + ".tmp.npz"
+        np.savez_compressed(tmp, lat=self.lat, lng=self.lng, place_id=self.place_id, name=self.name, modo=self.modo)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> "GtfsIndex":
+        with np.load(path) as data:
+            index = cls.__new__(cls)
+            for campo in ("lat", "lng", "place_id", "name", "modo"):
+                setattr(index, campo, data[campo])
+        index.index = PointIndex(index.lat, index.lng, cell_m=INDEX_CELL_M)
+        return index
+
+
+def feeds(directory: str = GTFS_DIR) -> list[str]:
+    """Feeds del directorio: subcarpetas o .zip con stops.txt (o el directorio mismo)."""
+    if os.path.exists(os.path.join(directory, "stops.txt")):
+        return [directory]
+    encontrados = []
+    for nombre in sorted(os.listdir(directory)):
+        path = os.path.join(directory, nombre)
+        if nombre.endswith(".zip") or os.path.exists(os.path.join(path, "stops.txt")):
+            encontrados.append(path)
+    return encontrados
+
+
+def build(directory: str = GTFS_DIR) -> GtfsIndex:
+    index = GtfsIndex([s for path in feeds(directory) for s in read_feed(path)])
+    index.save(index_path(directory))
+    return index
+
+
+_LOADED: dict[str, tuple[float, GtfsIndex]] = {}
+_LOCK = threading.Lock()
+
+
+def get_index(directory: str = GTFS_DIR) -> GtfsIndex | None:
+    """Índice GTFS si existe `stops.npz`; se recarga solo si el archivo cambió."""
+    path = index_path(directory)
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+    with _LOCK:
+        cargado = _LOADED.get(path)
+        if cargado is None or cargado[0] != mtime:
+            cargado = _LOADED[path] = (mtime, GtfsIndex.load(path))
+    return cargado[1]
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Índice offline de paradas desde feeds GTFS")
+    parser.add_argument("accion", choices=("build",))
+    parser.add_argument("--dir", default=GTFS_DIR)
+    args = parser.parse_args(argv)
+    index = build(args.dir)
+    conteo = {m: int((index.modo == m).sum()) for m in MODOS}
+    print(f"{len(index)} paradas → {index_path(args.dir)} ({', '.join(f'{n} {m}' for m, n in conteo.items())})")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,279 @@
+"""Cola de análisis en segundo plano.
+
+`submit` encola un análisis y devuelve un id; un pool local de workers lo
+ejecuta mientras la UI consulta el estado (etapa, progreso y competidores
+parciales). Los trabajos se pueden cancelar, cada usuario tiene un límite de
+trabajos activos y los terminados se guardan en SQLite, así que un id sigue
+siendo válido después de reiniciar el proceso. `get` y `cancel` con `user`
+sólo responden por los trabajos de ese usuario.
+
+`submit_export` y `submit_refresh` encolan por el mismo camino la exportación
+de los reportes de la cartera y su revisión, para que la UI no espere en el
+hilo del script.
+"""
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+from . import metrics
+from .analysis import AnalysisResult, analyze_coords
+from .cache import SQLiteCache
+from .lookups import _singleton, geocode_address
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "error", "cancelled"
+ANALISIS, EXPORTACION, REVISION = "analisis", "exportacion", "revision"
+
+JOB_WORKERS = int(os.environ.get("LOCALSCOPE_JOB_WORKERS", 4))
+JOBS_PER_USER = int(os.environ.get("LOCALSCOPE_JOBS_PER_USER", 2))
+JOB_TTL = float(os.environ.get("LOCALSCOPE_JOB_TTL", 86400))  # segundos que se conserva un resultado
+JOB_KEEP_IN_MEMORY = 600  # segundos que un trabajo terminado queda en memoria además de en disco
+EXPORT_DIR = os.path.join(tempfile.gettempdir(), "localscope_exports")
+
+
+def new_export_path(filename: str = "reportes.zip") -> str:
+    """Ruta en un directorio nuevo de `EXPORT_DIR`; de paso borra los de más de `JOB_TTL` (abandonados)."""
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    limite = time.time() - JOB_TTL
+    for nombre in os.listdir(EXPORT_DIR):
+        path = os.path.join(EXPORT_DIR, nombre)
+        try:
+            if os.path.getmtime(path) < limite:
+                shutil.rmtree(path, ignore_errors=True)
+        except OSError:
+            pass  # otro proceso lo borró primero
+    return os.path.join(tempfile.mkdtemp(dir=EXPORT_DIR), filename)
+
+
+def discard_export(path: str | None) -> None:
+    """Borra una exportación creada con `new_export_path` (las rutas fuera de `EXPORT_DIR` no se tocan)."""
+    if path and os.path.dirname(os.path.dirname(os.path.abspath(path))) == EXPORT_DIR:
+        shutil.rmtree(os.path.dirname(path), ignore_errors=True)
+
+
+class TooManyJobs(RuntimeError):
+    """El usuario ya tiene el máximo de análisis en curso."""
+
+
+class JobCancelled(Exception):
+    """El trabajo se canceló mientras corría."""
+
+
+@dataclass
+class Job:
+    id: str
+    user: str
+    address: str
+    rubro: str
+    radius: int
+    status: str = QUEUED
+    stage: str = "En cola"
+    progress: float = 0.0
+    coords: dict | None = None
+    partial: list = field(default_factory=list)     # competidores parciales (Place)
+    result: AnalysisResult | None = None
+    trace: metrics.Trace | None = None
+    saved_metrics: dict | None = None               # traza de un trabajo recuperado de disco
+    error: str | None = None
+    created: float = field(default_factory=time.time)
+    finished: float | None = None
+    kind: str = ANALISIS
+    output: str | None = None                       # exportación: archivo generado
+    sweep: bool = False                             # análisis pedido como barrido de radios
+    cancel_event: threading.Event = field(default_factory=threading.Event, repr=False)
+
+    @property
+    def active(self) -> bool:
+        return self.status in (QUEUED, RUNNING)
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id, "user": self.user, "address": self.address, "rubro": self.rubro,
+            "radius": self.radius, "status": self.status, "stage": self.stage, "error": self.error,
+            "created": self.created, "finished": self.finished, "coords": self.coords,
+            "kind": self.kind, "output": self.output, "sweep": self.sweep,
+            "result": self.result.to_dict() if self.result else None,
+            "metrics": self.trace.to_dict() if self.trace else None,
+        }
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "Job":
+        d = dict(d)
+        result, saved_metrics = d.pop("result"), d.pop("metrics")
+        return cls(**d, progress=1.0, result=AnalysisResult.from_dict(result) if result else None,
+                   saved_metrics=saved_metrics)
+
+
+class JobQueue:
+    """Trabajos en memoria mientras corren; los terminados se persisten en `store`."""
+
+    def __init__(self, max_workers: int = JOB_WORKERS, per_user: int = JOBS_PER_USER, store=None):
+        self.per_user = per_user
+        self.store = store
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._jobs: dict[str, Job] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, user: str, address: str, rubro: str, radius: int, api_key: str, sweep: bool = False) -> str:
+        """Encola un análisis y devuelve su id. Lanza TooManyJobs si el usuario está en su límite.
+
+        Con `sweep`, el resultado (a `radius`) queda marcado para recalcular radios menores localmente.
+        """
+        with self._lock:
+            self._prune()
+            self._check_limit(user)
+            job = Job(id=uuid.uuid4().hex[:12], user=user, address=address, rubro=rubro, radius=radius,
+                      sweep=sweep)
+            self._jobs[job.id] = job
+        self._pool.submit(self._run, job, api_key)
+        return job.id
+
+    def submit_export(self, user: str, out: str, total: int, formato: str = "html") -> str:
+        """Encola la exportación de los reportes de toda la cartera a `out` (ver `reports.export_reports`)."""
+        with self._lock:
+            self._prune()
+            self._check_limit(user)
+            job = Job(id=uuid.uuid4().hex[:12], user=user, address="", rubro="", radius=0, kind=EXPORTACION,
+                      output=out)
+            self._jobs[job.id] = job
+        self._pool.submit(self._run_export, job, total, formato)
+        return job.id
+
+    def submit_refresh(self, user: str, api_key: str, sids: list[str]) -> str:
+        """Encola la revisión de las ubicaciones `sids` de la cartera (ver `portfolio.Portfolio.refresh`)."""
+        with self._lock:
+            self._prune()
+            self._check_limit(user)
+            job = Job(id=uuid.uuid4().hex[:12], user=user, address="", rubro="", radius=0, kind=REVISION)
+            self._jobs[job.id] = job
+        self._pool.submit(self._run_refresh, job, api_key, sids)
+        return job.id
+
+    def get(self, job_id: str, user: str | None = None) -> Job | None:
+        """El trabajo `job_id`; con `user`, sólo si es de ese usuario (si no, None, como un id inexistente)."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None and self.store is not None:
+            data = self.store.get(job_id)
+            job = Job.from_dict(data) if data else None
+        if job is not None and user is not None and job.user != user:
+            return None
+        return job
+
+    def cancel(self, job_id: str, user: str | None = None) -> bool:
+        """Pide la cancelación; un trabajo en cola no llega a correr, uno en curso corta en la próxima etapa."""
+        job = self.get(job_id, user)
+        if job is None or not job.active:
+            return False
+        job.cancel_event.set()
+        return True
+
+    def _check_limit(self, user: str) -> None:
+        if sum(j.active for j in self._jobs.values() if j.user == user) >= self.per_user:
+            raise TooManyJobs(f"Ya hay {self.per_user} trabajos en curso; esperá a que termine alguno.")
+
+    def _prune(self) -> None:
+        limite = time.time() - JOB_KEEP_IN_MEMORY
+        for job_id in [j.id for j in self._jobs.values() if j.finished and j.finished < limite]:
+            del self._jobs[job_id]
+
+    def _check(self, job: Job) -> None:
+        if job.cancel_event.is_set():
+            raise JobCancelled()
+
+    def _stage(self, job: Job, stage: str, progress: float) -> None:
+        self._check(job)
+        job.stage, job.progress = stage, progress
+
+    def _run(self, job: Job, api_key: str) -> None:
+        paginas = 0
+
+        def parcial(competitors):
+            nonlocal paginas
+            self._check(job)
+            paginas += 1
+            job.partial = competitors
+            job.progress = min(0.3 + 0.1 * paginas, 0.8)
+
+        with metrics.trace(rubro=job.rubro, radius=job.radius, job=job.id) as traza:
+            job.trace = traza
+            try:
+                self._check(job)
+                job.status = RUNNING
+                self._stage(job, "Geocodificando dirección", 0.1)
+                with metrics.span("geocode"):
+                    job.coords = geocode_address(job.address, api_key)
+                if not job.coords:
+                    raise ValueError("No se pudo geocodificar la dirección. Verificá que sea una dirección válida de CABA.")
+                self._stage(job, "Buscando competidores, transporte y barrio", 0.3)
+                result = analyze_coords(job.coords, job.rubro, job.radius, api_key, address=job.address,
+                                        on_competitors=parcial)
+                self._check(job)  # por si se canceló después de la última página de competidores
+                job.result, job.status, job.stage, job.progress = result, DONE, "Listo", 1.0
+            except JobCancelled:
+                job.status, job.stage = CANCELLED, "Cancelado"
+            except Exception as e:
+                job.status, job.stage, job.error = FAILED, "Error", str(e) or type(e).__name__
+            finally:
+                job.finished = time.time()
+                job.partial = []
+        if job.status == DONE:
+            metrics.export(traza)
+        if self.store is not None and job.status != CANCELLED:
+            self.store.set(job.id, job.to_dict())
+
+    def _run_export(self, job: Job, total: int, formato: str) -> None:
+        from .portfolio import get_portfolio
+        from .reports import export_reports
+
+        def avance(n):
+            self._check(job)
+            job.stage, job.progress = f"{n}/{total} reportes", n / max(total, 1)
+
+        try:
+            self._check(job)
+            job.status, job.stage = RUNNING, "Generando reportes"
+            export_reports((s.result for s in get_portfolio().iter_sites()), job.output, formato=formato,
+                           on_progress=avance)
+            job.status, job.stage, job.progress = DONE, "Listo", 1.0
+        except JobCancelled:
+            job.status, job.stage = CANCELLED, "Cancelado"
+        except Exception as e:
+            job.status, job.stage, job.error = FAILED, "Error", str(e) or type(e).__name__
+        finally:
+            job.finished = time.time()
+        if job.status != DONE:
+            discard_export(job.output)  # un ZIP a medias no se ofrece
+        if self.store is not None and job.status != CANCELLED:
+            self.store.set(job.id, job.to_dict())
+
+    def _run_refresh(self, job: Job, api_key: str, sids: list[str]) -> None:
+        from .portfolio import get_portfolio
+
+        def avance(n, total):
+            self._check(job)
+            job.stage, job.progress = f"{n}/{total} ubicaciones", 0.5 + 0.5 * n / max(total, 1)
+
+        try:
+            self._check(job)
+            job.status, job.stage = RUNNING, "Revisando teselas"
+            cambios = get_portfolio().refresh(api_key, sids, on_progress=avance)
+            job.status, job.stage, job.progress = DONE, f"{len(cambios)} cambios detectados", 1.0
+        except JobCancelled:
+            job.status, job.stage = CANCELLED, "Cancelado"
+        except Exception as e:
+            job.status, job.stage, job.error = FAILED, "Error", str(e) or type(e).__name__
+        finally:
+            job.finished = time.time()
+        if self.store is not None and job.status != CANCELLED:
+            self.store.set(job.id, job.to_dict())
+
+
+@_singleton
+def get_job_queue() -> JobQueue:
+    """Cola compartida por todas las sesiones del proceso."""
+    return JobQueue(store=SQLiteCache(namespace="jobs", ttl=JOB_TTL, max_entries=5000))
@@ -0,0 +1,361 @@
+"""Consultas externas (Google Geocoding / Places, datos abiertos CABA) y su orquestación.
+
+Los recursos compartidos (cachés, pools, presupuesto de requests) se crean una
+sola vez por proceso y se recrean en los hijos después de un fork.
+"""
+import functools
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from . import metrics
+from .barrios import barrio_key, get_barrio_store
+from .barrios_geo import DEFAULT_GEOJSON_PATH, BarrioResolver
+from .cache import SQLiteCache, normalize_address
+from .client import ApiClient, ApiError
+from .geo import haversine
+from .places import Place, dedup_places, parse_places
+from .tiles import PlaceTileCache
+from .transit import classify_stop
+
+log = logging.getLogger(__name__)
+
+_SINGLETONS = []
+
+
+def _singleton(fn):
+    """Crea el recurso la primera vez que se pide y lo reutiliza en todo el proceso."""
+    lock = threading.Lock()
+    instancia = []
+
+    @functools.wraps(fn)
+    def wrapper():
+        if not instancia:
+            with lock:
+                if not instancia:
+                    instancia.append(fn())
+        return instancia[0]
+
+    wrapper.reset = instancia.clear
+
+    def override(valor):
+        # Reemplaza el recurso (p. ej. un ApiClient sobre una sesión simulada en benchmarks)
+        with lock:
+            instancia[:] = [valor]
+
+    wrapper.override = override
+    _SINGLETONS.append(wrapper)
+    return wrapper
+
+
+def _reset_singletons():
+    # Conexiones SQLite y pools de hilos no sobreviven un fork: cada hijo crea los suyos
+    for singleton in _SINGLETONS:
+        singleton.reset()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_singletons)
+
+
+MAX_CONCURRENT_REQUESTS = int(os.environ.get("LOCALSCOPE_MAX_CONCURRENT_REQUESTS", 8))
+API_RATE = float(os.environ.get("LOCALSCOPE_API_RATE", 10))     # requests por segundo
+API_BURST = int(os.environ.get("LOCALSCOPE_API_BURST", 20))
+
+
+@_singleton
+def get_api_client() -> ApiClient:
+    """Cliente HTTP (pool, rate limit, reintentos, coalescing) compartido por todo el proceso."""
+    return ApiClient(rate=API_RATE, burst=API_BURST, max_concurrent=MAX_CONCURRENT_REQUESTS)
+
+
+def google_get(url: str, params: dict, timeout: float = 10) -> dict:
+    """GET a una API de Google a través del cliente compartido."""
+    return get_api_client().get_json(url, params, timeout=timeout)
+
+
+GEOCODE_TTL = float(os.environ.get("LOCALSCOPE_GEOCODE_TTL", 30 * 86400))  # segundos
+GEOCODE_CACHE_SIZE = int(os.environ.get("LOCALSCOPE_GEOCODE_CACHE_SIZE", 5000))
+
+
+@_singleton
+def get_geocode_cache() -> SQLiteCache:
+    """Caché en disco de geocodificaciones, compartido por todas las sesiones."""
+    return SQLiteCache(namespace="geocode", ttl=GEOCODE_TTL, max_entries=GEOCODE_CACHE_SIZE)
+
+
+def geocode_address(address: str, api_key: str) -> dict | None:
+    """Geocodifica una dirección en CABA (con caché persistente por dirección normalizada)."""
+    cache = get_geocode_cache()
+    key = normalize_address(address)
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+
+    url = "https://maps.googleapis.com/maps/api/geocode/json"
+    params = {"address": f"{address}, Buenos Aires, Argentina", "key": api_key}
+    data = google_get(url, params)
+    if data["status"] == "OK":
+        loc = data["results"][0]["geometry"]["location"]
+        coords = {"lat": loc["lat"], "lng": loc["lng"], "formatted": data["results"][0]["formatted_address"]}
+        cache.set(key, coords)
+        return coords
+    return None
+
+
+TRANSIT_TYPES = ("transit_station", "bus_station")
+PLACES_TILE_TTL = float(os.environ.get("LOCALSCOPE_PLACES_TTL", 86400))
+TRANSIT_TILE_TTL = float(os.environ.get("LOCALSCOPE_TRANSIT_TTL", 30 * 86400))  # las paradas casi no cambian
+
+
+@_singleton
+def get_tile_caches() -> dict[str, PlaceTileCache]:
+    """Caché espacial de Nearby Search: una para comercios y otra (más longeva) para transporte."""
+    return {
+        "places": PlaceTileCache(SQLiteCache(namespace="tiles", ttl=PLACES_TILE_TTL, max_entries=50000)),
+        "transit": PlaceTileCache(SQLiteCache(namespace="tiles_transit", ttl=TRANSIT_TILE_TTL, max_entries=20000)),
+    }
+
+
+def _density_index(place_type: str, keyword: str):
+    if place_type in TRANSIT_TYPES:
+        return None
+    from . import density  # numpy se carga con la primera búsqueda, no al importar la app
+
+    index = density.get_index(place_type, keyword)
+    metrics.record_cache("density", index is not None)
+    return index
+
+
+def _gtfs_index():
+    from . import gtfs  # numpy, como el índice de densidad
+
+    index = gtfs.get_index()
+    metrics.record_cache("gtfs", index is not None)
+    return index
+
+
+def tile_fetcher(api_key: str):
+    """Fetcher de `PlaceTileCache`: Nearby Search paginado con `api_key`."""
+    def fetch(lat, lng, radius, keyword, place_type):
+        return nearby_search_pages(lat, lng, radius, keyword, place_type, api_key)
+
+    return fetch
+
+
+def search_places_iter(lat: float, lng: float, radius: int, keyword: str, place_type: str, api_key: str):
+    """Genera la lista acumulada de lugares cercanos a medida que llegan las páginas.
+
+    Responde desde el índice local del rubro (`localscope.density`) o desde las
+    teselas cacheadas cuando es posible.
+    """
+    if (index := _density_index(place_type, keyword)) is not None:
+        metrics.record_cache("density_exact", index.is_exact(lat, lng, radius))
+        yield index.places(lat, lng, radius)
+        return
+    tiles = get_tile_caches()["transit" if place_type in TRANSIT_TYPES else "places"]
+    yield from tiles.iter_query(lat, lng, radius, keyword, place_type, tile_fetcher(api_key))
+
+
+def search_places(lat: float, lng: float, radius: int, keyword: str, place_type: str, api_key: str) -> list[Place]:
+    """Busca lugares cercanos (todas las páginas), ordenados por distancia."""
+    if (index := _density_index(place_type, keyword)) is not None:
+        metrics.record_cache("density_exact", index.is_exact(lat, lng, radius))
+        return index.places(lat, lng, radius)
+    tiles = get_tile_caches()["transit" if place_type in TRANSIT_TYPES else "places"]
+    return tiles.query(lat, lng, radius, keyword, place_type, tile_fetcher(api_key))
+
+
+NEARBY_URL = "https://maps.googleapis.com/maps/api/place/nearbysearch/json"
+# Google tarda ~2 s en activar cada next_page_token y cada intento antes de eso es un request cobrado
+PAGE_TOKEN_DELAY = 2.0  # espera antes del primer pedido con el token
+PAGE_TOKEN_POLL = 0.5   # primer reintento si todavía no está activo; se duplica en cada intento
+PAGE_TOKEN_WAIT = 8.0   # espera máxima por token (después de PAGE_TOKEN_DELAY)
+
+
+class IncompletePagination(ApiError):
+    """Faltan páginas de una búsqueda: el next_page_token no se activó a tiempo o la API falló."""
+
+
+def nearby_search_pages(lat: float, lng: float, radius: int, keyword: str, place_type: str, api_key: str):
+    """Genera las páginas (hasta 3 × 20) de una búsqueda Nearby Search de Places API.
+
+    Antes de pedir cada página siguiente se espera lo que Google tarda en
+    activar el token y, si todavía no está listo, se reintenta con backoff. Si
+    el token no se activa a tiempo se levanta `IncompletePagination` después
+    de entregar las páginas ya recibidas, así el resultado no se toma como
+    completo (ni se guarda en la caché de teselas).
+    """
+    params = {
+        "location": f"{lat},{lng}",
+        "radius": radius,
+        "key": api_key,
+        "language": "es"
+    }
+    if place_type:
+        params["type"] = place_type
+    if keyword:
+        params["keyword"] = keyword
+    classify = classify_stop if place_type in TRANSIT_TYPES else None  # modo de cada parada, al ingresar
+    data = google_get(NEARBY_URL, params)
+    if data.get("status") not in ("OK", "ZERO_RESULTS"):
+        # REQUEST_DENIED, INVALID_REQUEST, etc.: que el motivo llegue a "errores"
+        raise ApiError(f"{data.get('status')} {data.get('error_message', '')}".strip())
+    yield parse_places(data.get("results", []), classify)
+
+    while token := data.get("next_page_token"):
+        time.sleep(PAGE_TOKEN_DELAY)
+        espera, limite = PAGE_TOKEN_POLL, time.monotonic() + PAGE_TOKEN_WAIT
+        while True:
+            data = google_get(NEARBY_URL, {"pagetoken": token, "key": api_key})
+            if data.get("status") != "INVALID_REQUEST":
+                break
+            if time.monotonic() + espera > limite:
+                raise IncompletePagination(f"next_page_token sin activar después de {PAGE_TOKEN_WAIT:g} s")
+            time.sleep(espera)
+            espera *= 2
+        if data.get("status") != "OK":
+            raise IncompletePagination(f"{data.get('status')} al pedir la página siguiente")
+        yield parse_places(data.get("results", []), classify)
+
+
+def nearby_search(lat: float, lng: float, radius: int, keyword: str, place_type: str,
+                  api_key: str) -> list[Place]:
+    """Busca lugares cercanos con Places API (todas las páginas, sin repetidos)."""
+    return dedup_places(p for page in nearby_search_pages(lat, lng, radius, keyword, place_type, api_key) for p in page)
+
+
+def get_transit_stops(lat: float, lng: float, radius: int, api_key: str) -> list[Place]:
+    """Busca paradas de transporte público cercanas (estaciones y colectivos en paralelo).
+
+    Una misma parada suele aparecer como transit_station y bus_station: se deja una sola.
+    Con un índice GTFS local (`localscope.gtfs`) se responde sin consultar la API.
+    """
+    if (index := _gtfs_index()) is not None:
+        return index.places(lat, lng, radius)
+    with ThreadPoolExecutor(max_workers=len(TRANSIT_TYPES)) as pool:
+        futures = [metrics.submit(pool, search_places, lat, lng, radius, "", t, api_key) for t in TRANSIT_TYPES]
+        return dedup_places(stop for f in futures for stop in f.result())
+
+
+# Con esto en 1, la falta de data/barrios.geojson es un error y no una degradación a la API
+REQUIRE_BARRIOS_GEOJSON = os.environ.get("LOCALSCOPE_REQUIRE_BARRIOS_GEOJSON", "") not in ("", "0")
+
+
+@_singleton
+def get_barrio_resolver() -> BarrioResolver | None:
+    """Carga una vez por proceso los polígonos de data/barrios.geojson (si están)."""
+    if os.path.exists(DEFAULT_GEOJSON_PATH):
+        resolver = BarrioResolver.from_geojson(DEFAULT_GEOJSON_PATH)
+        _check_barrio_names(resolver)
+        return resolver
+    mensaje = (f"No está {DEFAULT_GEOJSON_PATH}: el barrio se consulta a la API de datos abiertos en cada "
+               f"análisis, los mapas usan un solo barrio y el barrido de densidad cubre todo el bbox. "
+               f"Bajalo con `python -m localscope.barrios_geo descargar`.")
+    if REQUIRE_BARRIOS_GEOJSON:
+        raise FileNotFoundError(mensaje)
+    log.warning(mensaje)
+    return None
+
+
+def _check_barrio_names(resolver: BarrioResolver) -> None:
+    """Avisa qué barrios del GeoJSON no cruzan con la tabla de barrios (y al revés)."""
+    sin_fila = get_barrio_store().missing(resolver.names())
+    if sin_fila:
+        log.warning("%d barrios de %s no tienen fila en la tabla de barrios y usan el perfil _default: %s",
+                    len(sin_fila), DEFAULT_GEOJSON_PATH, ", ".join(sorted(sin_fila)))
+    claves = {barrio_key(n) for n in resolver.names()}
+    sin_poligono = [n for n in get_barrio_store().names() if barrio_key(n) not in claves]
+    if sin_poligono:
+        log.warning("Filas de la tabla de barrios sin polígono en %s (revisar el nombre): %s",
+                    DEFAULT_GEOJSON_PATH, ", ".join(sorted(sin_poligono)))
+
+
+def get_barrio_from_coords(lat: float, lng: float) -> str | None:
+    """Identifica el barrio localmente; sin GeoJSON local consulta la API de datos abiertos CABA."""
+    resolver = get_barrio_resolver()
+    metrics.record_cache("barrios_geojson", resolver is not None)
+    if resolver is not None:
+        return resolver.resolve(lat, lng)
+    try:
+        url = "https://datosabiertos-apis.buenosaires.gob.ar/datasets/barrios/consultar_punto"
+        data = get_api_client().get_json(url, {"x": lng, "y": lat}, timeout=8)
+        return data.get("nombre") or data.get("NOMBRE")
+    except Exception:
+        pass
+    return None
+
+
+# Pipeline concurrente
+LOOKUP_DEADLINE = 12  # segundos máximos por consulta externa
+
+
+@_singleton
+def get_lookup_executor() -> ThreadPoolExecutor:
+    """Pool compartido entre reruns y sesiones para las consultas externas."""
+    return ThreadPoolExecutor(max_workers=16, thread_name_prefix="lookup")
+
+
+def _describe(e: Exception) -> str:
+    return f"{type(e).__name__}: {e}" if str(e) else type(e).__name__
+
+
+def _timed(stage: str, fn, *args):
+    with metrics.span(stage):
+        return fn(*args)
+
+
+def run_lookups(lat: float, lng: float, radius: int, rubro_config: dict, api_key: str,
+                deadline: float = LOOKUP_DEADLINE, on_competitors=None) -> dict:
+    """Lanza en paralelo las consultas posteriores al geocoding.
+
+    Cada consulta se calcula una sola vez y tiene su propio deadline; si vence o
+    falla se usa el valor por defecto y se registra en "errores". Los competidores
+    se consumen en el hilo que llama, página a página, invocando
+    `on_competitors(lista_parcial)` para que la UI pueda ir actualizándose; una
+    excepción del callback no se registra como error sino que se propaga.
+    """
+    pool = get_lookup_executor()
+    tareas = {
+        "transit": (metrics.submit(pool, _timed, "transit", get_transit_stops, lat, lng, radius, api_key), []),
+        "barrio": (metrics.submit(pool, _timed, "barrio", get_barrio_from_coords, lat, lng), None),
+    }
+
+    inicio = time.monotonic()
+    resultados = {"errores": {}, "competitors": []}
+    pages = search_places_iter(lat, lng, radius, rubro_config["keyword"], rubro_config["type"], api_key)
+    with metrics.span("competitors"):
+        try:
+            while True:
+                try:
+                    parcial = next(pages)
+                except StopIteration:
+                    break
+                except Exception as e:
+                    resultados["errores"]["competitors"] = _describe(e)
+                    break
+                resultados["competitors"] = parcial
+                if on_competitors:
+                    on_competitors(parcial)  # lo que lance (p. ej. una cancelación) corta todo el análisis
+                if time.monotonic() - inicio > deadline:
+                    resultados["errores"]["competitors"] = "TimeoutError"
+                    break
+        except BaseException:
+            for future, _ in tareas.values():
+                future.cancel()
+            raise
+        finally:
+            pages.close()
+    resultados["competitors"].sort(key=lambda p: haversine(lat, lng, p.lat, p.lng))
+
+    for nombre, (future, default) in tareas.items():
+        restante = max(deadline - (time.monotonic() - inicio), 0)
+        try:
+            resultados[nombre] = future.result(timeout=restante)
+        except Exception as e:
+            future.cancel()
+            resultados[nombre] = default
+            resultados["errores"][nombre] = _describe(e)
+    return resultados
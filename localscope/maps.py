@@ -0,0 +1,98 @@
+"""Construcción de mapas Folium (base y capas) a partir de resultados de análisis.
+
+folium se importa al usar este módulo, no al importar `localscope`.
+"""
+import folium
+from folium.plugins import HeatMap, MarkerCluster
+
+from .transit import ICONOS, stop_mode
+
+
+def build_base_map(lat, lng, radius):
+    """Mapa base: tiles, radio analizado y punto central."""
+    m = folium.Map(
+        location=[lat, lng],
+        zoom_start=15,
+        tiles="CartoDB dark_matter"
+    )
+
+    # Radio
+    folium.Circle(
+        location=[lat, lng],
+        radius=radius,
+        color="#c8f065",
+        fill=True,
+        fill_opacity=0.08,
+        weight=1.5
+    ).add_to(m)
+
+    # Punto central
+    folium.CircleMarker(
+        location=[lat, lng],
+        radius=10,
+        color="#c8f065",
+        fill=True,
+        fill_color="#c8f065",
+        fill_opacity=0.9,
+        popup="📍 Dirección analizada"
+    ).add_to(m)
+
+    return m
+
+
+def competitors_layer(competitors):
+    """Capa de competidores, agrupados con MarkerCluster para soportar cientos de puntos."""
+    layer = folium.FeatureGroup(name="Competidores")
+    cluster = MarkerCluster(options={"disableClusteringAtZoom": 17, "showCoverageOnHover": False}).add_to(layer)
+    for p in competitors:
+        folium.CircleMarker(
+            location=[p.lat, p.lng],
+            radius=6,
+            color="#f06060",
+            fill=True,
+            fill_color="#f06060",
+            fill_opacity=0.7,
+            popup=f"🏪 {p.name}<br>⭐ {p.rating or 'N/D'}"
+        ).add_to(cluster)
+    return layer
+
+
+def transit_layer(transit_stops):
+    """Capa de transporte (las paradas ya llegan sin duplicados entre tipos)."""
+    layer = folium.FeatureGroup(name="Transporte")
+    cluster = MarkerCluster(options={"disableClusteringAtZoom": 17, "showCoverageOnHover": False}).add_to(layer)
+    for s in transit_stops:
+        folium.CircleMarker(
+            location=[s.lat, s.lng],
+            radius=5,
+            color="#60b4f0",
+            fill=True,
+            fill_color="#60b4f0",
+            fill_opacity=0.8,
+            popup=f"{ICONOS[stop_mode(s)]} {s.name or 'Parada'}"
+        ).add_to(cluster)
+    return layer
+
+
+def heatmap_layer(heatmap):
+    """Capa de calor con el score global por celda (salida de viability_heatmap)."""
+    layer = folium.FeatureGroup(name="Viabilidad")
+    HeatMap(
+        list(zip(heatmap["lat"].tolist(), heatmap["lng"].tolist(), (heatmap["score_total"] / 100).tolist())),
+        min_opacity=0.2,
+        radius=18,
+        blur=22,
+        gradient={0.25: "#f06060", 0.5: "#f0c040", 0.75: "#c8f065"},
+    ).add_to(layer)
+    return layer
+
+
+def build_map(lat, lng, radius, competitors, transit_stops, heatmap=None):
+    """Construye el mapa Folium completo. `heatmap` = salida de viability_heatmap (opcional)."""
+    m = build_base_map(lat, lng, radius)
+    if heatmap is not None and len(heatmap["lat"]):
+        heatmap_layer(heatmap).add_to(m)
+    competitors_layer(competitors).add_to(m)
+    transit_layer(transit_stops).add_to(m)
+    return m
+
@@ -0,0 +1,228 @@
+"""Instrumentación del pipeline: spans por etapa, llamadas a APIs, caché y costo estimado.
+
+Cada análisis abre un `Trace` que queda activo en un ContextVar; los pools del
+paquete propagan el contexto (`submit`), así que los spans y llamadas hechas en
+hilos se anotan en la traza correcta. Además se acumulan totales por proceso
+que se pueden exportar como JSON lines o en formato de texto de Prometheus.
+"""
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+# Precio de lista por request (USD); ajustable según el plan contratado
+API_COST_USD = {
+    "geocode": 0.005,
+    "nearbysearch": 0.032,
+    "datosabiertos": 0.0,
+}
+METRICS_PATH = os.environ.get(
+    "LOCALSCOPE_METRICS_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache", "metrics.jsonl"),
+)
+# Al superar este tamaño el archivo rota a metrics.jsonl.1 (y los anteriores a .2, ...)
+METRICS_MAX_BYTES = int(os.environ.get("LOCALSCOPE_METRICS_MAX_BYTES", 10 * 1024 * 1024))
+METRICS_BACKUPS = int(os.environ.get("LOCALSCOPE_METRICS_BACKUPS", 3))
+
+_current: contextvars.ContextVar = contextvars.ContextVar("localscope_trace", default=None)
+
+
+def endpoint_name(url: str) -> str:
+    for name in API_COST_USD:
+        if name in url:
+            return name
+    return "otro"
+
+
+class Trace:
+    """Spans y contadores de un análisis."""
+
+    def __init__(self, **labels):
+        self.id = uuid.uuid4().hex[:12]
+        self.labels = labels
+        self.started = time.time()
+        self.spans: list[dict] = []
+        self.api_calls: dict[str, int] = {}
+        self.cache: dict[str, dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, stage: str):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.spans.append({"stage": stage, "ms": round((time.perf_counter() - inicio) * 1000, 2),
+                                   "offset_ms": round((time.time() - self.started) * 1000, 2)})
+
+    def add_call(self, endpoint: str) -> None:
+        with self._lock:
+            self.api_calls[endpoint] = self.api_calls.get(endpoint, 0) + 1
+
+    def add_cache(self, name: str, hit: bool) -> None:
+        with self._lock:
+            c = self.cache.setdefault(name, {"hits": 0, "misses": 0})
+            c["hits" if hit else "misses"] += 1
+
+    @property
+    def cost_usd(self) -> float:
+        return round(sum(API_COST_USD.get(e, 0) * n for e, n in self.api_calls.items()), 4)
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id, "ts": self.started, **self.labels,
+            "spans": list(self.spans), "api_calls": dict(self.api_calls),
+            "cache": {k: dict(v) for k, v in self.cache.items()}, "cost_usd": self.cost_usd,
+        }
+
+
+class Registry:
+    """Totales del proceso (para Prometheus)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.api_calls: dict[str, int] = {}
+        self.cache: dict[tuple[str, str], int] = {}
+        self.stage_seconds: dict[str, list[float]] = {}   # stage -> [suma, cantidad]
+        self.cost_usd: dict[str, float] = {}               # por rubro
+        self.analyses = 0
+
+    def add_call(self, endpoint: str) -> None:
+        with self._lock:
+            self.api_calls[endpoint] = self.api_calls.get(endpoint, 0) + 1
+
+    def add_cache(self, name: str, hit: bool) -> None:
+        key = (name, "hit" if hit else "miss")
+        with self._lock:
+            self.cache[key] = self.cache.get(key, 0) + 1
+
+    def add_stage(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            self._add_stage(stage, seconds)
+
+    def _add_stage(self, stage: str, seconds: float) -> None:
+        acc = self.stage_seconds.setdefault(stage, [0.0, 0])
+        acc[0] += seconds
+        acc[1] += 1
+
+    def add_trace(self, trace: Trace) -> None:
+        with self._lock:
+            self.analyses += 1
+            for s in trace.spans:
+                self._add_stage(s["stage"], s["ms"] / 1000)
+            rubro = trace.labels.get("rubro", "")
+            self.cost_usd[rubro] = self.cost_usd.get(rubro, 0) + trace.cost_usd
+
+    def prometheus_text(self) -> str:
+        def esc(v):
+            return str(v).replace("\\", "\\\\").replace('"', '\\"')
+
+        with self._lock:
+            lines = [
+                "# HELP localscope_api_calls_total Requests HTTP enviados a APIs externas.",
+                "# TYPE localscope_api_calls_total counter",
+                *(f'localscope_api_calls_total{{endpoint="{esc(e)}"}} {n}' for e, n in sorted(self.api_calls.items())),
+                "# HELP localscope_cache_requests_total Consultas a cachés por resultado.",
+                "# TYPE localscope_cache_requests_total counter",
+                *(f'localscope_cache_requests_total{{cache="{esc(c)}",result="{r}"}} {n}'
+                  for (c, r), n in sorted(self.cache.items())),
+                "# HELP localscope_stage_seconds Duración de cada etapa del análisis.",
+                "# TYPE localscope_stage_seconds summary",
+            ]
+            for stage, (total, n) in sorted(self.stage_seconds.items()):
+                lines.append(f'localscope_stage_seconds_sum{{stage="{esc(stage)}"}} {total:.6f}')
+                lines.append(f'localscope_stage_seconds_count{{stage="{esc(stage)}"}} {n}')
+            lines += [
+                "# HELP localscope_estimated_cost_usd_total Costo estimado de APIs por rubro.",
+                "# TYPE localscope_estimated_cost_usd_total counter",
+                *(f'localscope_estimated_cost_usd_total{{rubro="{esc(r)}"}} {c:.4f}' for r, c in sorted(self.cost_usd.items())),
+                "# HELP localscope_analyses_total Análisis completados.",
+                "# TYPE localscope_analyses_total counter",
+                f"localscope_analyses_total {self.analyses}",
+            ]
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def current() -> Trace | None:
+    return _current.get()
+
+
+@contextmanager
+def trace(**labels):
+    """Abre una traza y la deja activa en el contexto actual."""
+    t = Trace(**labels)
+    token = _current.set(t)
+    try:
+        yield t
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def span(stage: str):
+    """Span sobre la traza activa (no hace nada si no hay traza)."""
+    t = _current.get()
+    if t is None:
+        yield
+    else:
+        with t.span(stage):
+            yield
+
+
+def record_call(url: str) -> None:
+    endpoint = endpoint_name(url)
+    REGISTRY.add_call(endpoint)
+    if (t := _current.get()) is not None:
+        t.add_call(endpoint)
+
+
+def record_cache(name: str, hit: bool) -> None:
+    REGISTRY.add_cache(name, hit)
+    if (t := _current.get()) is not None:
+        t.add_cache(name, hit)
+
+
+def submit(pool, fn, *args, **kwargs):
+    """pool.submit propagando el contexto (traza activa) al hilo del pool."""
+    return pool.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+
+_export_lock = threading.Lock()
+
+
+def _rotate(path: str, backups: int) -> None:
+    # path.N se descarta, path.N-1 → path.N, ..., path → path.1
+    for n in range(backups - 1, 0, -1):
+        if os.path.exists(f"{path}.{n}"):
+            os.replace(f"{path}.{n}", f"{path}.{n + 1}")
+    if backups:
+        os.replace(path, f"{path}.1")
+    else:
+        os.remove(path)
+
+
+def export(trace: Trace, path: str = METRICS_PATH, max_bytes: int = METRICS_MAX_BYTES,
+           backups: int = METRICS_BACKUPS) -> None:
+    """Suma la traza a los totales del proceso y la agrega como una línea JSON a `path`.
+
+    Cuando el archivo supera `max_bytes` se rota, conservando `backups` archivos anteriores.
+    """
+    REGISTRY.add_trace(trace)
+    if path:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        linea = json.dumps(trace.to_dict(), ensure_ascii=False) + "\n"
+        with _export_lock:
+            try:
+                if max_bytes and os.path.getsize(path) >= max_bytes:
+                    _rotate(path, backups)
+            except FileNotFoundError:
+                pass  # primera traza, u otro proceso acaba de rotar
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(linea)
@@ -0,0 +1,148 @@
+"""Búsqueda de las mejores ubicaciones para un rubro dentro de un barrio o polígono.
+
+Los competidores y paradas del área se traen una sola vez (desde la caché de
+teselas), así que las llamadas a la API dependen del tamaño del área y no de la
+cantidad de candidatos. La búsqueda es de grueso a fino: se puntúa una grilla
+de `step` m con el motor vectorizado y alrededor de los mejores candidatos se
+vuelve a puntuar con la mitad del paso, hasta llegar a `min_step`.
+"""
+import math
+
+from . import metrics
+from .analysis import DEFAULT_RADIUS, AnalysisResult, GeocodingError, _api_key, _rubro
+from .barrios import BARRIO_DESCONOCIDO
+from .barrios_geo import point_in_polygons
+from .geo import haversine
+from .lookups import geocode_address, get_barrio_resolver, get_transit_stops, search_places
+from .rubros import RUBROS
+from .scoring import score_location, score_weights
+
+OPTIMIZE_STEP = 100         # paso de la grilla inicial (m)
+OPTIMIZE_MIN_STEP = 25      # paso de la última pasada de refinamiento (m)
+OPTIMIZE_BEAM = 12          # candidatos que se refinan en cada pasada (como mínimo)
+OPTIMIZE_MAX_EXTENT = 4000  # m del centro al borde del área; acota las teselas a consultar
+BARRIO_EXTENT = 1200        # sin polígonos locales, el barrio se aproxima con un círculo de este radio
+METERS_PER_DEG = 111320
+
+
+def _circle(lat: float, lng: float, radius: float, lados: int = 32) -> list:
+    dlat = radius / METERS_PER_DEG
+    dlng = radius / (METERS_PER_DEG * math.cos(math.radians(lat)))
+    ring = [[lng + dlng * math.cos(2 * math.pi * k / lados), lat + dlat * math.sin(2 * math.pi * k / lados)]
+            for k in range(lados + 1)]
+    return [[ring]]
+
+
+def _area(barrio: str | None, polygon: list | None, api_key: str) -> list:
+    """Polígonos (formato GeoJSON) donde buscar."""
+    if polygon is not None:
+        return [[[[lng, lat] for lat, lng in polygon]]]
+    if not barrio:
+        raise ValueError("Indicá un barrio o un polígono")
+    resolver = get_barrio_resolver()
+    if resolver is not None:
+        polygons = resolver.polygons(barrio)
+        if polygons is None:
+            raise KeyError(f"Barrio desconocido: {barrio!r}")
+        return polygons
+    # Sin data/barrios.geojson: círculo alrededor del barrio geocodificado (una llamada, cacheada)
+    coords = geocode_address(f"{barrio}, CABA", api_key)
+    if not coords:
+        raise GeocodingError(f"No se pudo geocodificar el barrio {barrio!r}")
+    return _circle(coords["lat"], coords["lng"], BARRIO_EXTENT)
+
+
+def optimize_location(rubro: str, barrio: str | None = None, polygon: list | None = None,
+                      radius: int = DEFAULT_RADIUS, api_key: str | None = None, top_k: int = 5,
+                      step: float = OPTIMIZE_STEP, min_step: float = OPTIMIZE_MIN_STEP,
+                      min_separation: float | None = None) -> list[AnalysisResult]:
+    """Los `top_k` puntos de mayor score global para `rubro` dentro de `barrio` o `polygon`.
+
+    `polygon` es una lista de (lat, lng). Los resultados están a al menos
+    `min_separation` m entre sí (por defecto, medio radio) y traen el detalle
+    por capa como cualquier `AnalysisResult`.
+    """
+    import numpy as np
+
+    from .grid import city_grid, places_to_arrays, score_grid, transit_to_arrays
+
+    api_key = _api_key(api_key)
+    rubro = _rubro(rubro)
+    config = RUBROS[rubro]
+    min_separation = radius / 2 if min_separation is None else min_separation
+    area = _area(barrio, polygon, api_key)
+
+    lats = [pt[1] for poly in area for pt in poly[0]]
+    lngs = [pt[0] for poly in area for pt in poly[0]]
+    bbox = (min(lats), min(lngs), max(lats), max(lngs))
+    c_lat, c_lng = (bbox[0] + bbox[2]) / 2, (bbox[1] + bbox[3]) / 2
+    extent = max(haversine(c_lat, c_lng, a, b) for a in bbox[::2] for b in bbox[1::2])
+    if extent > OPTIMIZE_MAX_EXTENT:
+        raise ValueError(f"El área es demasiado grande ({extent:.0f} m desde el centro, máximo {OPTIMIZE_MAX_EXTENT} m)")
+
+    alcance = math.ceil(extent + radius)
+    with metrics.span("optimize_fetch"):
+        competitors = search_places(c_lat, c_lng, alcance, config["keyword"], config["type"], api_key)
+        transit = get_transit_stops(c_lat, c_lng, alcance, api_key)
+    comp_arrays = places_to_arrays(competitors)
+    t_arrays = transit_to_arrays(transit)
+    weights = np.asarray(score_weights(rubro))
+    resolver = get_barrio_resolver()
+
+    def barrio_de(lat: float, lng: float) -> str | None:
+        return resolver.resolve(lat, lng) if resolver is not None else barrio
+
+    def dentro(qlat, qlng):
+        m = np.array([point_in_polygons(a, b, area) for a, b in zip(qlat, qlng)], dtype=bool)
+        return qlat[m], qlng[m]
+
+    def puntuar(qlat, qlng):
+        grid = score_grid(qlat, qlng, rubro, radius, comp_arrays, t_arrays,
+                          [barrio_de(a, b) for a, b in zip(qlat, qlng)], weights=weights)
+        # Se ordena por el score sin redondear para desempatar entre candidatos con el mismo entero
+        return np.stack([grid["s_comp"], grid["s_trans"], grid["s_alq"], grid["s_demo"]], axis=1) @ weights
+
+    with metrics.span("optimize_search"):
+        qlat, qlng = dentro(*city_grid(step, bbox=bbox))
+        if not len(qlat):
+            qlat, qlng = dentro(*city_grid(min_step, bbox=bbox))
+        if not len(qlat):
+            raise ValueError("El área no contiene puntos de la grilla")
+        cand_lat, cand_lng, cand_key = qlat, qlng, puntuar(qlat, qlng)
+        vistos = {(round(a, 6), round(b, 6)) for a, b in zip(cand_lat, cand_lng)}
+
+        paso = step
+        while paso > min_step:
+            paso /= 2
+            dlat = paso / METERS_PER_DEG
+            dlng = paso / (METERS_PER_DEG * math.cos(math.radians(c_lat)))
+            mejores = np.argsort(-cand_key, kind="stable")[:max(OPTIMIZE_BEAM, 3 * top_k)]
+            nuevos = {(round(cand_lat[i] + di * dlat, 6), round(cand_lng[i] + dj * dlng, 6))
+                      for i in mejores for di in (-1, 0, 1) for dj in (-1, 0, 1)} - vistos
+            if not nuevos:
+                continue
+            vistos |= nuevos
+            qlat, qlng = dentro(*(np.array(v) for v in zip(*sorted(nuevos))))
+            if len(qlat):
+                cand_lat = np.concatenate([cand_lat, qlat])
+                cand_lng = np.concatenate([cand_lng, qlng])
+                cand_key = np.concatenate([cand_key, puntuar(qlat, qlng)])
+
+    elegidos = []
+    for i in np.argsort(-cand_key, kind="stable"):
+        if all(haversine(cand_lat[i], cand_lng[i], cand_lat[j], cand_lng[j]) >= min_separation for j in elegidos):
+            elegidos.append(i)
+            if len(elegidos) == top_k:
+                break
+
+    resultados = []
+    for i in elegidos:
+        lat, lng = float(cand_lat[i]), float(cand_lng[i])
+        comp = [p for p in competitors if haversine(lat, lng, p.lat, p.lng) <= radius]
+        trans = [s for s in transit if haversine(lat, lng, s.lat, s.lng) <= radius]
+        nombre = barrio_de(lat, lng) or BARRIO_DESCONOCIDO
+        scores = score_location(comp, trans, nombre, rubro, radius, lat, lng)
+        coords = {"lat": lat, "lng": lng, "formatted": f"{lat:.5f}, {lng:.5f}"}
+        resultados.append(AnalysisResult.from_scores(coords["formatted"], coords, nombre, rubro, radius,
+                                                     comp, trans, scores))
+    return sorted(resultados, key=lambda r: -r.score_total)
@@ -0,0 +1,64 @@
+"""Registro compacto de lugares de Places API.
+
+Las respuestas de Nearby Search traen fotos, horarios, plus codes, etc. Al
+ingresar se reducen a `Place` (slots, sólo los campos que usan el scoring, el
+mapa y las cachés) y se deduplican por `place_id` una única vez.
+"""
+from dataclasses import dataclass
+from typing import Iterable
+
+from .geo import place_location
+
+
+@dataclass(frozen=True, slots=True)
+class Place:
+    place_id: str
+    name: str
+    lat: float
+    lng: float
+    rating: float = 0.0          # 0 = sin rating
+    user_ratings_total: int = 0
+    vicinity: str = ""
+    modo: str = ""               # paradas: subte / tren / colectivo (ver localscope.transit)
+
+    @classmethod
+    def from_api(cls, raw: dict, modo: str = "") -> "Place | None":
+        """Reduce un resultado crudo de Places; None si no trae geometría."""
+        loc = place_location(raw)
+        if loc is None:
+            return None
+        return cls(
+            place_id=raw.get("place_id") or f"{loc[0]:.5f},{loc[1]:.5f}",
+            name=raw.get("name") or "", lat=loc[0], lng=loc[1],
+            rating=float(raw.get("rating") or 0), user_ratings_total=int(raw.get("user_ratings_total") or 0),
+            vicinity=raw.get("vicinity") or "", modo=modo,
+        )
+
+    def to_row(self) -> list:
+        """Fila serializable (JSON) para las cachés en disco."""
+        return [self.place_id, self.name, self.lat, self.lng, self.rating, self.user_ratings_total, self.vicinity,
+                self.modo]
+
+    @classmethod
+    def from_row(cls, row: list) -> "Place":
+        return cls(*row)  # las filas anteriores a `modo` tienen un campo menos
+
+
+def parse_places(results: Iterable[dict], classify=None) -> list[Place]:
+    """Resultados crudos de Places → lista de `Place` sin duplicados.
+
+    `classify(raw) -> modo` se aplica a cada resultado (paradas de transporte).
+    """
+    return dedup_places(p for raw in results
+                        if (p := Place.from_api(raw, classify(raw) if classify else "")) is not None)
+
+
+def dedup_places(places: Iterable[Place]) -> list[Place]:
+    """Elimina repetidos por `place_id`, conservando el primero."""
+    vistos = set()
+    unicos = []
+    for p in places:
+        if p.place_id not in vistos:
+            vistos.add(p.place_id)
+            unicos.append(p)
+    return unicos
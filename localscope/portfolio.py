@@ -0,0 +1,406 @@
+"""Cartera de ubicaciones guardadas con detección de cambios.
+
+Cada ubicación guarda su último análisis completo (coords, rubro, radio,
+detalle por capa y los `place_id`/rating de competidores y paradas). Una
+revisión junta las teselas de todas las ubicaciones, vuelve a traer una sola
+vez cada tesela vencida (más de `check_every` desde su última revisión) y
+guarda una firma de su contenido. Sólo se recalculan las ubicaciones que tocan
+una tesela cuya firma cambió, o cuyo perfil de barrio o versión de reglas
+cambió, emitiendo un `ChangeEvent` por cada cambio: el costo crece con las
+teselas vencidas, no con la cantidad de ubicaciones. Una tesela vencida se
+vuelve a pedir aunque siga vigente en la caché de teselas. Las capas que
+responden desde índices locales (densidad, GTFS) no usan teselas: la ubicación
+se recalcula sólo si cambió la versión de alguno de esos índices.
+
+    python -m localscope.portfolio check          # revisa las teselas vencidas
+    python -m localscope.portfolio watch --every 3600
+"""
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+
+from .analysis import LAYERS, AnalysisResult
+from .barrios import barrio_profile
+from .cache import DEFAULT_CACHE_PATH
+from .datafiles import density_path, file_version, gtfs_path
+from .lookups import (
+    PLACES_TILE_TTL, TRANSIT_TYPES, _density_index, _gtfs_index, _singleton, get_tile_caches, get_transit_stops,
+    search_places, tile_fetcher,
+)
+from .rubros import RUBROS
+from .rules import get_rules
+from .scoring import rent_estimate, score_location
+
+PORTFOLIO_PATH = os.environ.get("LOCALSCOPE_PORTFOLIO_PATH", DEFAULT_CACHE_PATH)
+# Cada cuánto se vuelve a pedir una tesela de la cartera (se pide aunque siga en la caché de teselas)
+PORTFOLIO_CHECK_EVERY = float(os.environ.get("LOCALSCOPE_PORTFOLIO_CHECK_EVERY", PLACES_TILE_TTL))
+RATING_DELTA = 0.1  # diferencia mínima de rating que cuenta como cambio
+
+# Tipos de evento
+COMPETENCIA, TRANSPORTE, BARRIO, REGLAS, SCORE = "competencia", "transporte", "barrio", "reglas", "score"
+
+
+@dataclass
+class SavedSite:
+    id: str
+    nombre: str
+    result: AnalysisResult
+    perfil: list                 # perfil del barrio con el que se calculó (BarrioProfile + alquiler por avisos)
+    rules_version: str
+    created: float
+    checked: float
+    error: str | None = None     # último error al revisar (la ubicación se reintenta en la próxima)
+    fuentes: dict = field(default_factory=dict)  # versión de cada índice local usado ("densidad", "gtfs")
+
+
+@dataclass
+class ChangeEvent:
+    site_id: str
+    kind: str
+    detail: dict
+    ts: float = field(default_factory=time.time)
+
+
+def site_id(lat: float, lng: float, radius: int, rubro: str) -> str:
+    return hashlib.blake2b(f"{lat:.5f}|{lng:.5f}|{radius}|{rubro}".encode(), digest_size=6).hexdigest()
+
+
+def _perfil(result: AnalysisResult) -> list:
+    # Un cambio en la mediana de avisos de la zona (índice de alquileres nuevo) cuenta como cambio de barrio
+    estimate = rent_estimate(result.lat, result.lng, result.barrio)
+    return list(barrio_profile(result.barrio)) + (list(estimate) if estimate is not None else [])
+
+
+def _site_tiles(result: AnalysisResult) -> tuple[list[tuple], dict]:
+    """Teselas (cache, keyword, type, tesela) de las que sale el análisis, y la versión de cada índice local."""
+    config = RUBROS[result.rubro]
+    geometria = get_tile_caches()["places"]
+    tiles, fuentes = [], {}
+    if _density_index(config["type"], config["keyword"]) is None:
+        tiles += [("places", config["keyword"], config["type"], t)
+                  for t in geometria.tiles_for_circle(result.lat, result.lng, result.radius)]
+    else:
+        fuentes["densidad"] = file_version(density_path(config["type"], config["keyword"]))
+    if _gtfs_index() is None:
+        tiles += [("transit", "", place_type, t) for place_type in TRANSIT_TYPES
+                  for t in geometria.tiles_for_circle(result.lat, result.lng, result.radius)]
+    else:
+        fuentes["gtfs"] = file_version(gtfs_path())
+    return tiles, fuentes
+
+
+def _tile_key(tile: tuple) -> str:
+    kind, keyword, place_type, (i, j) = tile
+    return f"{kind}|{place_type}|{keyword}|{i}|{j}"
+
+
+def _digest(places: list) -> str:
+    return hashlib.blake2b(repr(sorted((p.place_id, p.rating) for p in places)).encode(), digest_size=8).hexdigest()
+
+
+def diff_places(antes: list, ahora: list, rating_delta: float = RATING_DELTA) -> dict:
+    """Altas, bajas y cambios de rating entre dos listas de `Place` (por place_id)."""
+    a = {p.place_id: p for p in antes}
+    b = {p.place_id: p for p in ahora}
+    cambios = {
+        "nuevos": [b[i].name for i in b.keys() - a.keys()],
+        "cerrados": [a[i].name for i in a.keys() - b.keys()],
+        "rating": [{"nombre": b[i].name, "antes": a[i].rating, "ahora": b[i].rating}
+                   for i in a.keys() & b.keys() if abs(a[i].rating - b[i].rating) >= rating_delta],
+    }
+    return {k: v for k, v in cambios.items() if v}
+
+
+class Portfolio:
+    """Ubicaciones guardadas y su historial de cambios, en SQLite."""
+
+    def __init__(self, path: str = PORTFOLIO_PATH, check_every: float = PORTFOLIO_CHECK_EVERY):
+        self.check_every = check_every
+        self._lock = threading.Lock()
+        self._listeners = []
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS portfolio_sites (
+                    id      TEXT PRIMARY KEY,
+                    nombre  TEXT NOT NULL,
+                    data    TEXT NOT NULL,
+                    created REAL NOT NULL,
+                    checked REAL NOT NULL
+                )
+            """)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS portfolio_events (
+                    id      INTEGER PRIMARY KEY AUTOINCREMENT,
+                    site_id TEXT NOT NULL,
+                    kind    TEXT NOT NULL,
+                    detail  TEXT NOT NULL,
+                    ts      REAL NOT NULL
+                )
+            """)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS portfolio_tiles (
+                    key     TEXT PRIMARY KEY,
+                    digest  TEXT NOT NULL,
+                    checked REAL NOT NULL
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS portfolio_events_site ON portfolio_events (site_id, ts)")
+
+    # ─── Ubicaciones ──────────────────────────────────────────────────────────
+
+    def add(self, result: AnalysisResult, nombre: str = "") -> str:
+        """Guarda (o reemplaza) el análisis como ubicación de la cartera; devuelve su id."""
+        ahora = time.time()
+        sid = site_id(result.lat, result.lng, result.radius, result.rubro)
+        site = SavedSite(sid, nombre or result.formatted, result, _perfil(result),
+                         get_rules().version, ahora, ahora, fuentes=_site_tiles(result)[1])
+        self._save(site)
+        return sid
+
+    def remove(self, sid: str) -> bool:
+        with self._lock, self._conn:
+            n = self._conn.execute("DELETE FROM portfolio_sites WHERE id = ?", (sid,)).rowcount
+            self._conn.execute("DELETE FROM portfolio_events WHERE site_id = ?", (sid,))
+        return n > 0
+
+    def get(self, sid: str) -> SavedSite | None:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM portfolio_sites WHERE id = ?", (sid,)).fetchone()
+        return self._site(row) if row else None
+
+    def sites(self) -> list[SavedSite]:
+        with self._lock:
+            rows = self._conn.execute("SELECT * FROM portfolio_sites ORDER BY created").fetchall()
+        return [self._site(r) for r in rows]
+
+    def iter_sites(self, page: int = 200):
+        """Como `sites`, pero de a `page` filas (para recorrer carteras grandes sin cargarlas enteras)."""
+        offset = 0
+        while True:
+            with self._lock:
+                rows = self._conn.execute("SELECT * FROM portfolio_sites ORDER BY created, id LIMIT ? OFFSET ?",
+                                          (page, offset)).fetchall()
+            yield from map(self._site, rows)
+            if len(rows) < page:
+                return
+            offset += page
+
+    def _save(self, site: SavedSite) -> None:
+        data = {"result": site.result.to_dict(), "perfil": site.perfil,
+                "rules_version": site.rules_version, "error": site.error, "fuentes": site.fuentes}
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO portfolio_sites VALUES (?, ?, ?, ?, ?)",
+                               (site.id, site.nombre, json.dumps(data), site.created, site.checked))
+
+    @staticmethod
+    def _site(row) -> SavedSite:
+        sid, nombre, data, created, checked = row
+        data = json.loads(data)
+        return SavedSite(sid, nombre, AnalysisResult.from_dict(data["result"]), data["perfil"],
+                         data["rules_version"], created, checked, data.get("error"), data.get("fuentes", {}))
+
+    # ─── Eventos ──────────────────────────────────────────────────────────────
+
+    def subscribe(self, callback) -> None:
+        """`callback(ChangeEvent)` se invoca por cada cambio detectado."""
+        self._listeners.append(callback)
+
+    def events(self, sid: str | None = None, since: float = 0, limit: int = 100) -> list[ChangeEvent]:
+        """Cambios más recientes primero (de una ubicación o de toda la cartera)."""
+        sql = "SELECT site_id, kind, detail, ts FROM portfolio_events WHERE ts >= ?"
+        params = [since]
+        if sid is not None:
+            sql += " AND site_id = ?"
+            params.append(sid)
+        with self._lock:
+            rows = self._conn.execute(sql + " ORDER BY id DESC LIMIT ?", (*params, limit)).fetchall()
+        return [ChangeEvent(s, k, json.loads(d), ts) for s, k, d, ts in rows]
+
+    def _emit(self, events: list[ChangeEvent]) -> None:
+        with self._lock, self._conn:
+            self._conn.executemany("INSERT INTO portfolio_events (site_id, kind, detail, ts) VALUES (?, ?, ?, ?)",
+                                   [(e.site_id, e.kind, json.dumps(e.detail), e.ts) for e in events])
+        for e in events:
+            for callback in self._listeners:
+                callback(e)
+
+    # ─── Revisión ─────────────────────────────────────────────────────────────
+
+    def refresh(self, api_key: str, sids: list[str] | None = None, now: float | None = None,
+                on_progress=None) -> list[ChangeEvent]:
+        """Revisa la cartera (o sólo `sids`, con todas sus teselas) y devuelve los cambios detectados.
+
+        Sólo se recalculan y reescriben las ubicaciones con cambios; al resto
+        se le actualiza la fecha de revisión. `on_progress(hechas, total)` se
+        llama antes de cada ubicación (puede lanzar para cortar la revisión).
+        """
+        ahora = now or time.time()
+        sites = [s for s in map(self.get, sids) if s] if sids is not None else list(self.iter_sites())
+        teselas = {site.id: _site_tiles(site.result) for site in sites}
+        cambiadas, fallidas = self._refresh_tiles(teselas, api_key, ahora, todas=sids is not None,
+                                                  podar=sids is None)
+        version = get_rules().version
+        cambios, sin_cambios = [], []
+        for n, site in enumerate(sites):
+            if on_progress:
+                on_progress(n, len(sites))
+            tiles, fuentes = teselas[site.id]
+            if fallo := next((fallidas[t] for t in tiles if t in fallidas), None):
+                site.error = str(fallo) or type(fallo).__name__  # no se marca revisada: se reintenta
+                self._save(site)
+                continue
+            if not (sids is not None or site.error or site.rules_version != version or site.fuentes != fuentes
+                    or any(t in cambiadas for t in tiles) or _perfil(site.result) != site.perfil):
+                sin_cambios.append(site.id)
+                continue
+            try:
+                eventos = self._check(site, api_key, ahora, fuentes)
+            except Exception as e:
+                site.error = str(e) or type(e).__name__
+                self._save(site)
+                continue
+            if eventos:
+                self._emit(eventos)
+                cambios += eventos
+        with self._lock, self._conn:
+            self._conn.executemany("UPDATE portfolio_sites SET checked = ? WHERE id = ?",
+                                   [(ahora, sid) for sid in sin_cambios])
+        return cambios
+
+    def _refresh_tiles(self, teselas: dict, api_key: str, ahora: float, todas: bool = False,
+                       podar: bool = False) -> tuple[set, dict]:
+        """Trae una vez cada tesela vencida (o todas) y devuelve (teselas con cambios, {tesela: error})."""
+        with self._lock:
+            previas = {k: (d, c) for k, d, c in self._conn.execute("SELECT key, digest, checked FROM portfolio_tiles")}
+        limite = ahora - self.check_every
+        grupos: dict[tuple, list] = {}
+        for tile in {t for tiles, _ in teselas.values() for t in tiles}:
+            previa = previas.get(_tile_key(tile))
+            # Una tesela nueva toma la firma de la caché; una ya revisada se vuelve a pedir a la API,
+            # porque la caché de teselas (la de transporte dura 30 días) la seguiría dando por vigente
+            if previa is None or todas or previa[1] <= limite:
+                grupos.setdefault((*tile[:3], previa is not None), []).append(tile[3])
+
+        caches, fetch = get_tile_caches(), tile_fetcher(api_key)
+        cambiadas, fallidas, filas = set(), {}, []
+        for (kind, keyword, place_type, refetch), tiles in grupos.items():
+            lugares, errores = caches[kind].get_tiles(tiles, keyword, place_type, fetch, refresh=refetch)
+            fallidas.update({(kind, keyword, place_type, t): e for t, e in errores.items()})
+            for t, places in lugares.items():
+                key, digest = _tile_key((kind, keyword, place_type, t)), _digest(places)
+                if previas.get(key, (None,))[0] != digest:
+                    cambiadas.add((kind, keyword, place_type, t))
+                filas.append((key, digest, ahora))
+        with self._lock, self._conn:
+            self._conn.executemany("INSERT OR REPLACE INTO portfolio_tiles VALUES (?, ?, ?)", filas)
+            if podar:  # teselas que ya no usa ninguna ubicación
+                vigentes = {_tile_key(t) for tiles, _ in teselas.values() for t in tiles}
+                self._conn.executemany("DELETE FROM portfolio_tiles WHERE key = ?",
+                                       [(k,) for k in previas.keys() - vigentes])
+        return cambiadas, fallidas
+
+    def _check(self, site: SavedSite, api_key: str, ahora: float, fuentes: dict) -> list[ChangeEvent]:
+        r = site.result
+        config = RUBROS[r.rubro]
+        competitors = search_places(r.lat, r.lng, r.radius, config["keyword"], config["type"], api_key)
+        transit = get_transit_stops(r.lat, r.lng, r.radius, api_key)
+        perfil = _perfil(r)
+        version = get_rules().version
+
+        eventos = []
+        if d := diff_places(r.competitors, competitors):
+            eventos.append(ChangeEvent(site.id, COMPETENCIA, d, ahora))
+        if d := diff_places(r.transit, transit):
+            eventos.append(ChangeEvent(site.id, TRANSPORTE, d, ahora))
+        if perfil != site.perfil:
+            eventos.append(ChangeEvent(site.id, BARRIO, {"antes": site.perfil, "ahora": perfil}, ahora))
+        if version != site.rules_version:
+            eventos.append(ChangeEvent(site.id, REGLAS, {"antes": site.rules_version, "ahora": version}, ahora))
+
+        if eventos:
+            scores = score_location(competitors, transit, r.barrio, r.rubro, r.radius, r.lat, r.lng)
+            coords = {"lat": r.lat, "lng": r.lng, "formatted": r.formatted}
+            nuevo = AnalysisResult.from_scores(r.address, coords, r.barrio, r.rubro, r.radius,
+                                               competitors, transit, scores)
+            capas = {capa: [getattr(r, capa).color, getattr(nuevo, capa).color]
+                     for capa in LAYERS if getattr(r, capa).color != getattr(nuevo, capa).color}
+            if nuevo.score_total != r.score_total or capas:
+                eventos.append(ChangeEvent(site.id, SCORE, {"antes": r.score_total, "ahora": nuevo.score_total,
+                                                            "capas": capas}, ahora))
+            site.result, site.perfil, site.rules_version, site.fuentes = nuevo, perfil, version, fuentes
+            site.checked, site.error = ahora, None
+            self._save(site)
+        elif site.error or site.fuentes != fuentes:
+            site.checked, site.error, site.fuentes = ahora, None, fuentes
+            self._save(site)
+        else:
+            with self._lock, self._conn:
+                self._conn.execute("UPDATE portfolio_sites SET checked = ? WHERE id = ?", (ahora, site.id))
+        return eventos
+
+
+@_singleton
+def get_portfolio() -> Portfolio:
+    return Portfolio()
+
+
+class Scheduler:
+    """Revisa la cartera en segundo plano cada `every` segundos."""
+
+    def __init__(self, portfolio: Portfolio, api_key: str, every: float = 3600):
+        self.portfolio, self.api_key, self.every = portfolio, api_key, every
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name="portfolio", daemon=True)
+
+    def start(self) -> "Scheduler":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.portfolio.refresh(self.api_key)
+            except sqlite3.Error:
+                pass  # la base puede estar ocupada por otro proceso; se reintenta en la próxima vuelta
+            self._stop.wait(self.every)
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Revisión de la cartera de ubicaciones guardadas")
+    parser.add_argument("accion", choices=("check", "watch", "list"))
+    parser.add_argument("--every", type=float, default=3600, help="watch: segundos entre revisiones")
+    parser.add_argument("--all", action="store_true", help="check: revisar todas las teselas, no sólo las vencidas")
+    args = parser.parse_args(argv)
+
+    portfolio = get_portfolio()
+    if args.accion == "list":
+        for s in portfolio.sites():
+            print(f"{s.id}  {s.result.score_total:>3}  {s.nombre} · {s.result.rubro} · {s.result.radius} m")
+        return 0
+    api_key = os.environ.get("GOOGLE_PLACES_API_KEY")
+    if not api_key:
+        parser.error("falta GOOGLE_PLACES_API_KEY")
+    portfolio.subscribe(lambda e: print(f"{e.site_id} {e.kind}: {json.dumps(e.detail, ensure_ascii=False)}"))
+    if args.accion == "check":
+        sids = [s.id for s in portfolio.sites()] if args.all else None
+        portfolio.refresh(api_key, sids)
+        return 0
+    while True:
+        portfolio.refresh(api_key)
+        time.sleep(args.every)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,399 @@
+"""Precio de alquiler por m² desde avisos publicados, agregado por zona.
+
+Un job offline lee exportaciones masivas de avisos (CSV, JSON lines o un array
+JSON; también comprimidos en .gz) registro por registro, sin cargarlas enteras:
+de cada aviso sólo se guardan coordenadas y precio por m² en arrays compactos.
+Después se descartan los valores atípicos (por barrio, con la mediana y el
+desvío absoluto mediano del logaritmo del precio) y se guarda en un `.npz` la
+mediana de cada celda de una grilla fija de `CELL_M` m y la de cada barrio.
+
+    python -m localscope.rents build avisos.csv.gz avisos_2.jsonl --usd 1250
+    python -m localscope.rents build export.json --tipo "local comercial"
+
+Con el índice cargado, el precio en cualquier punto es una consulta O(1) a un
+diccionario por celda; las celdas con menos de `MIN_AVISOS` avisos caen a la
+mediana del barrio, y sin ninguna de las dos, a la tabla de barrios.
+"""
+import argparse
+import array
+import csv
+import gzip
+import io
+import json
+import math
+import os
+import re
+import threading
+import time
+from typing import Iterator, NamedTuple
+
+import numpy as np
+
+from .barrios import barrio_key
+from .cache import normalize_address
+from .datafiles import RENTS_PATH
+from .grid import CABA_BBOX, REF_LAT
+
+CELL_M = 250
+MIN_AVISOS = 5          # avisos mínimos para publicar la mediana de una celda o barrio
+OUTLIER_Z = 3.5         # |z robusto| del log del precio a partir del cual un aviso se descarta
+SUPERFICIE_M2 = (10, 5000)
+METERS_PER_DEG = 111320
+ZONA, BARRIO = "zona", "barrio"
+
+# Nombres de columna habituales en exportaciones de portales (ZonaProp, Properati, Argenprop)
+_CAMPOS = {
+    "lat": ("lat", "latitud", "latitude"),
+    "lng": ("lng", "lon", "long", "longitud", "longitude"),
+    "precio": ("precio", "price", "monto"),
+    "moneda": ("moneda", "currency"),
+    "superficie": ("superficie", "superficie_m2", "m2", "surface_covered", "surface_total"),
+    "operacion": ("operacion", "operation_type", "operation"),
+    "periodo": ("periodo", "price_period"),
+    "tipo": ("tipo", "property_type"),
+}
+_PESOS = {"ars", "$", "pesos"}
+_DOLARES = {"usd", "u$s", "us$", "dolares"}
+
+
+class RentEstimate(NamedTuple):
+    precio_m2: int
+    avisos: int
+    fuente: str  # "zona" (celda de la grilla) o "barrio"
+
+
+# ─── LECTURA DE AVISOS ────────────────────────────────────────────────────────
+
+def _open_text(path: str):
+    if path.endswith(".gz"):
+        return io.TextIOWrapper(gzip.open(path, "rb"), encoding="utf-8-sig")
+    return open(path, encoding="utf-8-sig", newline="")
+
+
+def _json_array(f, chunk: int = 1 << 16) -> Iterator[dict]:
+    """Objetos de un array JSON (`[{...}, {...}]`), decodificados de a uno."""
+    decoder = json.JSONDecoder()
+    buf, fin = "", False
+    while True:
+        buf = buf.lstrip(" \t\r\n,[")
+        if buf.startswith("]") or (fin and not buf.strip()):
+            return
+        try:
+            obj, end = decoder.raw_decode(buf)
+        except json.JSONDecodeError:
+            if fin:
+                raise
+            leido = f.read(chunk)
+            fin = not leido
+            buf += leido
+            continue
+        yield obj
+        buf = buf[end:]
+
+
+def iter_listings(path: str) -> Iterator[dict]:
+    """Avisos crudos de un archivo, en streaming."""
+    nombre = path[:-3] if path.endswith(".gz") else path
+    with _open_text(path) as f:
+        if nombre.endswith(".csv"):
+            yield from csv.DictReader(f)
+        elif nombre.endswith((".jsonl", ".ndjson")):
+            for linea in f:
+                if linea.strip():
+                    yield json.loads(linea)
+        elif nombre.endswith(".json"):
+            yield from _json_array(f)
+        else:
+            raise ValueError(f"Formato de avisos desconocido: {path!r} (csv, jsonl, json)")
+
+
+def _campo(raw: dict, campo: str):
+    for nombre in _CAMPOS[campo]:
+        valor = raw.get(nombre)
+        if valor not in (None, ""):
+            return valor
+    return None
+
+
+# Sólo grupos de miles, con "." o "," ("1.250", "1,250", "1.250.000"): el separador no es decimal
+_SOLO_MILES = re.compile(r"^[1-9]\d{0,2}([.,])\d{3}(?:\1\d{3})*$")
+
+
+def _numero(valor) -> float | None:
+    """Número de un campo de aviso, en formato argentino ("1.250.000,50") o inglés ("1,250,000.50")."""
+    if valor is None:
+        return None
+    if isinstance(valor, (int, float)):
+        return float(valor)
+    texto = str(valor).strip().replace(" ", "")
+    if m := _SOLO_MILES.match(texto):
+        texto = texto.replace(m.group(1), "")
+    elif "," in texto and "." in texto:
+        # El separador que aparece último es el decimal
+        decimal, miles = (",", ".") if texto.rfind(",") > texto.rfind(".") else (".", ",")
+        texto = texto.replace(miles, "").replace(decimal, ".")
+    else:
+        texto = texto.replace(",", ".")  # "45,5"
+    try:
+        return float(texto)
+    except ValueError:
+        return None
+
+
+def parse_listing(raw: dict, usd_ars: float | None = None, tipo: str | None = None) -> tuple[float, float, float] | None:
+    """(lat, lng, precio por m² en pesos) de un aviso, o None si no sirve.
+
+    Se descartan los avisos que no son alquileres mensuales, los que no tienen
+    coordenadas en CABA o superficie razonable, los de otro tipo de propiedad
+    (con `tipo`) y los en dólares si no se indica la cotización.
+    """
+    if (op := _campo(raw, "operacion")) is not None and normalize_address(str(op)) not in ("alquiler", "rent"):
+        return None
+    if (periodo := _campo(raw, "periodo")) is not None and normalize_address(str(periodo)) not in ("mensual", "monthly"):
+        return None
+    if tipo and normalize_address(str(_campo(raw, "tipo") or "")) != normalize_address(tipo):
+        return None
+    lat, lng = _numero(_campo(raw, "lat")), _numero(_campo(raw, "lng"))
+    precio, superficie = _numero(_campo(raw, "precio")), _numero(_campo(raw, "superficie"))
+    if None in (lat, lng, precio, superficie) or precio <= 0:
+        return None
+    if not (CABA_BBOX[0] <= lat <= CABA_BBOX[2] and CABA_BBOX[1] <= lng <= CABA_BBOX[3]):
+        return None
+    if not SUPERFICIE_M2[0] <= superficie <= SUPERFICIE_M2[1]:
+        return None
+    moneda = normalize_address(str(_campo(raw, "moneda") or "ars"))
+    if moneda in _DOLARES:
+        if not usd_ars:
+            return None
+        precio *= usd_ars
+    elif moneda not in _PESOS:
+        return None
+    return lat, lng, precio / superficie
+
+
+# ─── AGREGACIÓN ───────────────────────────────────────────────────────────────
+
+def _cell_size(cell_m: int) -> tuple[float, float]:
+    return cell_m / METERS_PER_DEG, cell_m / (METERS_PER_DEG * math.cos(math.radians(REF_LAT)))
+
+
+def _medianas(grupo: np.ndarray, valores: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(grupos, mediana, cantidad) de `valores` agrupados por el entero `grupo`."""
+    orden = np.lexsort((valores, grupo))
+    grupo, valores = grupo[orden], valores[orden]
+    grupos, inicio, n = np.unique(grupo, return_index=True, return_counts=True)
+    mediana = (valores[inicio + (n - 1) // 2] + valores[inicio + n // 2]) / 2
+    return grupos, mediana, n
+
+
+def _filtrar_atipicos(log_precio: np.ndarray, grupo: np.ndarray) -> np.ndarray:
+    """Máscara de avisos a conservar: |z robusto| <= OUTLIER_Z dentro de su grupo.
+
+    Los grupos con pocos avisos (y el -1, sin barrio) se comparan contra la
+    distribución de toda la ciudad.
+    """
+    def z(valores, centro, mad):
+        return np.abs(valores - centro) / np.where(mad > 0, 1.4826 * mad, np.inf)
+
+    centro, mad = np.median(log_precio), np.median(np.abs(log_precio - np.median(log_precio)))
+    zs = z(log_precio, centro, mad)
+    grupos, medianas, n = _medianas(grupo, log_precio)
+    i = np.searchsorted(grupos, grupo)
+    desvio = np.abs(log_precio - medianas[i])
+    _, mads, _ = _medianas(grupo, desvio)
+    propios = (grupo >= 0) & (n[i] >= MIN_AVISOS)
+    zs[propios] = z(log_precio[propios], medianas[i][propios], mads[i][propios])
+    return zs <= OUTLIER_Z
+
+
+def _clave_celda(i: np.ndarray, j: np.ndarray) -> np.ndarray:
+    # (i, j) en un solo int64, para ordenar y buscar celdas con arrays
+    return (i << 32) + (j & 0xFFFFFFFF)
+
+
+class RentIndex:
+    """Mediana de alquiler por m² por celda y por barrio, con consultas O(1)."""
+
+    def __init__(self, cell_m: int, celdas: dict[tuple[int, int], tuple[int, int]],
+                 barrios: dict[str, tuple[int, int]], meta: dict):
+        self.cell_m = cell_m
+        self.dlat, self.dlng = _cell_size(cell_m)
+        self.celdas = celdas      # (i, j) → (mediana, avisos)
+        self.barrios = barrios    # barrio_key → (mediana, avisos)
+        self.meta = meta
+        self._ordenadas = None    # (claves de celda ordenadas, valores): para `estimate_many`
+
+    def __len__(self) -> int:
+        return len(self.celdas)
+
+    @property
+    def version(self) -> str:
+        return str(self.meta.get("creado", ""))
+
+    def cell_of(self, lat: float, lng: float) -> tuple[int, int]:
+        return math.floor(lat / self.dlat), math.floor(lng / self.dlng)
+
+    def estimate(self, lat: float, lng: float, barrio: str | None = None) -> RentEstimate | None:
+        """Precio por m² en el punto: el de su celda o, si tiene pocos avisos, el del barrio."""
+        if (celda := self.celdas.get(self.cell_of(lat, lng))) is not None:
+            return RentEstimate(celda[0], celda[1], ZONA)
+        if barrio and (b := self.barrios.get(barrio_key(barrio))) is not None:
+            return RentEstimate(b[0], b[1], BARRIO)
+        return None
+
+    def _celdas_ordenadas(self) -> tuple[np.ndarray, np.ndarray]:
+        if self._ordenadas is None:
+            ij = np.array(list(self.celdas), dtype=np.int64).reshape(-1, 2)
+            valores = np.array(list(self.celdas.values()), dtype=np.int64).reshape(-1, 2)
+            claves = _clave_celda(ij[:, 0], ij[:, 1])
+            orden = np.argsort(claves)
+            self._ordenadas = claves[orden], valores[orden]
+        return self._ordenadas
+
+    def estimate_many(self, lat, lng, barrios: list[str | None] | None = None) -> tuple[list[RentEstimate], np.ndarray]:
+        """`estimate` para arrays de puntos: (estimaciones distintas, índice de cada punto en ellas o -1).
+
+        Las celdas se buscan todas juntas (`searchsorted` sobre las claves
+        ordenadas); el barrio se consulta una vez por nombre distinto.
+        """
+        lat, lng = np.asarray(lat, dtype=float), np.asarray(lng, dtype=float)
+        claves, valores = self._celdas_ordenadas()
+        # Fuente de cada punto: posición de su celda en `claves`, o len(claves) + n° de barrio; -1 sin dato
+        fuente = np.full(len(lat), -1, dtype=np.int64)
+        if len(claves):
+            buscadas = _clave_celda(np.floor(lat / self.dlat).astype(np.int64),
+                                    np.floor(lng / self.dlng).astype(np.int64))
+            pos = np.minimum(np.searchsorted(claves, buscadas), len(claves) - 1)
+            fuente = np.where(claves[pos] == buscadas, pos, -1)
+        nombres: dict[str, int] = {}
+        if barrios is not None and self.barrios and (fuente < 0).any():
+            por_punto = np.fromiter((nombres.setdefault(b or "", len(nombres)) for b in barrios),
+                                    dtype=np.int64, count=len(lat))
+            con_datos = np.array([bool(n) and barrio_key(n) in self.barrios for n in nombres], dtype=bool)
+            usar = (fuente < 0) & con_datos[por_punto]
+            fuente[usar] = len(claves) + por_punto[usar]
+        distintas, cual = np.unique(fuente, return_inverse=True)
+        lista = list(nombres)
+        estimaciones = []
+        for f in distintas[distintas >= 0]:
+            if f < len(claves):
+                estimaciones.append(RentEstimate(int(valores[f, 0]), int(valores[f, 1]), ZONA))
+            else:
+                mediana, avisos = self.barrios[barrio_key(lista[f - len(claves)])]
+                estimaciones.append(RentEstimate(mediana, avisos, BARRIO))
+        desplazamiento = int((distintas < 0).any())  # el -1 queda primero en `distintas`
+        return estimaciones, cual.reshape(-1) - desplazamiento
+
+    @classmethod
+    def from_listings(cls, lat: np.ndarray, lng: np.ndarray, precio_m2: np.ndarray, cell_m: int = CELL_M,
+                      resolver=None, meta: dict | None = None) -> "RentIndex":
+        """Agrega avisos ya normalizados; `resolver` asigna el barrio de cada celda (por su centro)."""
+        dlat, dlng = _cell_size(cell_m)
+        ij = np.stack([np.floor(lat / dlat), np.floor(lng / dlng)], axis=1).astype(np.int64)
+        celdas, celda = np.unique(ij, axis=0, return_inverse=True)
+        celda = celda.reshape(-1)
+        nombres = [resolver.resolve((i + 0.5) * dlat, (j + 0.5) * dlng) if resolver is not None else None
+                   for i, j in celdas]
+        barrios, barrio_de_celda = np.unique(np.array([n or "" for n in nombres], dtype=object), return_inverse=True)
+        barrio = barrio_de_celda.reshape(-1)[celda]
+
+        log_precio = np.log(precio_m2)
+        conservar = _filtrar_atipicos(log_precio, np.where(barrios[barrio] == "", -1, barrio))
+        celda, barrio, precio_m2 = celda[conservar], barrio[conservar], precio_m2[conservar]
+
+        por_celda = {}
+        for g, mediana, n in zip(*_medianas(celda, precio_m2)):
+            if n >= MIN_AVISOS:
+                por_celda[tuple(int(v) for v in celdas[g])] = (int(round(mediana)), int(n))
+        por_barrio = {}
+        for g, mediana, n in zip(*_medianas(barrio, precio_m2)):
+            if barrios[g] and n >= MIN_AVISOS:
+                por_barrio[barrio_key(barrios[g])] = (int(round(mediana)), int(n))
+        meta = {**(meta or {}), "creado": time.time(), "avisos": int(conservar.sum()),
+                "atipicos": int((~conservar).sum())}
+        return cls(cell_m, por_celda, por_barrio, meta)
+
+    def save(self, path: str) -> None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        celdas = np.array(list(self.celdas), dtype=np.int32).reshape(-1, 2)
+        valores = np.array(list(self.celdas.values()), dtype=np.int64).reshape(-1, 2)
+        barrios = np.array(list(self.barrios.values()), dtype=np.int64).reshape(-1, 2)
+        tmp = path + ".tmp.npz"
+        np.savez_compressed(
+            tmp, celdas=celdas, celda_valores=valores, barrio=np.array(list(self.barrios), dtype=str),
+            barrio_valores=barrios, meta=np.array(json.dumps({**self.meta, "cell_m": self.cell_m})),
+        )
+        os.replace(tmp, path)  # los lectores nunca ven un índice a medio escribir
+
+    @classmethod
+    def load(cls, path: str) -> "RentIndex":
+        with np.load(path) as data:
+            meta = json.loads(str(data["meta"]))
+            celdas = {(int(i), int(j)): (int(p), int(n)) for (i, j), (p, n) in zip(data["celdas"], data["celda_valores"])}
+            barrios = {barrio_key(str(b)): (int(p), int(n)) for b, (p, n) in zip(data["barrio"], data["barrio_valores"])}
+        return cls(meta.pop("cell_m"), celdas, barrios, meta)
+
+
+def build(paths: list[str], usd_ars: float | None = None, tipo: str | None = None, cell_m: int = CELL_M,
+          resolver=None, path: str = RENTS_PATH, on_progress=None) -> RentIndex:
+    """Lee los avisos de `paths` en streaming, los agrega y guarda el índice."""
+    lat, lng, precio = array.array("d"), array.array("d"), array.array("d")
+    leidos = 0
+    for archivo in paths:
+        for raw in iter_listings(archivo):
+            leidos += 1
+            if (aviso := parse_listing(raw, usd_ars, tipo)) is not None:
+                lat.append(aviso[0])
+                lng.append(aviso[1])
+                precio.append(aviso[2])
+            if on_progress and leidos % 50000 == 0:
+                on_progress(leidos, len(precio))
+    if not precio:
+        raise ValueError("Ningún aviso válido (alquiler mensual con coordenadas, precio y superficie)")
+    index = RentIndex.from_listings(np.frombuffer(lat), np.frombuffer(lng), np.frombuffer(precio), cell_m,
+                                    resolver, {"leidos": leidos, "archivos": [os.path.basename(p) for p in paths]})
+    index.save(path)
+    return index
+
+
+# ─── CARGA EN LA APP ──────────────────────────────────────────────────────────
+
+_LOADED: dict[str, tuple[float, RentIndex]] = {}
+_LOCK = threading.Lock()
+
+
+def get_index(path: str = RENTS_PATH) -> RentIndex | None:
+    """Índice de alquileres si existe; se recarga solo si el archivo cambió."""
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+    with _LOCK:
+        cargado = _LOADED.get(path)
+        if cargado is None or cargado[0] != mtime:
+            cargado = _LOADED[path] = (mtime, RentIndex.load(path))
+    return cargado[1]
+
+
+def main(argv=None) -> int:
+    from .lookups import get_barrio_resolver
+
+    parser = argparse.ArgumentParser(description="Índice de precios de alquiler desde exportaciones de avisos")
+    parser.add_argument("accion", choices=("build",))
+    parser.add_argument("archivos", nargs="+", help="avisos en .csv, .jsonl o .json (también .gz)")
+    parser.add_argument("--usd", type=float, help="cotización para convertir avisos en dólares (sin ella se descartan)")
+    parser.add_argument("--tipo", help='sólo avisos de este tipo de propiedad (p. ej. "local comercial")')
+    parser.add_argument("--cell-m", type=int, default=CELL_M)
+    parser.add_argument("--out", default=RENTS_PATH)
+    args = parser.parse_args(argv)
+
+    progreso = lambda leidos, validos: print(f"\r{leidos} avisos leídos, {validos} válidos", end="", flush=True)
+    index = build(args.archivos, args.usd, args.tipo, args.cell_m, get_barrio_resolver(), args.out, progreso)
+    m = index.meta
+    print(f"\r{m['leidos']} avisos leídos, {m['avisos']} usados ({m['atipicos']} atípicos) → "
+          f"{len(index)} celdas y {len(index.barrios)} barrios en {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
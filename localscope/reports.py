@@ -0,0 +1,208 @@
+"""Exportación de reportes (HTML o PDF) por ubicación, en lote.
+
+Cada reporte tiene las tarjetas de las cuatro capas, los insights y un mapa
+estático en SVG con las mismas capas que `maps.build_map` (radio, punto,
+competidores y paradas), dibujado sin navegador ni teselas. Los reportes se
+renderizan en un pool de procesos; las plantillas se compilan una vez por
+proceso y cada archivo se escribe en disco (o en un ZIP) apenas está listo,
+con una ventana acotada de trabajos en vuelo, así que la memoria no crece con
+el tamaño del lote.
+
+    python -m localscope.reports reportes.zip               # toda la cartera
+    python -m localscope.reports reportes/ --formato pdf    # PDF necesita WeasyPrint
+"""
+import argparse
+import math
+import multiprocessing
+import os
+import re
+import time
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from functools import lru_cache
+from typing import Iterable
+
+from .analysis import AnalysisResult
+from .cache import normalize_address
+
+ASSETS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "assets")
+REPORT_WORKERS = int(os.environ.get("LOCALSCOPE_REPORT_WORKERS", min(4, os.cpu_count() or 1)))
+REPORT_WINDOW = 2  # trabajos en vuelo por worker
+MAP_SIZE = 420     # px del mapa estático
+FORMATOS = ("html", "pdf")
+
+_COLORES = {"radio": "#c8f065", "competidor": "#f06060", "parada": "#60b4f0"}
+
+
+@lru_cache(maxsize=None)
+def _templates():
+    import jinja2
+
+    env = jinja2.Environment(loader=jinja2.FileSystemLoader(ASSETS_DIR), autoescape=True)
+    return env.get_template("report.html"), env.get_template("report_index.html")
+
+
+def _veredicto(score: int) -> str:
+    if score >= 70:
+        return "✅ Viable"
+    if score >= 45:
+        return "⚠️ Análisis requerido"
+    return "❌ Alto riesgo"
+
+
+def static_map_svg(lat: float, lng: float, radius: int, competitors: list, transit: list,
+                   size: int = MAP_SIZE) -> str:
+    """Mapa del análisis como SVG: radio, punto central, competidores y paradas."""
+    escala = size / (2.4 * radius)  # px por metro: el radio ocupa ~80% del ancho
+    cos_lat = math.cos(math.radians(lat))
+
+    def xy(p_lat: float, p_lng: float) -> tuple[float, float]:
+        dx = (p_lng - lng) * 111320 * cos_lat
+        dy = (p_lat - lat) * 111320
+        return size / 2 + dx * escala, size / 2 - dy * escala
+
+    partes = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{size}" height="{size}" viewBox="0 0 {size} {size}">',
+        f'<rect width="{size}" height="{size}" fill="#1a1a1a"/>',
+        f'<circle cx="{size / 2}" cy="{size / 2}" r="{radius * escala:.1f}" fill="{_COLORES["radio"]}" '
+        f'fill-opacity="0.08" stroke="{_COLORES["radio"]}" stroke-width="1.5"/>',
+    ]
+    for lugares, color, r in ((transit, _COLORES["parada"], 4), (competitors, _COLORES["competidor"], 5)):
+        for p in lugares:
+            x, y = xy(p.lat, p.lng)
+            partes.append(f'<circle cx="{x:.1f}" cy="{y:.1f}" r="{r}" fill="{color}" fill-opacity="0.75"/>')
+    partes.append(f'<circle cx="{size / 2}" cy="{size / 2}" r="8" fill="{_COLORES["radio"]}"/>')
+    partes.append("</svg>")
+    return "".join(partes)
+
+
+def render_html(result: AnalysisResult, interactive_map: bool = False) -> str:
+    """Reporte HTML autocontenido de un análisis."""
+    plantilla, _ = _templates()
+    if interactive_map:
+        from .maps import build_map  # folium: sólo si se pide el mapa interactivo
+        mapa = build_map(result.lat, result.lng, result.radius, result.competitors, result.transit)._repr_html_()
+    else:
+        mapa = static_map_svg(result.lat, result.lng, result.radius, result.competitors, result.transit)
+    capas = [
+        ("Competencia", result.competencia, f"{len(result.competitors)} locales en {result.radius}m"),
+        ("Transporte público", result.transporte, f"{len(result.transit)} paradas"),
+        ("Alquiler estimado", result.alquiler, f"~${result.precio_m2:,} / m²"),
+        ("Demografía del barrio", result.demografia, result.barrio),
+    ]
+    return plantilla.render(r=result, capas=capas, mapa=mapa, veredicto=_veredicto(result.score_total),
+                            fecha=time.strftime("%d/%m/%Y %H:%M"))
+
+
+def render_report(result: AnalysisResult, formato: str = "html", interactive_map: bool = False) -> bytes:
+    html = render_html(result, interactive_map and formato == "html")
+    if formato == "pdf":
+        return _weasyprint().HTML(string=html).write_pdf()
+    return html.encode("utf-8")
+
+
+def _weasyprint():
+    try:
+        import weasyprint  # opcional: sólo para PDF
+    except ImportError as e:
+        raise RuntimeError("Exportar a PDF requiere WeasyPrint (pip install weasyprint)") from e
+    return weasyprint
+
+
+def _slug(texto: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "-", normalize_address(texto)).strip("-")[:60] or "ubicacion"
+
+
+def _render_job(n: int, data: dict, formato: str, interactive_map: bool) -> tuple[str, bytes, dict]:
+    # Corre en los procesos del pool: recibe el resultado serializado (to_dict)
+    result = AnalysisResult.from_dict(data)
+    archivo = f"{n:04d}_{_slug(result.formatted)}_{_slug(result.rubro)}.{formato}"
+    fila = {"archivo": archivo, "ubicacion": result.formatted, "barrio": result.barrio,
+            "rubro": result.rubro, "radio": result.radius, "score": result.score_total}
+    return archivo, render_report(result, formato, interactive_map), fila
+
+
+class _DirWriter:
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+    def write(self, nombre: str, data: bytes) -> None:
+        with open(os.path.join(self.path, nombre), "wb") as f:
+            f.write(data)
+
+    def close(self) -> None:
+        pass
+
+
+class _ZipWriter:
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._zip = zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED)
+
+    def write(self, nombre: str, data: bytes) -> None:
+        self._zip.writestr(nombre, data)
+
+    def close(self) -> None:
+        self._zip.close()
+
+
+def export_reports(results: Iterable[AnalysisResult], out: str, formato: str = "html",
+                   workers: int = REPORT_WORKERS, interactive_map: bool = False, on_progress=None) -> int:
+    """Renderiza un reporte por resultado en `out` (directorio, o archivo `.zip`) y devuelve cuántos escribió.
+
+    `results` se consume de a poco (puede ser un generador); además de los
+    reportes se escribe un `index.html` con el resumen. `on_progress(n)` se
+    invoca cada vez que se escribe un reporte.
+    """
+    if formato not in FORMATOS:
+        raise ValueError(f"Formato desconocido: {formato!r} (opciones: {', '.join(FORMATOS)})")
+    if formato == "pdf":
+        _weasyprint()  # falla antes de arrancar el pool si no está instalado
+    writer = _ZipWriter(out) if out.endswith(".zip") else _DirWriter(out)
+    filas = []
+
+    def escribir(futures) -> None:
+        for future in futures:
+            archivo, data, fila = future.result()
+            writer.write(archivo, data)
+            filas.append(fila)
+            if on_progress:
+                on_progress(len(filas))
+
+    # spawn: la app tiene hilos (cola de trabajos, revisor de la cartera) que un fork heredaría a medias
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        try:
+            en_vuelo = set()
+            for n, result in enumerate(results, 1):
+                en_vuelo.add(pool.submit(_render_job, n, result.to_dict(), formato, interactive_map))
+                if len(en_vuelo) >= workers * REPORT_WINDOW:
+                    listos, en_vuelo = wait(en_vuelo, return_when=FIRST_COMPLETED)
+                    escribir(listos)
+            escribir(f for f in wait(en_vuelo).done)
+            _, indice = _templates()
+            writer.write("index.html", indice.render(filas=sorted(filas, key=lambda f: f["archivo"])).encode("utf-8"))
+        finally:
+            writer.close()
+    return len(filas)
+
+
+def main(argv: list[str] | None = None) -> int:
+    from .portfolio import get_portfolio
+
+    parser = argparse.ArgumentParser(description="Exporta los reportes de la cartera de ubicaciones")
+    parser.add_argument("salida", help="directorio o archivo .zip")
+    parser.add_argument("--formato", choices=FORMATOS, default="html")
+    parser.add_argument("--workers", type=int, default=REPORT_WORKERS)
+    parser.add_argument("--interactivo", action="store_true", help="html: mapa folium en lugar del estático")
+    args = parser.parse_args(argv)
+
+    resultados = (s.result for s in get_portfolio().iter_sites())
+    n = export_reports(resultados, args.salida, args.formato, args.workers, args.interactivo,
+                       on_progress=lambda n: print(f"\r{n} reportes", end="", flush=True))
+    print(f"\r{n} reportes en {args.salida}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,44 @@
+"""Catálogo de rubros y su configuración de búsqueda en Places API."""
+from .cache import normalize_address
+
+# Cada rubro tiene: label visible, google_type (tipo nativo Places API), keyword extra
+RUBROS = {
+    # Gastronomía
+    "☕ Cafetería / Café":           {"type": "cafe",                  "keyword": "cafeteria cafe"},
+    "🍽️ Restaurant / Resto":        {"type": "restaurant",            "keyword": ""},
+    "🍕 Pizzería / Delivery":        {"type": "restaurant",            "keyword": "pizzeria delivery"},
+    "🥐 Panadería / Confitería":     {"type": "bakery",                "keyword": "panaderia confiteria"},
+    "🍦 Heladería":                  {"type": "ice_cream_shop",        "keyword": "heladeria"},
+    "🍺 Bar / Cervecería":           {"type": "bar",                   "keyword": "bar cerveceria"},
+    # Comercio
+    "👗 Ropa / Indumentaria":        {"type": "clothing_store",        "keyword": "ropa indumentaria"},
+    "👟 Calzado / Zapatería":        {"type": "shoe_store",            "keyword": "zapateria calzado"},
+    "💄 Perfumería / Cosmética":     {"type": "beauty_supply",         "keyword": "perfumeria cosmetica"},
+    "🛒 Almacén / Minimercado":      {"type": "convenience_store",     "keyword": "almacen kiosco"},
+    "🌿 Verdulería / Frutería":      {"type": "grocery_or_supermarket","keyword": "verduleria fruteria"},
+    "🥩 Carnicería":                 {"type": "grocery_or_supermarket","keyword": "carniceria"},
+    "🔧 Ferretería":                 {"type": "hardware_store",        "keyword": "ferreteria"},
+    "📱 Electrónica / Celulares":    {"type": "electronics_store",     "keyword": "celulares electronica"},
+    "📚 Librería / Papelería":       {"type": "book_store",            "keyword": "libreria papeleria"},
+    "🌸 Floristería":                {"type": "florist",               "keyword": "floreria"},
+    "🐾 Veterinaria / Pet shop":     {"type": "veterinary_care",       "keyword": "veterinaria pet shop"},
+    # Servicios
+    "💊 Farmacia":                   {"type": "pharmacy",              "keyword": ""},
+    "💈 Peluquería / Barbería":      {"type": "hair_care",             "keyword": "peluqueria barberia"},
+    "💅 Estética / Nail bar":        {"type": "beauty_salon",          "keyword": "estetica nail"},
+    "🏋️ Gimnasio / Fitness":        {"type": "gym",                   "keyword": "gimnasio fitness"},
+    "🧺 Lavandería / Tintorería":    {"type": "laundry",               "keyword": "lavanderia tintoreria"},
+    "🖨️ Imprenta / Fotocopiadora":  {"type": "store",                 "keyword": "imprenta fotocopiadora"},
+    "🏥 Centro médico / Clínica":    {"type": "doctor",                "keyword": "clinica medico"},
+}
+
+
+def resolve_rubro(nombre: str) -> str | None:
+    """Encuentra el label de RUBROS que corresponde a un nombre escrito a mano (p. ej. en un CSV)."""
+    if nombre in RUBROS:
+        return nombre
+    buscado = normalize_address(nombre)
+    for label in RUBROS:
+        if buscado and buscado in normalize_address(label):
+            return label
+    return None
@@ -0,0 +1,234 @@
+"""Motor de reglas de scoring e insights, definido en `data/rules.json`.
+
+Cada capa es una tabla de decisión: una lista de reglas `{"si": {campo: {op:
+valor}}, "score", "color", "desc"}` donde gana la primera cuya condición se
+cumple (una regla sin "si" es el caso por defecto). Los insights son grupos de
+reglas: por defecto aporta la primera que matchea; con `"todas": true`, todas.
+También define los pesos del score global (por defecto y por rubro), el peso
+de cada modo de transporte, los precios que definen la categoría de un
+alquiler medido por avisos y las palabras que marcan un rubro como premium o
+popular.
+
+El archivo se compila una vez a funciones de comparación y se recompila solo
+si cambia; las tablas numéricas se pueden evaluar en lote sobre arrays.
+Con PyYAML instalado también se aceptan reglas en `.yaml`.
+"""
+import hashlib
+import json
+import logging
+import operator
+import os
+import threading
+import time
+
+DEFAULT_RULES_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "rules.json")
+RULES_PATH = os.environ.get("LOCALSCOPE_RULES_PATH", DEFAULT_RULES_PATH)
+RELOAD_CHECK_SECONDS = 5
+LAYERS = ("competencia", "transporte", "alquiler", "demografia")
+
+_OPS = {
+    "<": operator.lt, "<=": operator.le, ">": operator.gt, ">=": operator.ge,
+    "==": operator.eq, "!=": operator.ne, "in": lambda a, b: a in b,
+}
+
+
+class RuleError(ValueError):
+    """El archivo de reglas no es válido."""
+
+
+class Condition:
+    def __init__(self, campo: str, op: str, valor):
+        if op not in _OPS:
+            raise RuleError(f"Operador desconocido {op!r} en {campo!r}")
+        self.campo, self.op, self.valor = campo, op, valor
+        self._fn = _OPS[op]
+
+    def __call__(self, ctx: dict) -> bool:
+        return self._fn(ctx[self.campo], self.valor)
+
+    def mask(self, ctx: dict):
+        """Versión vectorizada: `ctx` con arrays de NumPy."""
+        import numpy as np
+
+        if self.op == "in":
+            return np.isin(ctx[self.campo], self.valor)
+        return self._fn(np.asarray(ctx[self.campo]), self.valor)
+
+
+class Rule:
+    def __init__(self, spec: dict):
+        self.conditions = [Condition(campo, op, valor)
+                           for campo, ops in (spec.get("si") or {}).items() for op, valor in ops.items()]
+        self.outcome = {k: v for k, v in spec.items() if k != "si"}
+
+    def matches(self, ctx: dict) -> bool:
+        return all(c(ctx) for c in self.conditions)
+
+
+class DecisionTable:
+    """Primera regla que matchea."""
+
+    def __init__(self, nombre: str, specs: list[dict]):
+        self.nombre = nombre
+        self.rules = [Rule(s) for s in specs]
+        if not self.rules or self.rules[-1].conditions:
+            raise RuleError(f"La tabla {nombre!r} necesita una regla final sin condición (caso por defecto)")
+
+    def evaluate(self, ctx: dict) -> dict:
+        for rule in self.rules:
+            if rule.matches(ctx):
+                return rule.outcome
+        raise AssertionError("inalcanzable: la última regla no tiene condición")
+
+    def scores(self, ctx: dict):
+        """Score de cada elemento de `ctx` (arrays) en lote, con np.select."""
+        import numpy as np
+
+        n = len(next(iter(ctx.values())))
+        conds = []
+        for rule in self.rules[:-1]:
+            m = np.ones(n, dtype=bool)
+            for c in rule.conditions:
+                m &= c.mask(ctx)
+            conds.append(m)
+        return np.select(conds, [r.outcome["score"] for r in self.rules[:-1]], default=self.rules[-1].outcome["score"])
+
+
+class InsightGroup:
+    def __init__(self, spec: dict):
+        self.todas = bool(spec.get("todas"))
+        self.rules = [Rule(s) for s in spec["reglas"]]
+
+    def evaluate(self, ctx: dict) -> list[dict]:
+        out = []
+        for rule in self.rules:
+            if rule.matches(ctx):
+                out.append({"icon": rule.outcome["icon"], "text": rule.outcome["text"]})
+                if not self.todas:
+                    break
+        return out
+
+
+class RuleSet:
+    """Reglas compiladas."""
+
+    def __init__(self, spec: dict, version: str = ""):
+        self.version = version
+        try:
+            self.tables = {nombre: DecisionTable(nombre, reglas) for nombre, reglas in spec["capas"].items()}
+            self.insight_groups = [InsightGroup(g) for g in spec.get("insights", [])]
+            pesos = spec["pesos"]
+            self._default_weights = self._weights(pesos["default"])
+            self._weights_por_rubro = {r: self._weights(w) for r, w in pesos.get("por_rubro", {}).items()}
+            self._perfiles = {p: tuple(palabras) for p, palabras in spec.get("perfiles_rubro", {}).items()}
+            self.transit_weights = {m: float(w) for m, w in spec.get("modos_transporte", {}).items()}
+            # GTFS trae cada poste de colectivo; Places, una fracción: sus paradas pesan distinto
+            # (el origen del peso está en "_notas" de data/rules.json; las claves "_..." no se compilan)
+            self.transit_weights_gtfs = {**self.transit_weights, **{
+                m: float(w) for m, w in spec.get("modos_transporte_gtfs", {}).items()}}
+            self._rent_categories = sorted(((float(p), c) for c, p in spec.get("categorias_alquiler", {}).items()),
+                                           reverse=True)
+        except (KeyError, TypeError) as e:
+            raise RuleError(f"Reglas inválidas: {e}") from e
+        faltan = {"competencia", "transporte", "alquiler", "demografia_base", "demografia"} - set(self.tables)
+        if faltan:
+            raise RuleError(f"Faltan tablas: {sorted(faltan)}")
+        self._perfil_cache: dict[str, dict[str, bool]] = {}
+
+    @staticmethod
+    def _weights(w: dict) -> list[float]:
+        return [float(w[capa]) for capa in LAYERS]
+
+    def weights(self, rubro: str | None = None) -> list[float]:
+        """Pesos [competencia, transporte, alquiler, demografía] para el rubro."""
+        return self._weights_por_rubro.get(rubro, self._default_weights)
+
+    def perfil(self, rubro: str) -> dict[str, bool]:
+        """{"premium": bool, "popular": bool, ...} del rubro; se calcula una vez por label."""
+        perfil = self._perfil_cache.get(rubro)
+        if perfil is None:
+            label = rubro.lower()
+            perfil = {p: any(palabra in label for palabra in palabras) for p, palabras in self._perfiles.items()}
+            self._perfil_cache[rubro] = perfil
+        return perfil
+
+    def rent_category(self, precio_m2: float) -> str:
+        """Categoría (premium / medio / economico) de un precio por m² que no sale de la tabla de barrios."""
+        for minimo, categoria in self._rent_categories:
+            if precio_m2 >= minimo:
+                return categoria
+        return "economico"
+
+    def evaluate(self, tabla: str, ctx: dict) -> tuple[int, str, str]:
+        """(score, color, desc) de una capa."""
+        o = self.tables[tabla].evaluate(ctx)
+        if "ajuste" in o:
+            score = ctx["base"] + o["ajuste"]
+            score = min(score, o["max"]) if "max" in o else score
+            score = max(score, o["min"]) if "min" in o else score
+        else:
+            score = o["score"]
+        return score, o.get("color", ""), o.get("desc", "").format(**ctx)
+
+    def insights(self, ctx: dict) -> list[dict]:
+        return [i for g in self.insight_groups for i in g.evaluate(ctx)]
+
+
+def _read_spec(path: str) -> tuple[dict, str]:
+    with open(path, "rb") as f:
+        raw = f.read()
+    if path.endswith((".yaml", ".yml")):
+        import yaml  # opcional
+        spec = yaml.safe_load(raw)
+    else:
+        spec = json.loads(raw)
+    return spec, hashlib.blake2b(raw, digest_size=6).hexdigest()
+
+
+def load_rules(path: str = RULES_PATH) -> RuleSet:
+    spec, version = _read_spec(path)
+    return RuleSet(spec, version)
+
+
+log = logging.getLogger(__name__)
+_lock = threading.Lock()
+_state = {"rules": None, "mtime": None, "checked": 0.0, "error": None}
+
+
+def _keep_rules(error: Exception) -> None:
+    """Sigue con las reglas anteriores o, si todavía no hay, con las de `DEFAULT_RULES_PATH`."""
+    if _state["rules"] is None:
+        if RULES_PATH == DEFAULT_RULES_PATH:
+            raise error
+        log.warning("No se pudieron cargar las reglas de %s (%s); se usan las de %s",
+                    RULES_PATH, error, DEFAULT_RULES_PATH)
+        _state["rules"] = load_rules(DEFAULT_RULES_PATH)
+    elif str(error) != _state["error"]:  # una vez por error, no en cada chequeo
+        log.warning("No se pudieron recargar las reglas de %s (%s); se siguen usando las anteriores (versión %s)",
+                    RULES_PATH, error, _state["rules"].version)
+    _state["error"] = str(error)
+
+
+def get_rules() -> RuleSet:
+    """Reglas vigentes; se recompilan si cambió el archivo (sin reiniciar la app).
+
+    Si el archivo nuevo es inválido, falta o se está reemplazando, se siguen
+    usando las reglas anteriores (o las incluidas en `data/rules.json`).
+    """
+    ahora = time.monotonic()
+    if _state["rules"] is not None and ahora - _state["checked"] < RELOAD_CHECK_SECONDS:
+        return _state["rules"]
+    with _lock:
+        try:
+            mtime = os.path.getmtime(RULES_PATH)
+            if mtime != _state["mtime"]:
+                try:
+                    _state["rules"] = load_rules(RULES_PATH)
+                except (RuleError, ValueError):
+                    _state["mtime"] = mtime  # inválido: no se recompila hasta que cambie (ilegible sí se reintenta)
+                    raise
+                _state["mtime"], _state["error"] = mtime, None
+        except (OSError, RuleError, ValueError) as e:
+            _keep_rules(e)
+        _state["checked"] = ahora
+        return _state["rules"]
@@ -0,0 +1,129 @@
+"""Capas de scoring, score global e insights.
+
+Los umbrales, textos y pesos salen de las reglas declarativas de
+`localscope.rules` (data/rules.json); acá se arma el contexto de cada capa.
+"""
+import math
+import os
+
+from . import metrics
+from .barrios import barrio_profile
+from .datafiles import RENTS_PATH, file_version
+from .rules import get_rules
+from .transit import count_by_mode, describe_modes, mode_weights
+
+
+def score_competencia(competitors: list, radius: int) -> tuple[int, str, str]:
+    """Calcula score de competencia. Devuelve (score 0-100, semáforo, descripción)."""
+    ratings = [p.rating for p in competitors if p.rating]
+    avg_rating = sum(ratings) / len(ratings) if ratings else 0
+    return score_competencia_stats(len(competitors), avg_rating, radius)
+
+
+def score_competencia_stats(n: int, avg_rating: float, radius: int) -> tuple[int, str, str]:
+    """score_competencia a partir de la cantidad de competidores y su rating promedio."""
+    density = n / (math.pi * (radius/1000)**2)  # locales por km²
+    return get_rules().evaluate("competencia", {"n": n, "rating": avg_rating, "densidad_km2": density})
+
+
+def score_transporte(stops: list, radius: int) -> tuple[int, str, str]:
+    """Paradas únicas del radio, ponderadas por modo (subte y tren pesan más que un colectivo) y fuente."""
+    n, conteo = len(stops), count_by_mode(stops)
+    return get_rules().evaluate("transporte", {
+        "n": n, **conteo, "equivalente": sum(mode_weights(stops)),
+        "paradas": f"{n} parada{'s' if n != 1 else ''} de transporte", "modos": describe_modes(conteo),
+    })
+
+
+def rent_index():
+    """Índice de alquileres por zona (`localscope.rents`), o None si no se generó."""
+    if not os.path.exists(RENTS_PATH):
+        return None  # sin índice no hace falta cargar numpy
+    from . import rents  # numpy: se carga al puntuar, no al importar la app
+
+    return rents.get_index()
+
+
+def rent_version() -> str:
+    """Versión del índice de alquileres (mtime; "" sin índice), para las claves de caché, sin cargarlo."""
+    return file_version(RENTS_PATH)
+
+
+def rent_estimate(lat: float, lng: float, barrio: str | None = None):
+    """`RentEstimate` de los avisos en el punto (o en su barrio), o None."""
+    index = rent_index()
+    estimate = index.estimate(lat, lng, barrio) if index is not None else None
+    metrics.record_cache("alquileres", estimate is not None)
+    return estimate
+
+
+def score_rent_estimate(estimate) -> tuple[int, str, str, int]:
+    """Score de alquiler a partir de la mediana de los avisos de la zona o del barrio."""
+    reglas = get_rules()
+    donde = "de la zona" if estimate.fuente == "zona" else "del barrio"
+    score, color, desc = reglas.evaluate("alquiler", {
+        "categoria": reglas.rent_category(estimate.precio_m2), "precio": estimate.precio_m2,
+        "fuente": f" (mediana de {estimate.avisos} avisos {donde})",
+    })
+    return score, color, desc, estimate.precio_m2
+
+
+def score_alquiler(barrio: str, rubro: str, fecha: str | None = None,
+                   lat: float | None = None, lng: float | None = None) -> tuple[int, str, str, int]:
+    """Score de alquiler. Devuelve (score, color, desc, precio_m2).
+
+    Con coordenadas (y sin `fecha`) usa los avisos de la zona si hay índice;
+    si no, la tabla de barrios vigente a `fecha`.
+    """
+    if lat is not None and fecha is None and (estimate := rent_estimate(lat, lng, barrio)) is not None:
+        return score_rent_estimate(estimate)
+    data = barrio_profile(barrio, fecha)
+    score, color, desc = get_rules().evaluate("alquiler", {"categoria": data.categoria, "precio": data.alquiler_m2,
+                                                           "fuente": ""})
+    return score, color, desc, data.alquiler_m2
+
+
+def score_demografia(barrio: str, rubro: str, fecha: str | None = None) -> tuple[int, str, str]:
+    data = barrio_profile(barrio, fecha)
+    reglas = get_rules()
+    ctx = {"nse": data.nse, "nse_txt": data.nse.replace("_", " "), "densidad": data.densidad, **reglas.perfil(rubro)}
+    ctx["base"] = reglas.evaluate("demografia_base", ctx)[0]
+    return reglas.evaluate("demografia", ctx)
+
+
+def global_score(scores: list[int], weights: list[float]) -> int:
+    return round(sum(s * w for s, w in zip(scores, weights)))
+
+
+def score_weights(rubro: str | None = None) -> list[float]:
+    """Pesos [competencia, transporte, alquiler, demografía] del score global para el rubro."""
+    return get_rules().weights(rubro)
+
+
+def score_location(competitors: list, transit: list, barrio: str, rubro_label: str, radius: int,
+                   lat: float | None = None, lng: float | None = None) -> dict:
+    """Calcula las cuatro capas, el score global y los insights de una ubicación.
+
+    Con `lat`/`lng`, el alquiler sale de los avisos de la zona cuando hay índice.
+    """
+    s_comp, c_comp, d_comp = score_competencia(competitors, radius)
+    s_trans, c_trans, d_trans = score_transporte(transit, radius)
+    s_alq, c_alq, d_alq, precio_m2 = score_alquiler(barrio, rubro_label, lat=lat, lng=lng)
+    s_demo, c_demo, d_demo = score_demografia(barrio, rubro_label)
+
+    score_total = global_score([s_comp, s_trans, s_alq, s_demo], score_weights(rubro_label))
+
+    return {
+        "score_total": score_total,
+        "s_comp": s_comp, "c_comp": c_comp, "d_comp": d_comp,
+        "s_trans": s_trans, "c_trans": c_trans, "d_trans": d_trans,
+        "s_alq": s_alq, "c_alq": c_alq, "d_alq": d_alq, "precio_m2": precio_m2,
+        "s_demo": s_demo, "c_demo": c_demo, "d_demo": d_demo,
+        "insights": get_key_insights(c_comp, c_trans, c_alq, c_demo, score_total),
+    }
+
+
+def get_key_insights(c_comp, c_trans, c_alq, c_demo, score_total) -> list[dict]:
+    """Insights según el score global y los colores de cada capa (grupos de reglas de `insights`)."""
+    return get_rules().insights({"score_total": score_total, "c_comp": c_comp, "c_trans": c_trans,
+                                 "c_alq": c_alq, "c_demo": c_demo})
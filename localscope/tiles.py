@@ -0,0 +1,211 @@
+"""Caché espacial por teselas para resultados de Nearby Search.
+
+La ciudad se divide en una grilla fija de teselas cuadradas. Cada tesela se
+consulta una sola vez (círculo centrado que la cubre por completo) y se guardan
+sólo los lugares que caen dentro de ella. Una búsqueda circular se responde
+uniendo las teselas que la cubren y filtrando localmente con haversine; sólo
+se piden a la API las teselas que faltan.
+
+Nearby Search devuelve como mucho 60 resultados: si la consulta de una
+tesela vuelve llena, la tesela se parte en cuatro y se consulta cada cuarto
+con un radio menor, hasta `MIN_SUBTILE_M`. Una tesela que sigue llena a ese
+tamaño se guarda marcada como `capped` (su conteo es un mínimo, no exacto).
+
+Las teselas faltantes se piden en paralelo y `iter_query` va entregando
+resultados parciales a medida que llega cada página.
+"""
+import math
+import queue
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator
+
+from . import metrics
+from .cache import Cache
+from .geo import haversine
+from .places import Place
+
+METERS_PER_DEG_LAT = 111320
+REF_LAT = -34.6  # latitud de referencia de CABA para el ancho de tesela en longitud
+DEFAULT_TILE_SIZE_M = 800
+MAX_RESULTS = 60      # tope de Nearby Search (3 páginas de 20): una respuesta así puede estar cortada
+MIN_SUBTILE_M = 100   # lado mínimo al partir una tesela llena
+
+# fetch(lat, lng, radius, keyword, place_type) -> páginas de `Place`
+Fetcher = Callable[[float, float, int, str, str], Iterable[list[Place]]]
+
+
+class PlaceTileCache:
+    """Responde búsquedas circulares a partir de teselas cacheadas por type/keyword."""
+
+    def __init__(self, store: Cache, tile_size_m: int = DEFAULT_TILE_SIZE_M, max_workers: int = 8):
+        self.store = store
+        self.tile_size_m = tile_size_m
+        self.max_workers = max_workers
+        self.dlat = tile_size_m / METERS_PER_DEG_LAT
+        self.dlng = tile_size_m / (METERS_PER_DEG_LAT * math.cos(math.radians(REF_LAT)))
+        # Radio que cubre la tesela completa desde su centro (media diagonal)
+        self.fetch_radius = math.ceil(tile_size_m * math.sqrt(2) / 2)
+        self.tiles_fetched = 0
+
+    def tile_of(self, lat: float, lng: float) -> tuple[int, int]:
+        return math.floor(lat / self.dlat), math.floor(lng / self.dlng)
+
+    def tile_center(self, tile: tuple[int, int]) -> tuple[float, float]:
+        i, j = tile
+        return (i + 0.5) * self.dlat, (j + 0.5) * self.dlng
+
+    def tiles_for_circle(self, lat: float, lng: float, radius: float) -> list[tuple[int, int]]:
+        """Teselas que intersectan el círculo (lat, lng, radius)."""
+        rlat = radius / METERS_PER_DEG_LAT
+        rlng = radius / (METERS_PER_DEG_LAT * math.cos(math.radians(lat)))
+        i0, j0 = self.tile_of(lat - rlat, lng - rlng)
+        i1, j1 = self.tile_of(lat + rlat, lng + rlng)
+        tiles = []
+        for i in range(i0, i1 + 1):
+            for j in range(j0, j1 + 1):
+                # Punto de la tesela más cercano al centro del círculo
+                near_lat = min(max(lat, i * self.dlat), (i + 1) * self.dlat)
+                near_lng = min(max(lng, j * self.dlng), (j + 1) * self.dlng)
+                if haversine(lat, lng, near_lat, near_lng) <= radius:
+                    tiles.append((i, j))
+        return tiles
+
+    @staticmethod
+    def _key(tile: tuple[int, int], keyword: str, place_type: str) -> str:
+        # v3: {"places": filas de Place, "capped": bool}; las v2 podían estar cortadas en 60 resultados
+        return f"v3|{place_type or ''}|{keyword or ''}|{tile[0]}|{tile[1]}"
+
+    def fetch_tile(self, tile: tuple[int, int], keyword: str, place_type: str, fetch: Fetcher,
+                   on_page=None) -> tuple[list[Place], bool]:
+        """(lugares, capped) de una tesela, partiéndola mientras las consultas vuelvan llenas.
+
+        `on_page(lista)` recibe cada página ya filtrada a la tesela (puede repetir
+        lugares entre una consulta y sus cuartos).
+        """
+        i, j = tile
+        places, capped = self._fetch_square(i * self.dlat, j * self.dlng, self.dlat, self.dlng, self.tile_size_m,
+                                            keyword, place_type, fetch, on_page)
+        return [p for p in places if self.tile_of(p.lat, p.lng) == tile], capped
+
+    def _fetch_square(self, lat0, lng0, dlat, dlng, lado_m, keyword, place_type, fetch: Fetcher,
+                      on_page) -> tuple[list[Place], bool]:
+        radio = math.ceil(lado_m * math.sqrt(2) / 2)  # media diagonal: el círculo cubre el cuadrado
+        lugares, recibidos = {}, 0
+        for page in fetch(lat0 + dlat / 2, lng0 + dlng / 2, radio, keyword, place_type):
+            recibidos += len(page)
+            page = [p for p in page if lat0 <= p.lat < lat0 + dlat and lng0 <= p.lng < lng0 + dlng]
+            lugares.update((p.place_id, p) for p in page)
+            if on_page:
+                on_page(page)
+        if recibidos < MAX_RESULTS:
+            return list(lugares.values()), False
+        if lado_m / 2 < MIN_SUBTILE_M:
+            return list(lugares.values()), True
+        capped = False
+        for di in (0, 1):
+            for dj in (0, 1):
+                sub, sub_capped = self._fetch_square(lat0 + di * dlat / 2, lng0 + dj * dlng / 2, dlat / 2, dlng / 2,
+                                                     lado_m / 2, keyword, place_type, fetch, on_page)
+                lugares.update((p.place_id, p) for p in sub)
+                capped |= sub_capped
+        return list(lugares.values()), capped
+
+    def _fetch_tile(self, tile, keyword, place_type, fetch: Fetcher, out: queue.Queue) -> None:
+        """Pide una tesela completa, publicando cada página en `out`."""
+        try:
+            places, capped = self.fetch_tile(tile, keyword, place_type, fetch,
+                                             on_page=lambda page: out.put((tile, page, None)))
+        except Exception as e:
+            # Una tesela a medias (error o paginación incompleta) no se guarda
+            out.put((tile, None, e))
+            return
+        self.store.set(self._key(tile, keyword, place_type), {"places": [p.to_row() for p in places],
+                                                               "capped": capped})
+        metrics.record_cache("tiles_complete", not capped)
+        self.tiles_fetched += 1
+        out.put((tile, None, None))
+
+    def get_tiles(self, tiles: Iterable[tuple[int, int]], keyword: str, place_type: str, fetch: Fetcher,
+                  refresh: bool = False) -> tuple[dict[tuple[int, int], list[Place]], dict[tuple[int, int], Exception]]:
+        """({tesela: lugares}, {tesela: error}) de `tiles`; sólo se piden a la API las que no están en caché.
+
+        Con `refresh` se piden todas aunque estén vigentes (y se reemplazan en la caché).
+        """
+        lugares, faltantes = {}, []
+        for tile in dict.fromkeys(tiles):
+            cached = None if refresh else self.store.get(self._key(tile, keyword, place_type))
+            if cached is None:
+                faltantes.append(tile)
+            else:
+                lugares[tile] = [Place.from_row(row) for row in cached["places"]]
+        errores = {}
+        if faltantes:
+            out = queue.Queue()
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(faltantes))) as pool:
+                for tile in faltantes:
+                    metrics.submit(pool, self._fetch_tile, tile, keyword, place_type, fetch, out)
+            while not out.empty():
+                tile, _, error = out.get()
+                if error is not None:
+                    errores[tile] = error
+            for tile in faltantes:
+                if tile not in errores and (cached := self.store.get(self._key(tile, keyword, place_type))):
+                    lugares[tile] = [Place.from_row(row) for row in cached["places"]]
+        return lugares, errores
+
+    def iter_query(self, lat: float, lng: float, radius: float, keyword: str, place_type: str,
+                   fetch: Fetcher) -> Iterator[list]:
+        """Genera la lista acumulada de lugares a menos de `radius` metros.
+
+        Primero entrega lo que ya estaba cacheado y luego una versión ampliada
+        por cada página que llega de las teselas faltantes.
+        """
+        results, seen = [], set()
+
+        def agregar(places):
+            nuevos = False
+            for p in places:
+                if p.place_id not in seen and haversine(lat, lng, p.lat, p.lng) <= radius:
+                    seen.add(p.place_id)
+                    results.append(p)
+                    nuevos = True
+            return nuevos
+
+        faltantes = []
+        for tile in self.tiles_for_circle(lat, lng, radius):
+            cached = self.store.get(self._key(tile, keyword, place_type))
+            if cached is None:
+                faltantes.append(tile)
+            else:
+                agregar(Place.from_row(row) for row in cached["places"])
+        if results or not faltantes:
+            yield list(results)
+        if not faltantes:
+            return
+
+        out = queue.Queue()
+        pool = ThreadPoolExecutor(max_workers=min(self.max_workers, len(faltantes)))
+        try:
+            for tile in faltantes:
+                metrics.submit(pool, self._fetch_tile, tile, keyword, place_type, fetch, out)
+            pendientes = len(faltantes)
+            while pendientes:
+                tile, page, error = out.get()
+                if error is not None:
+                    raise error
+                if page is None:
+                    pendientes -= 1
+                elif agregar(page):
+                    yield list(results)
+        finally:
+            # Si el consumidor corta antes (deadline), no lo bloqueamos esperando a los hilos
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def query(self, lat: float, lng: float, radius: float, keyword: str, place_type: str,
+              fetch: Fetcher) -> list:
+        """Lugares a menos de `radius` metros, ordenados por distancia."""
+        results = []
+        for results in self.iter_query(lat, lng, radius, keyword, place_type, fetch):
+            pass
+        results.sort(key=lambda p: haversine(lat, lng, p.lat, p.lng))
+        return results
@@ -0,0 +1,70 @@
+"""Clasificación de paradas de transporte por modo: subte, tren o colectivo.
+
+El modo se decide al ingresar cada resultado de Places (por sus `types` y, si
+no alcanza, por el nombre) y viaja en `Place.modo`. El peso de cada modo en el
+score de transporte sale de `modos_transporte` en las reglas. Con un feed GTFS
+local (`localscope.gtfs`) las paradas se responden sin consultar la API; como
+el feed trae todas las paradas de colectivo y Places sólo una parte, las de
+GTFS se ponderan con `modos_transporte_gtfs`.
+"""
+import re
+
+from .rules import get_rules
+
+SUBTE, TREN, COLECTIVO = "subte", "tren", "colectivo"
+MODOS = (SUBTE, TREN, COLECTIVO)
+ICONOS = {SUBTE: "🚇", TREN: "🚆", COLECTIVO: "🚌"}
+PLURALES = {SUBTE: "subtes", TREN: "trenes", COLECTIVO: "colectivos"}
+
+# En orden de prioridad: una estación de subte también trae "transit_station"
+_MODO_POR_TYPE = (
+    ("subway_station", SUBTE), ("light_rail_station", SUBTE),  # el Premetro es parte de la red de subte
+    ("train_station", TREN), ("bus_station", COLECTIVO),
+)
+_NOMBRE_SUBTE = re.compile(r"\bsubte\b|\bpremetro\b|\bl[ií]nea [a-hA-H]\b", re.IGNORECASE)
+_NOMBRE_TREN = re.compile(r"\btren\b|\bferrocarril\b|\bf\.?c\.?\b|\bestaci[oó]n\b", re.IGNORECASE)
+
+
+def classify_name(nombre: str) -> str:
+    if _NOMBRE_SUBTE.search(nombre or ""):
+        return SUBTE
+    if _NOMBRE_TREN.search(nombre or ""):
+        return TREN
+    return COLECTIVO
+
+
+def classify_stop(raw: dict) -> str:
+    """Modo de un resultado crudo de Places (tipo de transit_station / bus_station)."""
+    types = set(raw.get("types") or ())
+    for place_type, modo in _MODO_POR_TYPE:
+        if place_type in types:
+            return modo
+    return classify_name(raw.get("name") or "")
+
+
+def stop_mode(stop) -> str:
+    """Modo de una parada; las guardadas antes de la clasificación se infieren por el nombre."""
+    return stop.modo or classify_name(stop.name)
+
+
+def count_by_mode(stops: list) -> dict[str, int]:
+    conteo = dict.fromkeys(MODOS, 0)
+    for s in stops:
+        conteo[stop_mode(s)] += 1
+    return conteo
+
+
+def is_gtfs(stop) -> bool:
+    return stop.place_id.startswith("gtfs:")
+
+
+def mode_weights(stops: list) -> list[float]:
+    """Peso de cada parada en el score de transporte según su modo y su fuente (Places o GTFS)."""
+    reglas = get_rules()
+    return [(reglas.transit_weights_gtfs if is_gtfs(s) else reglas.transit_weights).get(stop_mode(s), 1.0)
+            for s in stops]
+
+
+def describe_modes(conteo: dict[str, int]) -> str:
+    """"1 subte, 5 colectivos" (sólo los modos presentes)."""
+    return ", ".join(f"{n} {modo if n == 1 else PLURALES.get(modo, modo)}" for modo, n in conteo.items() if n)